@@ -9,7 +9,7 @@ import asyncio
 import json
 import logging
 import pathlib
-import sys  # pylint: disable=W0611
+import sys
 import typing
 
 from icecream import ic  # type: ignore  # pylint: disable=W0611
@@ -73,6 +73,8 @@ if __name__ == "__main__":
         ],
         shorty = shorty,
         use_scraper = True,
+        report_path = pathlib.Path("report.jsonl"),
+        resume = "--resume" in sys.argv,
     )
 
     asyncio.run(
@@ -86,14 +88,7 @@ if __name__ == "__main__":
 
     ic(crawler.needs_scraper)
 
-    # serialize intermediate data / report
-    with open(pathlib.Path("report"), "w", encoding = "utf-8") as fp:
-        fp.write(
-            json.dumps(
-                crawler.report(),
-                sort_keys = True,
-                indent = 2,
-            )
-        )
+    # the report has been streamed to disk during the crawl
+    ic(crawler.report_path, len(crawler.reported))
 
     profiler.print()
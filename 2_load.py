@@ -5,7 +5,7 @@
 Prototype the use of KùzuDB
 """
 
-import json
+import atexit
 import pathlib
 import sys
 import tomllib
@@ -16,7 +16,11 @@ from pyinstrument import Profiler
 import kuzu
 import pandas as pd
 
-from nyddu import db_connect
+from sentence_transformers import SentenceTransformer
+
+from nyddu import VECTOR_INDEX, \
+    db_connect, embed_texts, has_vector_index, iter_report, load_model, \
+    load_vector_extension, page_text, reload_path, row_digest, stable_id, write_generation
 
 
 def verify_page (
@@ -31,8 +35,9 @@ Format the data for one row, so that neither Polars nor Pandas loose their minds
     if page["slug"] is not None:
         page["slug"] = page["slug"].strip().lstrip("/s/")
 
-    return {
+    row: dict = {
         "uri": page["uri"],
+        "kind": page.get("kind"),
         "status": page["status"],
         "type": page["type"],
         "path": page["path"],
@@ -42,41 +47,180 @@ Format the data for one row, so that neither Polars nor Pandas loose their minds
         "summary": page["summary"],
         "thumbnail": page["thumbnail"],
         "error": page["error"],
-        "timing": page["timing"]
+        "timing": page["timing"],
+        "text_hash": row_digest({ "text": page_text(page) }),
     }
 
+    return {
+        "id": stable_id(page["uri"]),
+        **row,
+        "digest": row_digest(row),
+    }
 
-def main (
+
+def copy_pages (
+    conn: kuzu.Connection,
+    rows: typing.List[ dict ],
+    ) -> None:
+    """
+Bulk load one chunk of new `Page` rows.
+    """
+    df_page = pd.DataFrame(rows)  # pylint: disable=W0612
+
+    conn.execute("""
+COPY Page FROM df_page
+    """)
+
+
+def update_pages (
+    conn: kuzu.Connection,
+    rows: typing.List[ dict ],
+    ) -> None:
+    """
+Update one chunk of changed `Page` rows in place, keyed by `id`,
+including their embeddings only when those have been recomputed.
+    """
+    df_page = pd.DataFrame(rows)
+    set_embedding: str = ""
+
+    if "embedding" in df_page.columns:
+        set_embedding = ",\n    p.embedding = embedding"
+
+    conn.execute(f"""
+LOAD FROM df_page
+MATCH (p:Page {{id: id}})
+SET
+    p.uri = uri,
+    p.kind = kind,
+    p.status = status,
+    p.type = type,
+    p.path = path,
+    p.slug = slug,
+    p.redirect = redirect,
+    p.title = title,
+    p.summary = summary,
+    p.thumbnail = thumbnail,
+    p.error = error,
+    p.timing = timing,
+    p.text_hash = text_hash,
+    p.digest = digest{set_embedding}
+    """)
+
+
+def embed_rows (
+    model: SentenceTransformer,
+    rows: typing.List[ dict ],
+    texts: typing.List[ str ],
+    *,
+    batch_size: int = 64,
     ) -> int:
     """
-Main entry point
+Compute the embeddings for one chunk of rows in batches, skipping any
+rows without text. Returns the number of rows embedded.
     """
-    config_path: pathlib.Path = pathlib.Path("config.toml")
-    config: dict = {}
+    todo: typing.List[ int ] = [ i for i, text in enumerate(texts) if len(text) > 0 ]
 
-    with open(config_path, mode = "rb") as fp:
-        config = tomllib.load(fp)
+    vectors: typing.List[ typing.List[ float ] ] = embed_texts(
+        model,
+        [ texts[i] for i in todo ],
+        batch_size = batch_size,
+    )
 
-    conn: kuzu.Connection = db_connect(
-        db_path = pathlib.Path(config["db"]["db_path"]),
+    for row in rows:
+        row["embedding"] = None
+
+    for i, vector in zip(todo, vectors):
+        rows[i]["embedding"] = vector
+
+    return len(todo)
+
+
+def delete_pages (
+    conn: kuzu.Connection,
+    ids: typing.List[ int ],
+    ) -> int:
+    """
+Delete one chunk of `Page` rows, along with their links, returning
+the number of links deleted.
+    """
+    num_links: int = conn.execute(  # type: ignore
+        """
+    MATCH (src:Page)-[:Link]->(dst:Page)
+    WHERE src.id IN $ids OR dst.id IN $ids
+    RETURN count(*)
+        """,
+        { "ids": ids },
+    ).get_next()[0]
+
+    conn.execute(
+        """
+    MATCH (p:Page)
+    WHERE p.id IN $ids
+    DETACH DELETE p
+        """,
+        { "ids": ids },
     )
 
-    ## start code profiling
-    profiler: Profiler = Profiler()
-    profiler.start()
+    return num_links
 
-    ######################################################################
-    ## define schema
 
-    conn.execute("""
+def resolve_links (
+    conn: kuzu.Connection,
+    link_columns: typing.Dict[ str, list ],
+    ) -> pd.DataFrame:
+    """
+Resolve the `src` path and `dst` URI of each link to `Page` primary
+keys via DataFrame joins, as the rows for a bulk `COPY Link` -- links
+with endpoints which don't match any page get dropped.
+    """
+    df_id: pd.DataFrame = conn.execute(  # type: ignore
+        """
+    MATCH (p:Page)
+    RETURN
+        p.id AS id,
+        p.path AS path,
+        p.uri AS uri
+        """,
+    ).get_as_df()
+
+    df_link: pd.DataFrame = pd.DataFrame(
+        link_columns,
+        columns = [ "src", "dst", "sym" ],
+    ).merge(
+        df_id[[ "id", "path" ]].dropna().rename(columns = { "id": "src_id", "path": "src" }),
+        on = "src",
+    ).merge(
+        df_id[[ "id", "uri" ]].rename(columns = { "id": "dst_id", "uri": "dst" }),
+        on = "dst",
+    )
+
+    return df_link[[ "src_id", "dst_id", "sym" ]].drop_duplicates()
+
+
+def create_schema (
+    conn: kuzu.Connection,
+    *,
+    embed_dim: int,
+    incremental: bool = False,
+    ) -> None:
+    """
+Define the schema, with `embed_dim` as the dimension of the embedding
+vectors, dropping any previous tables unless loading incrementally.
+An incremental load requires tables with this same schema, since
+`COPY` maps the columns by position: after a schema change, rebuild
+the database with a full load first.
+    """
+    if not incremental:
+        conn.execute("""
 DROP TABLE IF EXISTS Link;
 DROP TABLE IF EXISTS Page;
-    """)
+        """)
 
-    conn.execute("""
-CREATE NODE TABLE Page(
-    id SERIAL PRIMARY KEY,
+    conn.execute(f"""
+CREATE NODE TABLE IF NOT EXISTS Page(
+    id INT64 PRIMARY KEY,
     uri STRING,
+    kind STRING,
     status STRING,
     type STRING,
     path STRING,
@@ -86,77 +230,271 @@ CREATE NODE TABLE Page(
     summary STRING,
     thumbnail STRING,
     error STRING,
-    timing DOUBLE
+    timing DOUBLE,
+    text_hash STRING,
+    digest STRING,
+    embedding FLOAT[{embed_dim}]
 );
     """)
 
     conn.execute("""
-CREATE REL TABLE Link(
+CREATE REL TABLE IF NOT EXISTS Link(
     FROM Page TO Page,
     sym BOOLEAN
 );
     """)
 
+
+def load_pages (  # pylint: disable=R0912,R0913,R0914,R0915
+    conn: kuzu.Connection,
+    report_path: pathlib.Path,
+    counts: typing.Dict[ str, int ],
+    model: SentenceTransformer,
+    *,
+    chunk_size: int = 10000,
+    batch_size: int = 64,
+    ) -> typing.Dict[ str, list ]:
+    """
+Stream the JSONL report, upserting pages in chunks: new pages get
+bulk loaded, pages whose digest changed get updated in place, and
+pages no longer in the report get deleted. Embeddings only get
+computed for new pages and for pages whose text has changed -- which
+only saves work in incremental mode, since otherwise the tables were
+dropped and every page is new. Returns the links, as columns of their
+`src`, `dst`, and `sym` values, since one dict per link would take
+far more memory than the pages do.
+    """
+    existing: typing.Dict[ int, typing.Tuple[ str, str ] ] = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute(  # type: ignore
+            """
+    MATCH (p:Page)
+    RETURN p.id, p.digest, p.text_hash
+            """,
+        ).get_as_df().itertuples(index = False)
+    }
+
+    seen: typing.Set[ int ] = set()
+    insert_rows: typing.List[ dict ] = []
+    insert_texts: typing.List[ str ] = []
+    update_rows: typing.List[ dict ] = []
+    embed_update_rows: typing.List[ dict ] = []
+    embed_update_texts: typing.List[ str ] = []
+    link_columns: typing.Dict[ str, list ] = {
+        "src": [],
+        "dst": [],
+        "sym": [],
+    }
+
+    for page in iter_report(report_path):
+        # records without a `kind` only add back-references which were
+        # discovered after the page had been written
+        if "kind" in page:
+            row: dict = verify_page(page)
+
+            if row["id"] in seen:
+                ic("duplicate page", row["uri"])
+                continue
+
+            seen.add(row["id"])
+
+            if row["id"] not in existing:
+                insert_rows.append(row)
+                insert_texts.append(page_text(page))
+                counts["pages_inserted"] += 1
+
+            elif existing[row["id"]][0] != row["digest"]:
+                if existing[row["id"]][1] != row["text_hash"]:
+                    embed_update_rows.append(row)
+                    embed_update_texts.append(page_text(page))
+                else:
+                    update_rows.append(row)
+
+                counts["pages_updated"] += 1
+
+            if len(insert_rows) >= chunk_size:
+                counts["pages_embedded"] += embed_rows(model, insert_rows, insert_texts, batch_size = batch_size)  # pylint: disable=C0301
+                copy_pages(conn, insert_rows)
+                insert_rows, insert_texts = [], []
+
+            if len(embed_update_rows) >= chunk_size:
+                counts["pages_embedded"] += embed_rows(model, embed_update_rows, embed_update_texts, batch_size = batch_size)  # pylint: disable=C0301
+                update_pages(conn, embed_update_rows)
+                embed_update_rows, embed_update_texts = [], []
+
+            if len(update_rows) >= chunk_size:
+                update_pages(conn, update_rows)
+                update_rows = []
+
+        for sym, refs in ( ( True, page["refs"], ), ( False, page["raw"], ), ):
+            link_columns["src"].extend(refs)
+            link_columns["dst"].extend([ page["uri"] ] * len(refs))
+            link_columns["sym"].extend([ sym ] * len(refs))
+
+    if len(insert_rows) > 0:
+        counts["pages_embedded"] += embed_rows(model, insert_rows, insert_texts, batch_size = batch_size)  # pylint: disable=C0301
+        copy_pages(conn, insert_rows)
+
+    if len(embed_update_rows) > 0:
+        counts["pages_embedded"] += embed_rows(model, embed_update_rows, embed_update_texts, batch_size = batch_size)  # pylint: disable=C0301
+        update_pages(conn, embed_update_rows)
+
+    if len(update_rows) > 0:
+        update_pages(conn, update_rows)
+
+    deleted: typing.List[ int ] = [ page_id for page_id in existing if page_id not in seen ]
+    counts["pages_deleted"] = len(deleted)
+
+    for i in range(0, len(deleted), chunk_size):
+        counts["links_deleted"] += delete_pages(conn, deleted[i:i + chunk_size])
+
+    return link_columns
+
+
+def load_links (
+    conn: kuzu.Connection,
+    link_columns: typing.Dict[ str, list ],
+    counts: typing.Dict[ str, int ],
+    ) -> None:
+    """
+Diff the links against those already loaded, deleting the links which
+have gone away then bulk loading the new ones.
+    """
+    df_link: pd.DataFrame = resolve_links(conn, link_columns)
+
+    df_prev: pd.DataFrame = conn.execute(  # type: ignore
+        """
+    MATCH (src:Page)-[rel:Link]->(dst:Page)
+    RETURN
+        src.id AS src_id,
+        dst.id AS dst_id,
+        rel.sym AS sym
+        """,
+    ).get_as_df()
+
+    df_diff: pd.DataFrame = df_link.merge(
+        df_prev,
+        on = [ "src_id", "dst_id", "sym" ],
+        how = "outer",
+        indicator = True,
+    )
+
+    df_add: pd.DataFrame = df_diff[df_diff["_merge"] == "left_only"][[ "src_id", "dst_id", "sym" ]]
+    df_del: pd.DataFrame = df_diff[df_diff["_merge"] == "right_only"][[ "src_id", "dst_id", "sym" ]]
+
+    counts["links_added"] += len(df_add)
+    counts["links_deleted"] += len(df_del)
+
+    if len(df_del) > 0:
+        conn.execute("""
+LOAD FROM df_del
+MATCH (src:Page {id: src_id})-[rel:Link]->(dst:Page {id: dst_id})
+WHERE rel.sym = sym
+DELETE rel
+        """)
+
+    if len(df_add) > 0:
+        conn.execute("""
+COPY Link FROM df_add
+        """)
+
+
+def main (
+    ) -> int:
+    """
+Main entry point
+    """
+    config_path: pathlib.Path = pathlib.Path("config.toml")
+    config: dict = {}
+
+    with open(config_path, mode = "rb") as fp:
+        config = tomllib.load(fp)
+
+    conn: kuzu.Connection = db_connect(
+        db_path = pathlib.Path(config["db"]["db_path"]),
+    )
+
+    ## should the load fail, let the web app reopen the database anyway
+    atexit.register(reload_path(pathlib.Path(config["db"]["db_path"])).unlink, missing_ok = True)
+
+    ## incremental mode only applies changes since the previous load,
+    ## re-embedding just the pages whose text changed; otherwise the
+    ## tables get dropped and every page gets embedded again
+    incremental: bool = config["db"].get("incremental", False)
+
+    ## the vector index is opt-in, since installing its extension
+    ## requires network access
+    vector_index: bool = config["db"].get("vector_index", False)
+
+    counts: typing.Dict[ str, int ] = {
+        "pages_inserted": 0,
+        "pages_updated": 0,
+        "pages_deleted": 0,
+        "pages_embedded": 0,
+        "links_added": 0,
+        "links_deleted": 0,
+    }
+
+    ## start code profiling
+    profiler: Profiler = Profiler()
+    profiler.start()
+
+    model: SentenceTransformer = load_model(
+        embed_model = config["db"].get("embed_model", "all-MiniLM-L6-v2"),
+        num_threads = config["db"].get("embed_threads"),
+    )
+
     ######################################################################
-    ## load JSON data
+    ## define schema
 
-    with open(pathlib.Path("report"), "r", encoding = "utf-8") as fp:
-        dat: list = json.load(fp)
+    create_schema(
+        conn,
+        embed_dim = model.get_sentence_embedding_dimension(),  # type: ignore
+        incremental = incremental,
+    )
 
-    df_page = pd.DataFrame([
-        verify_page(page)
-        for page in dat
-    ])
-    ic(df_page)
+    ## the vector index gets rebuilt after the embeddings have changed
+    if vector_index:
+        load_vector_extension(conn)
 
-    conn.execute("""
-COPY Page FROM df_page
-    """)
+        if has_vector_index(conn):
+            conn.execute(f"CALL DROP_VECTOR_INDEX('Page', '{VECTOR_INDEX}')")
 
-    df_ref = pd.DataFrame([
-        {
-            "src": ref,
-            "dst": page["uri"],
-        }
-        for page in dat
-        for ref in page["refs"]
-    ])
-    ic(df_ref)
-
-    for row in df_ref.to_dict(orient = "records"):
-        conn.execute(
-            """
-    MATCH (src:Page {path: $src})
-    MATCH (dst:Page {uri: $dst})
-    CREATE (src)-[:Link {sym: true}]->(dst);
-            """,
-            row,
-        )
-
-    df_raw = pd.DataFrame([
-        {
-            "src": ref,
-            "dst": page["uri"],
-        }
-        for page in dat
-        for ref in page["raw"]
-    ])
-    ic(df_raw)
-
-    for row in df_raw.to_dict(orient = "records"):
-        conn.execute(
-            """
-    MATCH (src:Page {path: $src})
-    MATCH (dst:Page {uri: $dst})
-    CREATE (src)-[:Link {sym: false}]->(dst);
-            """,
-            row,
-        )
+    ######################################################################
+    ## stream the JSONL report, upserting pages in chunks
+
+    link_columns: typing.Dict[ str, list ] = load_pages(
+        conn,
+        pathlib.Path("report.jsonl"),
+        counts,
+        model,
+        chunk_size = config["db"].get("chunk_size", 10000),
+        batch_size = config["db"].get("embed_batch_size", 64),
+    )
+
+    if vector_index:
+        conn.execute(f"CALL CREATE_VECTOR_INDEX('Page', '{VECTOR_INDEX}', 'embedding', metric := 'cosine')")  # pylint: disable=C0301
+
+    ######################################################################
+    ## bulk load the links, with endpoints resolved to primary keys
+
+    load_links(conn, link_columns, counts)
+
+    ## release the database, then signal the web app to reopen it and
+    ## invalidate its cached query results
+    conn.close()
+    conn.database.close()
+
+    generation: str = write_generation(pathlib.Path(config["db"]["db_path"]))
+
+    ic(incremental, counts, generation)
 
     ## end code profiling
     profiler.stop()
     profiler.print()
 
+    return 0
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -44,6 +44,7 @@ if __name__ == "__main__":
     )
 
     APP.include_router(endpoints.router)
+    APP.middleware("http")(endpoints.record_request)
 
     ## run the webapp
     uvicorn.run(
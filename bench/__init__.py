@@ -0,0 +1,7 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for Nyddu.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
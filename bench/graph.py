@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the memory used to track pages and links during a crawl,
+comparing the previous `Page` models with sets of URL strings against
+the compact `PageRecord` plus `LinkGraph` with interned integer ids.
+
+Run from the repo root, optionally with the number of pages:
+
+    python -m bench.graph [num_pages]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+import typing
+
+from nyddu import LinkGraph, Page, PageRecord, URLKind
+
+
+SITE_BASE: str = "https://example.com"
+
+
+def synthetic_links (
+    num_pages: int,
+    *,
+    num_nav: int = 20,
+    num_body: int = 20,
+    seed: int = 42,
+    ) -> typing.List[ typing.List[ int ] ]:
+    """
+Generate a link graph shaped like a typical site: every page links to
+the same navigation pages, plus to random pages in its body text.
+    """
+    rng: random.Random = random.Random(seed)
+
+    return [
+        list(range(min(num_nav, num_pages))) + [
+            rng.randrange(num_pages)
+            for _ in range(num_body)
+        ]
+        for _ in range(num_pages)
+    ]
+
+
+def crawl_pages (
+    links: typing.List[ typing.List[ int ] ],
+    ) -> typing.Dict[ str, Page ]:
+    """
+The previous approach: one `Page` model per URL, with each of its
+links kept as strings in sets. As during a crawl, each link string
+gets built anew on every page where it gets discovered.
+    """
+    pages: typing.Dict[ str, Page ] = {}
+
+    for i in range(len(links)):
+        path: str = f"/page/{i}"
+        pages[path] = Page(uri = f"{SITE_BASE}{path}", kind = URLKind.INTERNAL, path = path)
+
+    for i, targets in enumerate(links):
+        ref: Page = pages[f"/page/{i}"]
+
+        for j in targets:
+            path = f"/page/{j}"
+            ref.outbound.add(path)
+            ref.outbound.add(f"{SITE_BASE}{path}")
+            pages[path].add_ref(ref.path)
+
+    return pages
+
+
+def crawl_records (
+    links: typing.List[ typing.List[ int ] ],
+    ) -> typing.Tuple[ LinkGraph, typing.Dict[ str, PageRecord ] ]:
+    """
+The compact approach: one `PageRecord` per URL, with the links kept
+as interned ids in the `LinkGraph`.
+    """
+    graph: LinkGraph = LinkGraph()
+    pages: typing.Dict[ str, PageRecord ] = {}
+
+    for i in range(len(links)):
+        path: str = f"/page/{i}"
+        pages[path] = PageRecord(
+            graph,
+            uri = f"{SITE_BASE}{path}",
+            kind = URLKind.INTERNAL,
+            path = path,
+        )
+
+    for i, targets in enumerate(links):
+        ref: PageRecord = pages[f"/page/{i}"]
+
+        for j in targets:
+            path = f"/page/{j}"
+            graph.add_outbound(ref.node, path)
+            graph.add_outbound(ref.node, f"{SITE_BASE}{path}")
+            graph.add_ref(pages[path].node, ref.path)
+
+    return graph, pages
+
+
+def measure (
+    label: str,
+    func: typing.Callable[ [], typing.Any ],
+    ) -> typing.Tuple[ float, int ]:
+    """
+Measure and report the elapsed time, then in a separate traced run the
+memory still allocated once the crawl structures have been built.
+    """
+    start_time: float = time.perf_counter()
+    func()
+    elapsed: float = time.perf_counter() - start_time
+
+    tracemalloc.start()
+    result: typing.Any = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    print(f"{label:>26}: {elapsed:8.2f} sec  {current / 1024**2:9.1f} MiB")
+    return elapsed, current
+
+
+if __name__ == "__main__":
+    pages_count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    graph_links: typing.List[ typing.List[ int ] ] = synthetic_links(pages_count)
+
+    print(f"graph: {pages_count} pages, {sum(len(targets) for targets in graph_links)} links")
+
+    _, base_mem = measure("before: Page + sets", lambda: crawl_pages(graph_links))
+    _, mem = measure("after: PageRecord + graph", lambda: crawl_records(graph_links))
+
+    print(f"{'':>26}  {base_mem / mem:.1f}x less memory")
@@ -0,0 +1,473 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Reproducible end-to-end benchmark, which runs entirely offline against
+the synthetic stand-in site: crawl it with `Crawler.crawl`, load the
+report into KùzuDB the way `2_load.py` does, then request the
+`NydduEndpoints` routes. Each stage runs in its own process, to
+measure its peak RSS separately.
+
+Run from the repo root, optionally with a TOML file whose `[bench]`
+table overrides the defaults below, e.g., `num_pages` or any other
+field of `SiteSpec`:
+
+    python -m bench.harness [bench.toml]
+
+The Hugging Face hub gets put in offline mode, so by default a tiny
+embedding model gets built over the vocabulary of the synthetic site.
+To measure a pre-trained model instead, set `embed_model` to its name
+once it's cached locally, or to a local path. The vector index
+requires installing the KùzuDB `vector` extension, which needs network
+access, so `vector_index` is disabled by default -- and with it the
+`/search` and `/related` routes.
+
+The crawl runs once for each of the `crawl_profiles`, labeled in the
+results: `defaults` uses the crawler's own defaults, with checkpoints
+and conditional revalidation, while `bare` turns off those overheads
+and the queue bound. The load and the routes use the report from the
+first profile.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tomllib
+import typing
+
+from fastapi import FastAPI  # pylint: disable=E0401
+from fastapi.testclient import TestClient  # pylint: disable=E0401
+from sentence_transformers import SentenceTransformer, models
+import torch
+
+from nyddu import VECTOR_INDEX, Crawler, NydduEndpoints, db_connect, has_vector_index, \
+    load_model, load_vector_extension, write_generation
+
+from .site import NUM_WORDS, SiteSpec, SyntheticSite
+
+
+CRAWL_PROFILES: typing.Dict[ str, typing.Dict[ str, typing.Any ] ] = {
+    "defaults": {},
+    "bare": {
+        "queue_maxsize": 0,
+        "checkpoint_interval": 0,
+        "revalidate": False,
+    },
+}
+
+
+BENCH_DEFAULTS: typing.Dict[ str, typing.Any ] = {
+    "crawl_profiles": list(CRAWL_PROFILES),
+    "queue_maxsize": 1000,
+    "num_workers": 8,
+    "host_rate": 0.0,
+    "host_max_in_flight": 4,
+    "host_backoff": 0.5,
+    "parse_workers": 0,
+    "html_parser": "html.parser",
+    "embed_model": None,
+    "embed_threads": None,
+    "vector_index": False,
+    "chunk_size": 10000,
+    "route_repeat": 20,
+    "detail_pages": 20,
+    "workdir": None,
+    "results_path": None,
+}
+
+
+def peak_rss (
+    ) -> float:
+    """
+Peak resident set size of this process, in MiB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def percentiles (
+    latencies: typing.List[ float ],
+    ) -> typing.Dict[ str, float ]:
+    """
+Summarize request latencies in milliseconds.
+    """
+    cuts: typing.List[ float ] = statistics.quantiles(latencies, n = 100, method = "inclusive")
+
+    return {
+        "count": len(latencies),
+        "p50_ms": cuts[49] * 1000.0,
+        "p90_ms": cuts[89] * 1000.0,
+        "p95_ms": cuts[94] * 1000.0,
+        "p99_ms": cuts[98] * 1000.0,
+        "max_ms": max(latencies) * 1000.0,
+    }
+
+
+def build_model (
+    path: pathlib.Path,
+    *,
+    dim: int = 64,
+    seed: int = 42,
+    ) -> pathlib.Path:
+    """
+Build a tiny embedding model for the vocabulary of the synthetic site
+-- a bag of words, projected by a seeded random layer -- and save it
+to `path`, so that the benchmark runs without a pre-trained model.
+    """
+    vocab: typing.List[ str ] = [ "page" ] + [ f"word{i}" for i in range(NUM_WORDS) ]
+    torch.manual_seed(seed)
+
+    bow: models.BoW = models.BoW(vocab)
+
+    dense: models.Dense = models.Dense(
+        bow.get_sentence_embedding_dimension(),
+        dim,
+        activation_function = torch.nn.Identity(),
+    )
+
+    SentenceTransformer(modules = [ bow, dense ], device = "cpu").save(str(path))
+    return path
+
+
+def write_config (
+    path: pathlib.Path,
+    workdir: pathlib.Path,
+    site: SyntheticSite,
+    bench: typing.Dict[ str, typing.Any ],
+    profile: str,
+    ) -> None:
+    """
+Write the configuration for the crawler, loader, and webapp, with the
+crawler settings of a profile from `CRAWL_PROFILES` -- each profile
+gets its own cache, so that the crawls don't share any state. The
+crawler has no default for `queue_maxsize`, so that comes from the
+bench settings unless the profile overrides it.
+    """
+    optional: str = ""
+
+    if bench["embed_threads"] is not None:
+        optional = f"embed_threads = {int(bench['embed_threads'])}\n"
+
+    settings: typing.Dict[ str, typing.Any ] = {
+        "queue_maxsize": int(bench["queue_maxsize"]),
+        **CRAWL_PROFILES[profile],
+    }
+
+    crawl_settings: str = "".join(
+        f"{key} = {json.dumps(value)}\n"
+        for key, value in settings.items()
+    )
+
+    (workdir / profile).mkdir(exist_ok = True)
+
+    path.write_text(f"""[nyddu]
+site_base = {json.dumps(site.site_base)}
+site_map = {json.dumps(site.site_map)}
+cache_path = {json.dumps(str(workdir / profile / "cache"))}
+cache_expire = 0
+num_workers = {int(bench["num_workers"])}
+parse_workers = {int(bench["parse_workers"])}
+html_parser = {json.dumps(bench["html_parser"])}
+host_rate = {float(bench["host_rate"])}
+host_max_in_flight = {int(bench["host_max_in_flight"])}
+host_backoff = {float(bench["host_backoff"])}
+{crawl_settings}
+[db]
+db_path = {json.dumps(str(workdir / "db"))}
+embed_model = {json.dumps(bench["embed_model"])}
+vector_index = {json.dumps(bool(bench["vector_index"]))}
+incremental = true
+chunk_size = {int(bench["chunk_size"])}
+{optional}
+[webapp]
+templates = {json.dumps(str(pathlib.Path("templates").resolve()))}
+port = 8000
+host = "127.0.0.1"
+""", encoding = "utf-8")
+
+
+def run_crawl (
+    config_path: pathlib.Path,
+    report_path: pathlib.Path,
+    ) -> typing.Dict[ str, typing.Any ]:
+    """
+Stage: crawl the synthetic site.
+    """
+    crawler: Crawler = Crawler(
+        config_path = config_path,
+        report_path = report_path,
+    )
+
+    start_time: float = time.perf_counter()
+    asyncio.run(crawler.crawl())
+    elapsed: float = time.perf_counter() - start_time
+
+    phases: typing.Dict[ str, float ] = {
+        key[0]: crawler.metrics.fetch_seconds.sums[key] / max(1, sum(counts)) * 1000.0
+        for key, counts in crawler.metrics.fetch_seconds.counts.items()
+    }
+
+    return {
+        "seconds": elapsed,
+        "pages_crawled": crawler.count,
+        "pages_known": len(crawler.known_pages),
+        "pages_per_second": crawler.count / elapsed,
+        "fetch_errors": sum(crawler.metrics.fetch_errors.values.values()),
+        "fetch_mean_ms": phases,
+        "peak_rss_mib": peak_rss(),
+    }
+
+
+def run_load (
+    config_path: pathlib.Path,
+    report_path: pathlib.Path,
+    ) -> typing.Dict[ str, typing.Any ]:
+    """
+Stage: load the report into KùzuDB, the way `2_load.py` does, then
+reload it incrementally, where nothing has changed.
+    """
+    load: typing.Any = importlib.import_module("2_load")
+
+    with open(config_path, mode = "rb") as fp:
+        config: dict = tomllib.load(fp)
+
+    db_path: pathlib.Path = pathlib.Path(config["db"]["db_path"])
+    conn: typing.Any = db_connect(db_path = db_path)
+
+    start_time: float = time.perf_counter()
+
+    model: typing.Any = load_model(
+        embed_model = config["db"]["embed_model"],
+        num_threads = config["db"].get("embed_threads"),
+    )
+
+    result: typing.Dict[ str, typing.Any ] = {
+        "model_seconds": time.perf_counter() - start_time,
+    }
+
+    for label in [ "load", "reload" ]:
+        counts: typing.Dict[ str, int ] = {
+            "pages_inserted": 0,
+            "pages_updated": 0,
+            "pages_deleted": 0,
+            "pages_embedded": 0,
+            "links_added": 0,
+            "links_deleted": 0,
+        }
+
+        start_time = time.perf_counter()
+        load.create_schema(
+            conn,
+            embed_dim = model.get_sentence_embedding_dimension(),
+            incremental = True,
+        )
+
+        if config["db"]["vector_index"]:
+            load_vector_extension(conn)
+
+            if has_vector_index(conn):
+                conn.execute(f"CALL DROP_VECTOR_INDEX('Page', '{VECTOR_INDEX}')")
+
+        link_rows: typing.List[ dict ] = load.load_pages(
+            conn,
+            report_path,
+            counts,
+            model,
+            chunk_size = config["db"]["chunk_size"],
+        )
+
+        if config["db"]["vector_index"]:
+            conn.execute(f"CALL CREATE_VECTOR_INDEX('Page', '{VECTOR_INDEX}', 'embedding', metric := 'cosine')")  # pylint: disable=C0301
+
+        load.load_links(conn, link_rows, counts)
+        write_generation(db_path)
+
+        result[f"{label}_seconds"] = time.perf_counter() - start_time
+        result[f"{label}_counts"] = counts
+
+    result["peak_rss_mib"] = peak_rss()
+    return result
+
+
+def run_routes (  # pylint: disable=R0914
+    config_path: pathlib.Path,
+    bench: typing.Dict[ str, typing.Any ],
+    ) -> typing.Dict[ str, typing.Any ]:
+    """
+Stage: request the webapp routes in-process, with a test client, and
+measure their latency percentiles. The query cache gets cleared by
+each load, so the first request to each route is a cache miss.
+    """
+    with open(config_path, mode = "rb") as fp:
+        config: dict = tomllib.load(fp)
+
+    start_time: float = time.perf_counter()
+    endpoints: NydduEndpoints = NydduEndpoints(config)
+    startup: float = time.perf_counter() - start_time
+
+    app: FastAPI = FastAPI()
+    app.include_router(endpoints.router)
+    app.middleware("http")(endpoints.record_request)
+    client: TestClient = TestClient(app)
+
+    with endpoints.pool.connection() as (conn, _):
+        page_ids: typing.List[ int ] = [
+            row[0]
+            for row in conn.execute(  # type: ignore
+                "MATCH (p:Page) WHERE p.title IS NOT NULL RETURN p.id ORDER BY p.id LIMIT $limit",
+                { "limit": int(bench["detail_pages"]) },
+            ).get_as_df().itertuples(index = False)
+        ]
+
+    routes: typing.Dict[ str, typing.List[ str ] ] = {
+        "/pages": [ "/pages" ],
+        "/pages/data": [
+            "/pages/data?draw=1&start=0&length=50&order[0][column]=0&order[0][dir]=asc",
+            "/pages/data?draw=2&start=50&length=50&search[value]=word1",
+        ],
+        "/detail/{page_id}": [ f"/detail/{page_id}" for page_id in page_ids ],
+        "/metrics": [ "/metrics" ],
+    }
+
+    if config["db"]["vector_index"]:
+        routes["/search"] = [ f"/search?q=word{page_id % 500}%20word{page_id % 499}" for page_id in page_ids ]  # pylint: disable=C0301
+        routes["/related/{page_id}"] = [ f"/related/{page_id}" for page_id in page_ids ]
+
+    result: typing.Dict[ str, typing.Any ] = {
+        "startup_seconds": startup,
+        "routes": {},
+    }
+
+    for route, urls in routes.items():
+        latencies: typing.List[ float ] = []
+
+        for _ in range(int(bench["route_repeat"])):
+            for url in urls:
+                start_time = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - start_time)
+
+                if response.status_code >= 400:
+                    logging.error("route error: %s %d", url, response.status_code)
+
+        result["routes"][route] = percentiles(latencies)
+
+    result["peak_rss_mib"] = peak_rss()
+    return result
+
+
+def run_stage (
+    func: typing.Callable[ ..., typing.Dict[ str, typing.Any ] ],
+    *args: typing.Any,
+    ) -> typing.Dict[ str, typing.Any ]:
+    """
+Run one stage in a fresh process, so that its peak RSS gets measured
+apart from the other stages and from the site servers.
+    """
+    with ProcessPoolExecutor(
+        max_workers = 1,
+        mp_context = multiprocessing.get_context("spawn"),
+    ) as executor:
+        return executor.submit(func, *args).result()
+
+
+def report (
+    results: typing.Dict[ str, typing.Any ],
+    ) -> None:
+    """
+Print a summary of the results.
+    """
+    load: typing.Dict[ str, typing.Any ] = results["load"]
+    routes: typing.Dict[ str, typing.Any ] = results["routes"]
+
+    for profile, crawl in results["crawl"].items():
+        print(f"{'crawl ' + profile:>20}: {crawl['seconds']:8.2f} sec  {crawl['pages_per_second']:8.1f} pages/sec  {crawl['peak_rss_mib']:8.1f} MiB peak RSS")  # pylint: disable=C0301
+        print(f"{'':>20}  {crawl['pages_crawled']} crawled, {crawl['pages_known']} known, {crawl['fetch_errors']} fetch errors")  # pylint: disable=C0301
+
+        for phase, mean_ms in sorted(crawl["fetch_mean_ms"].items()):
+            print(f"{'fetch ' + phase:>20}: {mean_ms:8.2f} ms mean")
+
+    print(f"{'load model':>20}: {load['model_seconds']:8.2f} sec")
+    print(f"{'load':>20}: {load['load_seconds']:8.2f} sec  {load['peak_rss_mib']:8.1f} MiB peak RSS  {load['load_counts']}")  # pylint: disable=C0301
+    print(f"{'reload':>20}: {load['reload_seconds']:8.2f} sec  {load['reload_counts']}")
+
+    print(f"{'webapp startup':>20}: {routes['startup_seconds']:8.2f} sec  {routes['peak_rss_mib']:8.1f} MiB peak RSS")  # pylint: disable=C0301
+
+    for route, stats in routes["routes"].items():
+        print(f"{route:>20}: p50 {stats['p50_ms']:7.2f}  p90 {stats['p90_ms']:7.2f}  p95 {stats['p95_ms']:7.2f}  p99 {stats['p99_ms']:7.2f}  max {stats['max_ms']:7.2f} ms  ({stats['count']} requests)")  # pylint: disable=C0301
+
+
+def main (
+    bench: typing.Dict[ str, typing.Any ],
+    ) -> typing.Dict[ str, typing.Any ]:
+    """
+Run the stages of the benchmark against the synthetic site, in a work
+directory which gets removed afterwards unless `workdir` is set.
+    """
+    spec: SiteSpec = SiteSpec.from_config(bench)
+
+    # nothing gets fetched from the network, apart from the local site
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+
+    with tempfile.TemporaryDirectory(prefix = "nyddu_bench_") as tmp_dir:
+        workdir: pathlib.Path = pathlib.Path(bench["workdir"] or tmp_dir)
+        workdir.mkdir(parents = True, exist_ok = True)
+
+        profiles: typing.List[ str ] = list(bench["crawl_profiles"])
+        config_path: pathlib.Path = workdir / "config.toml"
+        report_path: pathlib.Path = workdir / "report.jsonl"
+
+        if bench["embed_model"] is None:
+            bench = {
+                **bench,
+                "embed_model": str(build_model(workdir / "model")),
+            }
+
+        results: typing.Dict[ str, typing.Any ] = {
+            "spec": spec._asdict(),
+            "crawl": {},
+        }
+
+        with SyntheticSite(spec) as site:
+            print(f"site: {spec}")
+
+            # crawl the other profiles first, so that the report and
+            # the config of the first profile get used afterwards
+            for profile in profiles[1:] + profiles[:1]:
+                write_config(config_path, workdir, site, bench, profile)
+                results["crawl"][profile] = run_stage(run_crawl, config_path, report_path)
+
+            results["crawl"] = { profile: results["crawl"][profile] for profile in profiles }
+
+        results["load"] = run_stage(run_load, config_path, report_path)
+        results["routes"] = run_stage(run_routes, config_path, bench)
+
+    return results
+
+
+if __name__ == "__main__":
+    bench_config: typing.Dict[ str, typing.Any ] = dict(BENCH_DEFAULTS)
+
+    if len(sys.argv) > 1:
+        with open(pathlib.Path(sys.argv[1]), mode = "rb") as bench_fp:
+            bench_config.update(tomllib.load(bench_fp).get("bench", {}))
+
+    logging.basicConfig(level = logging.WARNING)
+    bench_results: typing.Dict[ str, typing.Any ] = main(bench_config)
+    report(bench_results)
+
+    if bench_config["results_path"] is not None:
+        pathlib.Path(bench_config["results_path"]).write_text(
+            json.dumps(bench_results, indent = 2),
+            encoding = "utf-8",
+        )
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the normalization of discovered links, comparing the previous
+per-link pipeline against the memoized `URLNormalizer` -- on a stream
+of links where navigation and footer links recur on every page.
+
+Run from the repo root, optionally with the number of links:
+
+    python -m bench.normalize [num_links]
+"""
+
+import posixpath
+import random
+import sys
+import time
+import typing
+import urllib.parse
+
+import w3lib.url
+
+from nyddu import Page, URLNormalizer
+
+
+SITE_BASE: str = "https://example.com"
+
+IGNORED_PREFIX: typing.List[ str ] = [
+    f"/archive/{year}/"
+    for year in range(1990, 2030)
+] + [
+    "/admin/",
+    "/cart/",
+    "/login",
+    "/search?",
+    "/tag/",
+]
+
+
+def synthetic_stream (
+    num_links: int,
+    *,
+    num_nav: int = 200,
+    num_pages: int = 50000,
+    num_external: int = 5000,
+    seed: int = 42,
+    ) -> typing.List[ str ]:
+    """
+Generate a stream of discovered links: mostly the same navigation and
+footer links, then links to other pages on the site, some of them
+relative or ignored, plus external links.
+    """
+    rng: random.Random = random.Random(seed)
+
+    nav: typing.List[ str ] = [
+        f"/section/{i % 20}/topic-{i}" if i % 2 else f"{SITE_BASE}/section/{i % 20}/"
+        for i in range(num_nav)
+    ]
+
+    stream: typing.List[ str ] = []
+
+    for _ in range(num_links):
+        draw: float = rng.random()
+
+        if draw < 0.70:
+            stream.append(rng.choice(nav))
+        elif draw < 0.95:
+            i: int = rng.randrange(num_pages)
+
+            match i % 4:
+                case 0:
+                    stream.append(f"/post/{i}/../post-{i}#comments")
+                case 1:
+                    stream.append(f"{SITE_BASE}/post/{i}?utm_source=feed")
+                case 2:
+                    stream.append(f"/archive/{1990 + i % 40}/{i}")
+                case _:
+                    stream.append(f"/post/{i}")
+        else:
+            stream.append(f"https://example.org/ref/{rng.randrange(num_external)}?b=2&a=1")
+
+    return stream
+
+
+def baseline (
+    uri: str,
+    ) -> typing.Optional[ str ]:
+    """
+The previous approach: run the full pipeline for every link, with a
+linear scan over the ignored prefixes.
+    """
+    if not (uri.startswith("/") or uri.startswith(SITE_BASE)):
+        return w3lib.url.canonicalize_url(uri)
+
+    if uri.startswith("/"):
+        uri = f"{SITE_BASE}{uri}"
+
+    parsed: urllib.parse.ParseResult = urllib.parse.urlparse(uri)
+    normalized_path: str = posixpath.normpath(parsed.path)
+
+    uri = parsed._replace(path = normalized_path).geturl()
+    uri = uri.split("#")[0]
+    uri = uri.split("?")[0]
+
+    path: str = Page.get_path(
+        uri,
+        base = SITE_BASE,
+    )
+
+    for prefix in IGNORED_PREFIX:
+        if path.startswith(prefix):
+            return None
+
+    return path
+
+
+def memoized (
+    normalizer: URLNormalizer,
+    uri: str,
+    ) -> typing.Optional[ str ]:
+    """
+The memoized approach, with a compiled prefix matcher.
+    """
+    if not (uri.startswith("/") or uri.startswith(SITE_BASE)):
+        return normalizer.normalize_external(uri)
+
+    link: typing.Optional[ typing.Tuple[ str, str ] ] = normalizer.normalize_internal(uri)
+
+    if link is None:
+        return None
+
+    return link[1]
+
+
+def measure (
+    label: str,
+    stream: typing.List[ str ],
+    func: typing.Callable[ [ str ], typing.Optional[ str ] ],
+    ) -> typing.Tuple[ float, typing.List[ typing.Optional[ str ] ] ]:
+    """
+Measure and report throughput in links/sec.
+    """
+    start_time: float = time.perf_counter()
+    results: typing.List[ typing.Optional[ str ] ] = [ func(uri) for uri in stream ]
+    elapsed: float = time.perf_counter() - start_time
+    rate: float = len(stream) / elapsed
+
+    print(f"{label:>24}: {rate:12.1f} links/sec  ({sum(1 for r in results if r is None)} ignored)")
+    return rate, results
+
+
+if __name__ == "__main__":
+    links_count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    links: typing.List[ str ] = synthetic_stream(links_count)
+
+    print(f"stream: {len(links)} links, {len(set(links))} distinct")
+
+    base_rate, expected = measure("before: per link", links, baseline)
+
+    url_normalizer: URLNormalizer = URLNormalizer(
+        SITE_BASE,
+        ignored_prefix = IGNORED_PREFIX,
+    )
+
+    memo_rate, actual = measure(
+        "after: memoized",
+        links,
+        lambda uri: memoized(url_normalizer, uri),
+    )
+
+    assert actual == expected
+    print(f"{'':>24}  {memo_rate / base_rate:.1f}x")
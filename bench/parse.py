@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark HTML parsing throughput, comparing the previous multi-pass
+extraction with `html.parser` against single-pass extraction with each
+of the available parser backends.
+
+Run from the repo root, optionally on a directory of saved HTML files:
+
+    python -m bench.parse [corpus_dir]
+"""
+
+import importlib.util
+import pathlib
+import sys
+import time
+import typing
+
+from bs4 import BeautifulSoup
+
+from nyddu import Page, URLKind
+from nyddu.extract import PARSER_BACKENDS, PARSER_MODULES, extract_html
+
+
+def synthetic_corpus (
+    num_docs: int = 200,
+    num_links: int = 150,
+    ) -> typing.List[ str ]:
+    """
+Generate a corpus of HTML documents shaped like typical site pages,
+with navigation, body text, images, and embeds.
+    """
+    corpus: typing.List[ str ] = []
+
+    for i in range(num_docs):
+        nav: str = "".join(
+            f'<li><a href="/section/{j}">Section {j}</a></li>'
+            for j in range(num_links // 3)
+        )
+
+        body: str = "".join(
+            f'<p>Paragraph {j} with <a href="https://example.org/{i}/{j}">a link</a> '
+            f'and <img src="images/{j}.png" alt="figure {j}"> inline.</p>'
+            for j in range(num_links // 3)
+        )
+
+        corpus.append(f"""<!doctype html>
+<html lang="en"><head>
+<meta charset="utf-8">
+<title>Page {i}</title>
+<meta name="description" content="Summary of page {i}">
+<meta name="keywords" content="alpha, beta, gamma">
+<meta property="og:image" content="https://example.com/thumb/{i}.png">
+<link rel="stylesheet" href="/style.css">
+<script src="/app.js"></script>
+</head><body>
+<nav><ul>{nav}</ul></nav>
+<main>{body}<iframe src="https://www.youtube.com/embed/{i}"></iframe></main>
+<footer><a href="#top">top</a></footer>
+</body></html>""")
+
+    return corpus
+
+
+def load_corpus (
+    corpus_dir: pathlib.Path,
+    ) -> typing.List[ str ]:
+    """
+Load a corpus of saved HTML files.
+    """
+    return [
+        path.read_text(encoding = "utf-8", errors = "replace")
+        for path in sorted(corpus_dir.glob("**/*.htm*"))
+    ]
+
+
+def baseline (
+    html: str,
+    ) -> int:
+    """
+The previous approach: parse the full tree, then walk it once for
+`meta` tags and three more times for links.
+    """
+    page: Page = Page(uri = "https://example.com/bench", kind = URLKind.INTERNAL, path = "/bench")
+    soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
+
+    if soup.title is not None:
+        page.title = soup.title.string  # type: ignore
+
+    for tag in soup.find_all("meta"):
+        if "content" in tag.attrs and tag.attrs.get("name") == "description":  # type: ignore
+            page.summary = tag.attrs["content"]  # type: ignore
+
+    links: int = 0
+
+    for name, attr in [ ("a", "href"), ("img", "src"), ("iframe", "src") ]:
+        for tag in soup.find_all(name):
+            if attr in tag.attrs:  # type: ignore
+                links += 1
+
+    return links
+
+
+def single_pass (
+    html: str,
+    parser: str,
+    ) -> int:
+    """
+The single-pass approach, with the given parser backend.
+    """
+    page: Page = Page(uri = "https://example.com/bench", kind = URLKind.INTERNAL, path = "/bench")
+    extract = extract_html(html, parser = parser)
+    page.apply_meta(extract)
+
+    return len(extract.links)
+
+
+def measure (
+    label: str,
+    corpus: typing.List[ str ],
+    func: typing.Callable[ [ str ], int ],
+    ) -> float:
+    """
+Measure and report throughput in pages/sec.
+    """
+    start_time: float = time.perf_counter()
+    links: int = sum(func(html) for html in corpus)
+    elapsed: float = time.perf_counter() - start_time
+    pages_per_sec: float = len(corpus) / elapsed
+
+    print(f"{label:>24}: {pages_per_sec:9.1f} pages/sec  ({links} links)")
+    return pages_per_sec
+
+
+if __name__ == "__main__":
+    docs: typing.List[ str ] = (
+        load_corpus(pathlib.Path(sys.argv[1]))
+        if len(sys.argv) > 1
+        else synthetic_corpus()
+    )
+
+    print(f"corpus: {len(docs)} docs, {sum(len(html) for html in docs) / 1e6:.1f} MB")
+
+    base_rate: float = measure("before: html.parser x4", docs, baseline)
+
+    for backend in sorted(PARSER_BACKENDS):
+        module: typing.Optional[ str ] = PARSER_MODULES.get(backend)
+
+        if module is not None and importlib.util.find_spec(module) is None:
+            print(f"{backend:>24}: not installed")
+            continue
+
+        rate = measure(
+            f"after: {backend}",
+            docs,
+            lambda html, backend = backend: single_pass(html, backend),  # type: ignore
+        )
+
+        print(f"{'':>24}  {rate / base_rate:.1f}x")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark converting query results for the `/pages` and `/detail`
+routes, comparing the previous DataFrame -> JSON -> dict round-trip
+against streaming rows straight from the `kuzu.QueryResult`.
+
+Run from the repo root after `2_load.py`, optionally with the path to
+the database:
+
+    python -m bench.routes [db_path]
+"""
+
+import json
+import pathlib
+import sys
+import time
+import tomllib
+import tracemalloc
+import typing
+
+import kuzu
+
+from nyddu.routes import PREPARED_QUERIES, result_rows
+
+
+PAGES_QUERY: str = """
+MATCH (p:Page)
+RETURN
+    p.id as id,
+    p.uri as uri,
+    p.slug as slug,
+    p.redirect as redirect,
+    p.type as type,
+    p.status as status,
+    p.title as title,
+    p.summary as summary,
+    p.error as error,
+    p.timing as timing
+"""
+
+DETAIL_QUERIES: typing.List[ str ] = [
+    PREPARED_QUERIES[name]
+    for name in [ "detail", "dst_links", "src_links" ]
+]
+
+
+def df_rows (
+    result: kuzu.QueryResult,
+    ) -> typing.List[ dict ]:
+    """
+The previous approach: convert to a DataFrame, serialize as JSON,
+then parse the JSON back into dictionaries.
+    """
+    return json.loads(
+        result.get_as_df().fillna("").to_json(  # type: ignore
+            orient = "records",
+        ),
+    )
+
+
+def stream_rows (
+    result: kuzu.QueryResult,
+    ) -> typing.List[ dict ]:
+    """
+The streaming approach, shared by the route handlers.
+    """
+    return result_rows(result, fill = "")
+
+
+def measure (
+    label: str,
+    func: typing.Callable[ [], int ],
+    *,
+    repeat: int = 100,
+    ) -> typing.Tuple[ float, int ]:
+    """
+Measure and report the mean latency in milliseconds and the peak
+memory allocated by one call.
+    """
+    func()
+
+    start_time: float = time.perf_counter()
+
+    for _ in range(repeat):
+        rows: int = func()
+
+    elapsed: float = (time.perf_counter() - start_time) / repeat * 1000.0
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:>24}: {elapsed:8.3f} ms  {peak / 1024:9.1f} KiB peak  ({rows} rows)")
+    return elapsed, peak
+
+
+def compare (
+    label: str,
+    run: typing.Callable[ [ typing.Callable[ [ kuzu.QueryResult ], typing.List[ dict ] ] ], int ],
+    ) -> None:
+    """
+Compare both conversions for one route.
+    """
+    base_time, base_peak = measure(f"before: {label}", lambda: run(df_rows))
+    after_time, after_peak = measure(f"after: {label}", lambda: run(stream_rows))
+
+    speedup: float = base_time / after_time
+    savings: float = base_peak / max(1, after_peak)
+
+    print(f"{'':>24}  {speedup:.1f}x faster, {savings:.1f}x less memory")
+
+
+if __name__ == "__main__":
+    db_path: pathlib.Path = pathlib.Path("db")
+
+    if len(sys.argv) > 1:
+        db_path = pathlib.Path(sys.argv[1])
+    else:
+        with open(pathlib.Path("config.toml"), mode = "rb") as fp:
+            db_path = pathlib.Path(tomllib.load(fp)["db"]["db_path"])
+
+    conn: kuzu.Connection = kuzu.Connection(kuzu.Database(db_path, read_only = True))
+
+    page_ids: typing.List[ int ] = [
+        row["id"]
+        for row in result_rows(conn.execute("MATCH (p:Page) RETURN p.id AS id LIMIT 50"))  # type: ignore
+    ]
+
+    print(f"database: {db_path}, {len(page_ids)} sample pages")
+
+    compare(
+        "/pages",
+        lambda convert: len(convert(conn.execute(PAGES_QUERY))),  # type: ignore
+    )
+
+    compare(
+        "/detail",
+        lambda convert: sum(
+            len(convert(conn.execute(query, { "id": page_id })))  # type: ignore
+            for page_id in page_ids
+            for query in DETAIL_QUERIES
+        ),
+    )
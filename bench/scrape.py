@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark per-page scrape time with a headless browser, comparing the
+full scrape against the metadata-only mode, over a local test server
+which serves pages with slow images, fonts, and media.
+
+Requires Chrome and its driver. Run from the repo root:
+
+    python -m bench.scrape [num_pages]
+"""
+
+import asyncio
+import http.server
+import socketserver
+import sys
+import threading
+import time
+import typing
+
+from nyddu.extract import extract_html
+from nyddu.scraper import Scraper
+
+
+RESOURCE_DELAY: float = 0.5
+
+
+class SlowSiteHandler (http.server.BaseHTTPRequestHandler):
+    """
+Serve HTML pages with metadata in their `<head>`, which each embed
+several heavy resources that load slowly.
+    """
+    def log_message (  # pylint: disable=W0622
+        self,
+        format: str,
+        *args: typing.Any,
+        ) -> None:
+        """
+Silence the request logging.
+        """
+
+
+    def send_body (
+        self,
+        body: bytes,
+        content_type: str,
+        ) -> None:
+        """
+Send a successful response.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def do_GET (  # pylint: disable=C0103
+        self,
+        ) -> None:
+        """
+Handle a GET request.
+        """
+        if self.path.startswith("/page/"):
+            num: str = self.path.split("/")[-1]
+            media: str = "".join(
+                f'<img src="/img/{num}_{i}.png"><video src="/media/{num}_{i}.mp4"></video>'
+                for i in range(8)
+            )
+
+            self.send_body(f"""<!doctype html>
+<html><head>
+<title>Page {num}</title>
+<meta name="description" content="Summary of page {num}">
+<meta name="keywords" content="alpha, beta">
+<meta property="og:image" content="/img/{num}_0.png">
+<style>@font-face {{ font-family: Slow; src: url("/font/{num}.woff2"); }} body {{ font-family: Slow; }}</style>
+</head><body><h1>Page {num}</h1>{media}</body></html>""".encode("utf-8"), "text/html")
+
+        else:
+            time.sleep(RESOURCE_DELAY)
+            self.send_body(b"\x00" * 50000, "application/octet-stream")
+
+
+class SlowSite (socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+Threaded local test server.
+    """
+    daemon_threads = True
+
+
+async def measure (
+    label: str,
+    urls: typing.List[ str ],
+    *,
+    metadata_only: bool,
+    ) -> typing.Optional[ float ]:
+    """
+Measure and report the mean scrape time per page in seconds.
+    """
+    scraper: Scraper = Scraper(metadata_only = metadata_only)
+
+    if not scraper.init_driver():
+        print(f"{label:>16}: Chrome driver not available")
+        return None
+
+    try:
+        start_time: float = time.perf_counter()
+        titles: int = 0
+
+        for url in urls:
+            html: typing.Optional[ str ] = await scraper.scrape_page(url)
+
+            if html is not None and extract_html(html).title is not None:
+                titles += 1
+
+        elapsed: float = (time.perf_counter() - start_time) / len(urls)
+
+    finally:
+        scraper.close_driver()
+
+    print(f"{label:>16}: {elapsed:7.2f} sec/page  ({titles}/{len(urls)} titles)")
+    return elapsed
+
+
+async def main (
+    num_pages: int,
+    ) -> None:
+    """
+Run the benchmark against the local test server.
+    """
+    server: SlowSite = SlowSite(("127.0.0.1", 0), SlowSiteHandler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    urls: typing.List[ str ] = [
+        f"http://127.0.0.1:{server.server_address[1]}/page/{i}"
+        for i in range(num_pages)
+    ]
+
+    try:
+        full: typing.Optional[ float ] = await measure(
+            "before: full",
+            urls,
+            metadata_only = False,
+        )
+
+        meta: typing.Optional[ float ] = await measure(
+            "after: metadata",
+            urls,
+            metadata_only = True,
+        )
+
+        if full is not None and meta is not None:
+            print(f"{'':>16}  {full / meta:.1f}x")
+
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10))
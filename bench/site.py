@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+A synthetic stand-in site for the offline benchmarks, served locally
+by several HTTP servers: the site itself, plus external hosts which
+are slow, erroring, blocked with 403, or throttled with 999 responses.
+Everything gets generated from a seed, so that runs are reproducible.
+
+Run from the repo root to browse it, optionally with the number of
+pages:
+
+    python -m bench.site [num_pages]
+"""
+
+import gzip
+import http.server
+import math
+import random
+import sys
+import threading
+import time
+import types
+import typing
+import zlib
+
+
+NUM_WORDS: int = 500
+
+EXTERNAL_HOSTS: typing.Dict[ str, int ] = {
+    "slow": 200,
+    "error": 500,
+    "blocked": 403,
+    "throttled": 999,
+}
+
+
+class SiteSpec (typing.NamedTuple):
+    """
+Shape of the synthetic site: `latency_median` and `latency_sigma`
+parameterize a log-normal distribution of response times in seconds,
+and `error_rate` is the fraction of pages which respond with a 500.
+    """
+    num_pages: int = 1000
+    fan_out: int = 10
+    num_nav: int = 10
+    external_rate: float = 0.05
+    external_pages: int = 10
+    latency_median: float = 0.005
+    latency_sigma: float = 0.5
+    slow_latency: float = 0.25
+    error_rate: float = 0.01
+    sitemap_size: int = 500
+    seed: int = 42
+
+    @classmethod
+    def from_config (
+        cls,
+        config: dict,
+        ) -> "SiteSpec":
+        """
+Build a spec from a configuration table, using the defaults for any
+missing keys.
+        """
+        return cls(**{
+            key: type(default)(config.get(key, default))
+            for key, default in cls()._asdict().items()
+        })
+
+
+class SiteServer (http.server.ThreadingHTTPServer):
+    """
+HTTP server for one host of the synthetic site, in the given `role`:
+either `"site"` or one of the `EXTERNAL_HOSTS`.
+    """
+    def __init__ (
+        self,
+        site: "SyntheticSite",
+        role: str,
+        ) -> None:
+        """
+Constructor.
+        """
+        super().__init__(( "127.0.0.1", 0, ), SiteHandler)
+        self.site: SyntheticSite = site
+        self.role: str = role
+
+
+class SiteHandler (http.server.BaseHTTPRequestHandler):
+    """
+Serve the pages, sitemaps, and `robots.txt` file of a synthetic host,
+with keep-alive connections.
+    """
+    protocol_version: str = "HTTP/1.1"
+    server: SiteServer
+
+    def log_message (  # pylint: disable=W0622
+        self,
+        format: str,
+        *args: typing.Any,
+        ) -> None:
+        """
+Silence the request logging.
+        """
+
+
+    def send_body (
+        self,
+        status: int,
+        body: bytes,
+        content_type: str = "text/html; charset=utf-8",
+        ) -> None:
+        """
+Send a response, after a delay drawn from the latency distribution
+for this host.
+        """
+        time.sleep(self.server.site.get_latency(self.server.role, self.path))
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def do_GET (  # pylint: disable=C0103
+        self,
+        ) -> None:
+        """
+Handle a GET request.
+        """
+        site: SyntheticSite = self.server.site
+        path: str = self.path.split("?")[0]
+
+        if path == "/robots.txt":
+            self.send_body(200, b"User-agent: *\nAllow: /\n", "text/plain")
+
+        elif self.server.role != "site":
+            status: int = EXTERNAL_HOSTS[self.server.role]
+            self.send_body(status, site.render_external(self.server.role, path))
+
+        elif path == "/sitemap.xml":
+            self.send_body(200, site.render_sitemap_index(), "application/xml")
+
+        elif path.startswith("/sitemap-") and path.endswith(".xml.gz"):
+            self.send_body(200, site.render_sitemap(int(path[9:-7])), "application/gzip")
+
+        elif path.startswith("/page/") and path[6:].isdigit() and int(path[6:]) < site.spec.num_pages:  # pylint: disable=C0301
+            page_id: int = int(path[6:])
+
+            if page_id in site.error_pages:
+                self.send_body(500, b"<html><body>internal server error</body></html>")
+            else:
+                self.send_body(200, site.render_page(page_id))
+
+        else:
+            self.send_body(404, b"<html><body>not found</body></html>")
+
+
+class SyntheticSite:
+    """
+Generate and serve a synthetic site, used as a context manager which
+starts its servers in background threads then shuts them down on exit.
+    """
+    def __init__ (
+        self,
+        spec: SiteSpec = SiteSpec(),
+        ) -> None:
+        """
+Constructor.
+        """
+        self.spec: SiteSpec = spec
+        self.rng: random.Random = random.Random(spec.seed)
+        self.servers: typing.Dict[ str, SiteServer ] = {}
+
+        self.error_pages: typing.Set[ int ] = set(
+            page_id
+            for page_id in range(spec.num_pages)
+            if self.rng.random() < spec.error_rate
+        )
+
+        self.lastmod: typing.List[ str ] = [
+            f"2025-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}"
+            for _ in range(spec.num_pages)
+        ]
+
+
+    def __enter__ (
+        self,
+        ) -> "SyntheticSite":
+        """
+Context manager entry: start the servers.
+        """
+        for role in [ "site" ] + list(EXTERNAL_HOSTS):
+            server: SiteServer = SiteServer(self, role)
+            self.servers[role] = server
+
+            threading.Thread(
+                target = server.serve_forever,
+                daemon = True,
+            ).start()
+
+        return self
+
+
+    def __exit__ (
+        self,
+        exc_type: typing.Optional[ typing.Type[ BaseException ] ],
+        exc_value: typing.Optional[ BaseException ],
+        traceback: typing.Optional[ types.TracebackType ],
+        ) -> None:
+        """
+Context manager exit: shut down the servers.
+        """
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+        self.servers = {}
+
+
+    def get_base (
+        self,
+        role: str = "site",
+        ) -> str:
+        """
+Accessor for the base URL of a host.
+        """
+        return f"http://127.0.0.1:{self.servers[role].server_address[1]}"
+
+
+    @property
+    def site_base (
+        self,
+        ) -> str:
+        """
+Base URL of the site.
+        """
+        return self.get_base()
+
+
+    @property
+    def site_map (
+        self,
+        ) -> str:
+        """
+URL of the sitemap index for the site.
+        """
+        return f"{self.get_base()}/sitemap.xml"
+
+
+    def get_latency (
+        self,
+        role: str,
+        path: str,
+        ) -> float:
+        """
+Draw the response latency for a request, seeded by its host and path
+so that it stays the same across runs.
+        """
+        if role == "slow":
+            return self.spec.slow_latency
+
+        rng: random.Random = random.Random(zlib.crc32(f"{self.spec.seed}:{role}:{path}".encode("utf-8")))  # pylint: disable=C0301
+        return self.spec.latency_median * math.exp(rng.gauss(0.0, self.spec.latency_sigma))
+
+
+    def get_links (
+        self,
+        page_id: int,
+        ) -> typing.List[ str ]:
+        """
+Generate the links on a page: navigation links shared by every page,
+then `fan_out` links to random pages, some of which are external.
+        """
+        rng: random.Random = random.Random(self.spec.seed * 1000003 + page_id)
+        links: typing.List[ str ] = [ f"/page/{i}" for i in range(min(self.spec.num_nav, self.spec.num_pages)) ]  # pylint: disable=C0301
+
+        for _ in range(self.spec.fan_out):
+            if rng.random() < self.spec.external_rate:
+                role: str = rng.choice(list(EXTERNAL_HOSTS))
+                links.append(f"{self.get_base(role)}/ext/{rng.randrange(self.spec.external_pages)}")
+            else:
+                links.append(f"/page/{rng.randrange(self.spec.num_pages)}")
+
+        return links
+
+
+    def render_page (
+        self,
+        page_id: int,
+        ) -> bytes:
+        """
+Render the HTML for one page of the site, with the metadata which the
+crawler extracts.
+        """
+        rng: random.Random = random.Random(self.spec.seed * 7919 + page_id)
+        words: typing.List[ str ] = [ f"word{rng.randrange(NUM_WORDS)}" for _ in range(60) ]
+
+        anchors: str = "\n".join(
+            f'<li><a href="{link}">link {i}</a></li>'
+            for i, link in enumerate(self.get_links(page_id))
+        )
+
+        return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<title>Page {page_id}: {" ".join(words[:4])}</title>
+<meta name="description" content="{" ".join(words[4:24])}">
+<meta name="keywords" content="{", ".join(words[24:28])}">
+<meta property="og:image" content="/images/{page_id}.png">
+</head>
+<body>
+<h1>Page {page_id}</h1>
+<p>{" ".join(words)}</p>
+<ul>
+{anchors}
+</ul>
+</body>
+</html>
+""".encode("utf-8")
+
+
+    def render_external (
+        self,
+        role: str,
+        path: str,
+        ) -> bytes:
+        """
+Render the HTML for a page on an external host.
+        """
+        return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<title>{role} {path}</title>
+<meta name="description" content="an external page on the {role} host">
+</head>
+<body><p>{role}</p></body>
+</html>
+""".encode("utf-8")
+
+
+    def render_sitemap_index (
+        self,
+        ) -> bytes:
+        """
+Render the sitemap index, which lists the gzip compressed sitemaps.
+        """
+        num_sitemaps: int = max(1, math.ceil(self.spec.num_pages / self.spec.sitemap_size))
+
+        entries: str = "\n".join(
+            f"<sitemap><loc>{self.site_base}/sitemap-{i}.xml.gz</loc></sitemap>"
+            for i in range(num_sitemaps)
+        )
+
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{entries}
+</sitemapindex>
+""".encode("utf-8")
+
+
+    def render_sitemap (
+        self,
+        index: int,
+        ) -> bytes:
+        """
+Render one gzip compressed sitemap, listing a range of the pages.
+        """
+        start: int = index * self.spec.sitemap_size
+        stop: int = min(self.spec.num_pages, start + self.spec.sitemap_size)
+
+        entries: str = "\n".join(
+            f"<url><loc>{self.site_base}/page/{i}</loc><lastmod>{self.lastmod[i]}</lastmod></url>"
+            for i in range(start, stop)
+        )
+
+        return gzip.compress(f"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{entries}
+</urlset>
+""".encode("utf-8"))
+
+
+if __name__ == "__main__":
+    pages_count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    with SyntheticSite(SiteSpec(num_pages = pages_count)) as synthetic_site:
+        print(f"site: {synthetic_site.site_base}  sitemap: {synthetic_site.site_map}")
+
+        for host_role in EXTERNAL_HOSTS:
+            print(f"{host_role:>10}: {synthetic_site.get_base(host_role)}")
+
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -6,12 +6,32 @@ Package definitions for Nyddu.
 see copyright/license https://github.com/DerwenAI/nyddu/README.md
 """
 
+from .cache import QueryCache
+
+from .checkpoint import Checkpoint, ExtractCache
+
 from .crawler import Crawler
 
-from .db import db_connect, load_model
+from .db import VECTOR_INDEX, ConnectionPool, DatabaseUnavailable, PooledConnection, \
+    db_connect, embed_texts, generation_path, has_vector_index, load_model, \
+    load_vector_extension, page_text, prepare_queries, read_generation, \
+    reload_path, row_digest, stable_id, write_generation
+
+from .extract import Extract, extract_html
+
+from .graph import LinkGraph
 
-from .page import Page, ShortenedURL, URLKind
+from .metrics import CONTENT_TYPE, Counter, CrawlMetrics, FetchTiming, Gauge, Histogram, \
+    MetricsRegistry, TimedHTTPAdapter, crawl_metrics_path
+
+from .normalize import URLNormalizer, compile_prefixes
+
+from .page import Page, PageRecord, ShortenedURL, URLKind
+
+from .report import ReportWriter, iter_report
 
 from .routes import NydduEndpoints
 
-from .scraper import FAUX_USER_AGENT, Scraper
+from .scraper import FAUX_USER_AGENT, Scraper, ScraperPool
+
+from .sitemap import SitemapEntry, SitemapReader, fetch_sitemap, iter_sitemap, parse_lastmod
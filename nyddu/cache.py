@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Query result cache for Nyddu.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+from collections import OrderedDict
+import threading
+import time
+import typing
+
+
+class QueryCache:
+    """
+Bounded LRU cache of query results with a TTL, which gets cleared
+whenever the load generation of the database changes.
+    """
+    def __init__ (
+        self,
+        *,
+        max_size: int = 1024,
+        ttl: float = 300.0,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self.generation: typing.Optional[ str ] = None
+        self.entries: typing.OrderedDict[ typing.Hashable, typing.Tuple[ float, typing.Any ] ] = OrderedDict()  # pylint: disable=C0301
+        self.lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+
+    def sync (
+        self,
+        generation: typing.Optional[ str ],
+        ) -> None:
+        """
+Clear all of the entries if the database has been loaded again since
+they were cached.
+        """
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+
+
+    def get (
+        self,
+        key: typing.Hashable,
+        ) -> typing.Optional[ typing.Any ]:
+        """
+Lookup an entry which has not expired, otherwise return `None`.
+        """
+        with self.lock:
+            entry: typing.Optional[ typing.Tuple[ float, typing.Any ] ] = self.entries.get(key)
+
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+
+    def put (
+        self,
+        key: typing.Hashable,
+        value: typing.Any,
+        ) -> None:
+        """
+Add an entry, evicting the least recently used ones beyond the size
+limit.
+        """
+        with self.lock:
+            self.entries[key] = ( time.monotonic() + self.ttl, value, )
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last = False)
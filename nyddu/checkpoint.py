@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Crawl checkpoints and the extract cache for Nyddu, persisted in SQLite.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+from collections.abc import Iterator
+import json
+import pathlib
+import sqlite3
+import time
+import typing
+
+from .extract import Extract
+from .page import Page
+
+
+class Checkpoint:
+    """
+Persist the crawl frontier and per-page results, so that a crawl can
+be resumed: each page gets stored by its key in `known_pages`, and
+flagged as `done` once it has been written to the report.
+    """
+    def __init__ (
+        self,
+        path: pathlib.Path,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.path: pathlib.Path = path
+        self.conn: sqlite3.Connection = sqlite3.connect(path)
+
+        self.conn.executescript("""
+CREATE TABLE IF NOT EXISTS page (
+    key TEXT PRIMARY KEY,
+    done INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+        """)
+
+
+    def clear (
+        self,
+        ) -> None:
+        """
+Remove any previous checkpoint, for a fresh crawl.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM page")
+            self.conn.execute("DELETE FROM meta")
+
+
+    def save (
+        self,
+        pages: typing.Iterable[ typing.Tuple[ str, bool, Page ] ],
+        *,
+        count: int,
+        ) -> int:
+        """
+Upsert the given pages, plus the count of pages crawled, in one
+transaction. Returns the number of pages saved.
+        """
+        rows: typing.List[ typing.Tuple[ str, int, str ] ] = [
+            ( key, int(done), page.model_dump_json(), )
+            for key, done, page in pages
+        ]
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO page (key, done, data) VALUES (?, ?, ?)",
+                rows,
+            )
+
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('count', ?)",
+                ( count, ),
+            )
+
+        return len(rows)
+
+
+    def load (
+        self,
+        ) -> Iterator[ typing.Tuple[ str, bool, Page ] ]:
+        """
+Iterate through the pages in the checkpoint.
+        """
+        for key, done, data in self.conn.execute("SELECT key, done, data FROM page"):
+            yield key, bool(done), Page.model_validate_json(data)
+
+
+    def get_count (
+        self,
+        ) -> int:
+        """
+Accessor for the count of pages crawled.
+        """
+        row: typing.Optional[ tuple ] = self.conn.execute(
+            "SELECT value FROM meta WHERE name = 'count'"
+        ).fetchone()
+
+        return 0 if row is None else row[0]
+
+
+    def close (
+        self,
+        ) -> None:
+        """
+Close the database.
+        """
+        self.conn.close()
+
+
+class ExtractCache:
+    """
+Persist the `Extract` parsed from each page, keyed by its URI along
+with the validator (`ETag` or `Last-Modified`) of the response, so
+that a recrawl which gets "304 Not Modified" can reuse the metadata
+and links without parsing the HTML again. The time when each page was
+last confirmed also gets stored, so that pages which a sitemap lists
+as not modified since then can be skipped altogether.
+    """
+    def __init__ (
+        self,
+        path: pathlib.Path,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.path: pathlib.Path = path
+        self.conn: sqlite3.Connection = sqlite3.connect(path)
+
+        self.conn.executescript("""
+CREATE TABLE IF NOT EXISTS extract (
+    uri TEXT PRIMARY KEY,
+    validator TEXT NOT NULL,
+    data TEXT NOT NULL,
+    crawled REAL NOT NULL DEFAULT 0
+);
+        """)
+
+
+    def get (
+        self,
+        uri: str,
+        validator: typing.Optional[ str ],
+        ) -> typing.Optional[ Extract ]:
+        """
+Accessor for the extract stored for a URI, if its validator matches.
+        """
+        row: typing.Optional[ tuple ] = self.conn.execute(
+            "SELECT data FROM extract WHERE uri = ? AND validator = ?",
+            ( uri, validator or "", ),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        return Extract(**json.loads(row[0]))
+
+
+    def get_since (
+        self,
+        uri: str,
+        since: float,
+        ) -> typing.Optional[ Extract ]:
+        """
+Accessor for the extract stored for a URI, if the page was last
+confirmed at or after the `since` timestamp.
+        """
+        row: typing.Optional[ tuple ] = self.conn.execute(
+            "SELECT data FROM extract WHERE uri = ? AND crawled >= ?",
+            ( uri, since, ),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        return Extract(**json.loads(row[0]))
+
+
+    def touch (
+        self,
+        uri: str,
+        ) -> None:
+        """
+Record that the extract stored for a URI has been confirmed as
+unchanged.
+        """
+        self.conn.execute(
+            "UPDATE extract SET crawled = ? WHERE uri = ?",
+            ( time.time(), uri, ),
+        )
+
+
+    def put (
+        self,
+        uri: str,
+        validator: typing.Optional[ str ],
+        extract: Extract,
+        ) -> None:
+        """
+Store the extract for a URI, which gets committed on `commit()` or
+`close()`.
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO extract (uri, validator, data, crawled) VALUES (?, ?, ?, ?)",
+            ( uri, validator or "", json.dumps(extract._asdict()), time.time(), ),
+        )
+
+
+    def commit (
+        self,
+        ) -> None:
+        """
+Commit any pending changes, e.g., at each checkpoint.
+        """
+        self.conn.commit()
+
+
+    def close (
+        self,
+        ) -> None:
+        """
+Commit any pending changes, then close the database.
+        """
+        self.conn.commit()
+        self.conn.close()
@@ -6,24 +6,39 @@ Crawler class for Nyddu.
 see copyright/license https://github.com/DerwenAI/nyddu/README.md
 """
 
+# pylint: disable=C0302
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from http import HTTPStatus
 import asyncio
+import contextlib
+import functools
 import logging
+import multiprocessing
 import pathlib
-import posixpath
+import ssl
 import sys  # pylint: disable=W0611
+import time
 import tomllib
 import typing
-import urllib.parse
+import urllib.robotparser
 import warnings
 
-from bs4 import BeautifulSoup
 from icecream import ic  # type: ignore  # pylint: disable=W0611
+import requests
 import requests_cache
 import urllib3
-import w3lib.url
 
-from .page import Page, ShortenedURL, URLKind
+from .checkpoint import Checkpoint, ExtractCache
+from .extract import Extract, check_parser, extract_html
+from .graph import LinkGraph
+from .metrics import CrawlMetrics, TimedHTTPAdapter, crawl_metrics_path
+from .normalize import InternalLink, URLNormalizer
+from .page import PageRecord, ShortenedURL, URLKind
+from .report import ReportWriter
+from .scheduler import HostScheduler, get_host
+from .scraper import FAUX_USER_AGENT, ScraperPool
+from .sitemap import SitemapReader
 
 
 FAIR_USE_STATUS: typing.Set[ int ] = set([
@@ -34,11 +49,11 @@ FAIR_USE_STATUS: typing.Set[ int ] = set([
 ])
 
 
-class Crawler:  # pylint: disable=R0902
+class Crawler:  # pylint: disable=R0902,R0904
     """
 A spider-ish crawler.
     """
-    def __init__ (  # pylint: disable=W0102
+    def __init__ (  # pylint: disable=R0913,W0102
         self,
         *,
         config_path: typing.Optional[ pathlib.Path ] = None,
@@ -47,6 +62,8 @@ A spider-ish crawler.
         ignored_prefix: typing.List[ str ] = [],
         shorty: typing.Dict[ str, ShortenedURL ] = {},
         use_scraper: bool = False,
+        report_path: typing.Optional[ pathlib.Path ] = None,
+        resume: bool = False,
         ) -> None:
         """
 Constructor.
@@ -61,21 +78,113 @@ Constructor.
         self.ignored_prefix: typing.List[ str ] = ignored_prefix
         self.shorty: typing.Dict[ str, ShortenedURL ] = shorty
 
+        # memoized link normalization, since the same links recur on
+        # nearly every page
+        self.normalizer: URLNormalizer = URLNormalizer(
+            self.site_base,
+            path_rewrites = path_rewrites,
+            ignored_paths = ignored_paths,
+            ignored_prefix = ignored_prefix,
+            cache_size = self.config["nyddu"].get("normalize_cache_size", 65536),
+        )
+
+        # HTML parser backend
+        self.parser: str = check_parser(self.config["nyddu"].get("html_parser", "html.parser"))
+
         # configure warnings
         urllib3.disable_warnings()
 
-        # runtime data structures
+        # concurrency: number of consumer workers, which is also the
+        # size of the thread pool used to offload blocking HTTP I/O
+        self.num_workers: int = max(1, self.config["nyddu"].get("num_workers", 1))
+        self.fetch_pool: typing.Optional[ ThreadPoolExecutor ] = None
+
+        # number of worker processes for HTML parsing, where `0` means
+        # parsing runs inline on the event loop
+        self.parse_workers: int = max(0, self.config["nyddu"].get("parse_workers", 0))
+        self.parse_pool: typing.Optional[ ProcessPoolExecutor ] = None
+
+        # runtime data structures: compact page records, with their
+        # links stored as interned ids in the link graph, which only
+        # get converted to `Page` models for serialization
         self.count: int = 0
-        self.known_pages: typing.Dict[ str, Page ] = {}
+        self.graph: LinkGraph = LinkGraph()
+        self.known_pages: typing.Dict[ str, PageRecord ] = {}
         self.session: requests_cache.CachedSession = self.get_cache()
 
+        # fallback scraping for blocked pages, via a pool of headless
+        # browsers which gets recycled after `scraper_max_pages` each
         self.use_scraper: bool = use_scraper
-        self.needs_scraper: typing.List[ Page ] = []
+        self.needs_scraper: typing.List[ PageRecord ] = []
+        self.scrape_uris: typing.Set[ str ] = set()
+        self.scrape_queue: asyncio.Queue = asyncio.Queue()
+        self.scraper_pool_size: int = self.config["nyddu"].get("scraper_pool_size", 2)
+        self.scraper_max_pages: int = self.config["nyddu"].get("scraper_max_pages", 50)
+        self.scraper_delay: int = self.config["nyddu"].get("scraper_delay", 3)
+        self.scraper_metadata_only: bool = self.config["nyddu"].get("scraper_metadata_only", False)
 
         self.queue: asyncio.Queue = asyncio.Queue(
             maxsize = self.config["nyddu"]["queue_maxsize"],
         )
 
+        # the scheduler backlog gets capped at the same size as the
+        # queue, counting the workers which wait to put into the queue
+        self.backlog_space: asyncio.Event = asyncio.Event()
+        self.waiting_puts: int = 0
+
+        # politeness: per-host rate limits, which may get overridden
+        # for specific hosts in the `[nyddu.host_limits]` table
+        self.scheduler: HostScheduler = HostScheduler(
+            rate = self.config["nyddu"].get("host_rate", 2.0),
+            burst = self.config["nyddu"].get("host_burst", 5.0),
+            max_in_flight = self.config["nyddu"].get("host_max_in_flight", 2),
+            backoff = self.config["nyddu"].get("host_backoff", 10.0),
+            max_retries = self.config["nyddu"].get("host_max_retries", 3),
+            host_limits = self.config["nyddu"].get("host_limits", {}),
+        )
+
+        self.use_robots: bool = self.config["nyddu"].get("check_robots", True)
+        self.robots: typing.Dict[ str, asyncio.Future ] = {}
+
+        # streaming report, written as pages finish crawling
+        self.report_path: typing.Optional[ pathlib.Path ] = report_path
+        self.report_writer: typing.Optional[ ReportWriter ] = None
+        self.reported: typing.Set[ str ] = set()
+
+        # checkpoints of the frontier and per-page results, every
+        # `checkpoint_interval` seconds, so that the crawl can resume
+        self.resume: bool = resume
+        self.checkpoint_interval: float = self.config["nyddu"].get("checkpoint_interval", 60.0)
+        self.checkpoint_path: pathlib.Path = pathlib.Path(self.config["nyddu"].get(
+            "checkpoint_path",
+            f"{self.config['nyddu']['cache_path']}_checkpoint.sqlite",
+        ))
+
+        self.checkpoint: typing.Optional[ Checkpoint ] = None
+        self.dirty: typing.Dict[ str, PageRecord ] = {}
+
+        # conditional revalidation: the extract parsed from each page
+        # gets stored, then reused whenever a recrawl finds the page
+        # unchanged, instead of parsing its HTML again
+        self.revalidate: bool = self.config["nyddu"].get("revalidate", True)
+        self.extract_path: pathlib.Path = pathlib.Path(self.config["nyddu"].get(
+            "extract_path",
+            f"{self.config['nyddu']['cache_path']}_extract.sqlite",
+        ))
+
+        self.extract_cache: typing.Optional[ ExtractCache ] = None
+
+        # skip requesting pages which the sitemap lists as not modified
+        # since they were last crawled, reusing their stored extract
+        self.skip_unmodified: bool = self.config["nyddu"].get("skip_unmodified", False)
+
+        # crawl metrics, dumped in the Prometheus text format every
+        # `metrics_interval` seconds and at the end of the crawl
+        self.metrics: CrawlMetrics = CrawlMetrics()
+        self.metrics_interval: float = self.config["nyddu"].get("metrics_interval", 15.0)
+        self.metrics_path: pathlib.Path = crawl_metrics_path(self.config)
+        self.init_metrics()
+
 
     def get_cache (
         self,
@@ -92,114 +201,222 @@ previous serialized cache from disk.
 
         session.settings.expire_after = self.config["nyddu"]["cache_expire"]
 
+        # size the connection pools to match the number of workers,
+        # and time the phases of each request
+        adapter: requests.adapters.HTTPAdapter = TimedHTTPAdapter(
+            pool_maxsize = self.num_workers,
+        )
+
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
         return session
 
 
-    async def load_queue_internal (
+    def init_metrics (
+        self,
+        ) -> None:
+        """
+Add gauges for the depth of each stage of the crawl pipeline, which
+get computed whenever the metrics get rendered.
+        """
+        gauges: typing.List[ typing.Tuple[ str, str, typing.Callable[ [], int ] ] ] = [
+            ( "queue_depth", "Pages waiting in the crawl queue.", self.queue.qsize, ),
+            ( "scheduler_pending", "Pages waiting in the per-host scheduler.", self.scheduler.pending, ),  # pylint: disable=C0301
+            ( "in_flight", "HTTP requests in flight.", self.scheduler.in_flight, ),
+            ( "scrape_queue_depth", "Blocked pages waiting to be scraped.", self.scrape_queue.qsize, ),  # pylint: disable=C0301
+            ( "known_pages", "Pages discovered so far.", lambda: len(self.known_pages), ),
+            ( "pages_total", "Pages crawled so far.", lambda: self.count, ),
+        ]
+
+        for name, help_text, function in gauges:
+            self.metrics.registry.gauge(f"nyddu_crawl_{name}", help_text).set_function(function)
+
+
+    def dump_metrics (
+        self,
+        ) -> None:
+        """
+Dump the crawl metrics to the file at `metrics_path`.
+        """
+        try:
+            self.metrics.registry.dump(self.metrics_path)
+        except OSError as ex:
+            logging.error("metrics error: %s : %s", self.metrics_path, ex)
+
+
+    async def metrics_tasks (
+        self,
+        ) -> None:
+        """
+Coroutine to dump the crawl metrics every `metrics_interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            self.dump_metrics()
+
+
+    def add_link (
         self,
+        page: PageRecord,
+        ref: typing.Optional[ PageRecord ],
         uri: str,
-        ref: typing.Optional[ Page ],
         slug: typing.Optional[ str ],
-        kind: URLKind,
         ) -> None:
         """
-Load one internal URI into the queue.
+Record a link from the `ref` page to the given page. If the page has
+already been written to the report, stream out the new back-reference.
         """
-        # normalize internal links to just their path
-        if uri.startswith("/"):
-            uri = f"{self.site_base}{uri}"
+        if ref is None:
+            return
 
-        parsed: urllib.parse.ParseResult = urllib.parse.urlparse(uri)
-        normalized_path: str = posixpath.normpath(parsed.path)
+        self.graph.add_outbound(ref.node, uri)
+        self.mark_dirty(ref)
+        self.mark_dirty(page)
 
-        uri = parsed._replace(path = normalized_path).geturl()
-        uri = uri.split("#")[0]
-        uri = uri.split("?")[0]
+        is_new: bool = self.graph.add_ref(page.node, ref.path, raw = slug is None)
 
-        # determine a canonical path
-        path: str = Page.get_path(
-            uri,
-            base = self.site_base,
-        )
+        if is_new and page.uri in self.reported:
+            self.report_writer.write({  # type: ignore
+                "uri": page.uri,
+                "refs": [ ref.path ] if slug is not None else [],
+                "raw": [ ref.path ] if slug is None else [],
+            })
 
-        # filter out URLs to be ignored
-        if path in self.path_rewrites:
-            path = self.path_rewrites[path]
 
-        for prefix in self.ignored_prefix:
-            if path.startswith(prefix):
-                return
+    async def put_queue (
+        self,
+        page: PageRecord,
+        ref: typing.Optional[ PageRecord ],
+        ) -> None:
+        """
+Put a page into the queue, waiting while it's full. When the page was
+discovered by a worker, i.e., `ref` is set, that worker holds a request
+in flight while it waits, so it gets counted -- see `dispatch_tasks()`.
+        """
+        if ref is None or not self.queue.full():
+            await self.queue.put(page)
+            return
+
+        self.waiting_puts += 1
+        self.backlog_space.set()
+
+        try:
+            await self.queue.put(page)
+        finally:
+            self.waiting_puts -= 1
+
+
+    def backlog_full (
+        self,
+        ) -> bool:
+        """
+Check whether the scheduler backlog has reached its cap, in which case
+pages stay in the queue -- unless every request in flight belongs to a
+worker waiting to put into the queue, since otherwise no request could
+finish and nothing would drain the backlog.
+        """
+        if self.queue.maxsize <= 0 or self.scheduler.pending() < self.queue.maxsize:
+            return False
+
+        return not 0 < self.scheduler.in_flight() <= self.waiting_puts
+
+
+    async def load_queue_internal (
+        self,
+        uri: str,
+        ref: typing.Optional[ PageRecord ],
+        slug: typing.Optional[ str ],
+        kind: URLKind,
+        *,
+        lastmod: typing.Optional[ float ] = None,
+        ) -> None:
+        """
+Load one internal URI into the queue.
+        """
+        # normalize internal links to just their path, filtering out
+        # URLs to be ignored
+        link: typing.Optional[ InternalLink ] = self.normalizer.normalize_internal(uri)
 
-        if path in self.ignored_paths:
+        if link is None:
             return
 
+        uri, path = link
+
         if path in self.known_pages:
             # add a back-reference
-            page: Page = self.known_pages[path]
+            page: PageRecord = self.known_pages[path]
+            self.add_link(page, ref, uri, slug)
 
-            if ref is not None:
-                page.add_ref(ref.path, slug)
-                ref.outbound.add(uri)
+            # the page may have been discovered before its sitemap entry
+            if lastmod is not None and page.lastmod is None:
+                page.lastmod = lastmod
 
         else:
-            page = Page(
+            page = PageRecord(
+                self.graph,
                 uri = uri,
                 kind = kind,
                 path = path,
                 slug = slug,
             )
 
+            page.lastmod = lastmod
             self.known_pages[path] = page
+            self.mark_dirty(page)
             logging.debug("load: %s %s", page.uri, ref)
 
-            await self.queue.put(page)
-
-            if ref is not None:
-                page.add_ref(ref.path, slug)
-                ref.outbound.add(uri)
+            await self.put_queue(page, ref)
+            self.add_link(page, ref, uri, slug)
 
 
     async def load_queue_external (
         self,
         uri: str,
-        ref: typing.Optional[ Page ],
+        ref: typing.Optional[ PageRecord ],
         slug: typing.Optional[ str ],
+        *,
+        lastmod: typing.Optional[ float ] = None,
         ) -> None:
         """
 Load one external URI into the queue.
         """
-        uri = w3lib.url.canonicalize_url(uri)
+        uri = self.normalizer.normalize_external(uri)
 
         if not uri.startswith("http"):
             logging.error("unknown scheme: %s %s", uri, ref)
 
         if uri not in self.known_pages:
-            page = Page(
+            page = PageRecord(
+                self.graph,
                 uri = uri,
                 kind = URLKind.EXTERNAL,
                 slug = slug,
             )
 
+            page.lastmod = lastmod
             self.known_pages[uri] = page
+            self.mark_dirty(page)
             logging.debug("load: %s %s", page.uri, ref)
 
-            await self.queue.put(page)
+            await self.put_queue(page, ref)
 
         else:
             page = self.known_pages[uri]
 
-        if ref is not None:
-            page.add_ref(ref.path, slug)
-            ref.outbound.add(uri)
+        self.add_link(page, ref, uri, slug)
 
 
     async def load_queue (
         self,
         uri: str,
-        ref: typing.Optional[ Page ],
+        ref: typing.Optional[ PageRecord ],
+        *,
+        lastmod: typing.Optional[ float ] = None,
         ) -> None:
         """
-Load one URI into the queue.
+Load one URI into the queue, along with its `<lastmod>` when listed in
+the sitemap.
         """
         kind: URLKind = URLKind.INTERNAL
         slug: typing.Optional[ str ] = None
@@ -216,11 +433,11 @@ Load one URI into the queue.
             return
 
         if uri.startswith("/") or uri.startswith(self.site_base):
-            await self.load_queue_internal(uri, ref, slug, kind)
+            await self.load_queue_internal(uri, ref, slug, kind, lastmod = lastmod)
 
         else:
             # a bona fide external link
-            await self.load_queue_external(uri, ref, slug)
+            await self.load_queue_external(uri, ref, slug, lastmod = lastmod)
 
 
     async def produce_tasks (
@@ -228,38 +445,181 @@ Load one URI into the queue.
         site_map: str = "https://example.com",
         ) -> None:
         """
-Coroutine to produce URLs into the queue.
+Coroutine to produce URLs into the queue, as they arrive from reading
+the sitemap.
+        """
+        reader: SitemapReader = SitemapReader(
+            self.session,
+            concurrency = self.config["nyddu"].get("sitemap_concurrency", 4),
+        )
+
+        async for entry in reader.entries(site_map):
+            await self.load_queue(entry.loc, None, lastmod = entry.lastmod)
+
+
+    async def fetch_crawl_delay (
+        self,
+        page: PageRecord,
+        ) -> None:
+        """
+Fetch the `robots.txt` file for the host of a page, then apply any
+`Crawl-delay` in the scheduler.
+        """
+        host: str = get_host(page.uri)
+        robots_uri: str = f"{page.get_scheme()}://{host}/robots.txt"
+
+        try:
+            response: requests.Response = await asyncio.get_running_loop().run_in_executor(
+                self.fetch_pool,
+                functools.partial(
+                    self.session.get,
+                    robots_uri,
+                    verify = ssl.CERT_NONE,
+                    timeout = 10,
+                    headers = {
+                        "User-Agent": FAUX_USER_AGENT,
+                    },
+                ),
+            )
+
+            if response.status_code == HTTPStatus.OK:
+                parser: urllib.robotparser.RobotFileParser = urllib.robotparser.RobotFileParser()
+                parser.parse(response.text.splitlines())
+
+                delay: typing.Optional[ typing.Any ] = parser.crawl_delay(FAUX_USER_AGENT)
+
+                if delay is not None:
+                    logging.debug("crawl delay: %s %s", host, delay)
+                    self.scheduler.set_crawl_delay(host, float(delay))
+
+        except Exception as ex:  # pylint: disable=W0718
+            logging.debug("robots error: %s : %s", robots_uri, ex)
+
+
+    async def check_robots (
+        self,
+        page: PageRecord,
+        ) -> None:
+        """
+Check `robots.txt` once per host, the first time it gets crawled.
+        """
+        host: str = get_host(page.uri)
+
+        if host not in self.robots:
+            self.robots[host] = asyncio.ensure_future(self.fetch_crawl_delay(page))
+
+        await self.robots[host]
+
+
+    async def parse_html (
+        self,
+        html: str,
+        ) -> Extract:
+        """
+Parse HTML to extract its metadata and links, in the process pool when
+one is configured. Only the HTML string and the compact `Extract`
+result cross the process boundary.
+        """
+        start_time: float = time.perf_counter()
+
+        try:
+            if self.parse_pool is None:
+                return extract_html(html, parser = self.parser)
+
+            return await asyncio.get_running_loop().run_in_executor(
+                self.parse_pool,
+                functools.partial(
+                    extract_html,
+                    html,
+                    parser = self.parser,
+                ),
+            )
+
+        finally:
+            self.metrics.parse_seconds.observe(time.perf_counter() - start_time)
+
+
+    async def get_extract (
+        self,
+        page: PageRecord,
+        html: str,
+        ) -> Extract:
+        """
+Reuse the stored extract when the page is unchanged since it was last
+crawled, otherwise parse its HTML and store the extract.
         """
-        for uri in Page.get_site_links(site_map, self.session):
-            await self.load_queue(uri, None)
+        if self.extract_cache is None:
+            return await self.parse_html(html)
+
+        if page.unchanged:
+            stored: typing.Optional[ Extract ] = self.extract_cache.get(page.uri, page.validator)
+
+            if stored is not None:
+                logging.debug("unchanged: %s", page.uri)
+                self.extract_cache.touch(page.uri)
+                return stored
+
+        extract: Extract = await self.parse_html(html)
+        self.extract_cache.put(page.uri, page.validator, extract)
+
+        return extract
+
+
+    def get_unmodified (
+        self,
+        page: PageRecord,
+        ) -> typing.Optional[ Extract ]:
+        """
+When enabled, reuse the stored extract for a page which the sitemap
+lists as not modified since it was last crawled, so that the page does
+not get requested at all.
+        """
+        if not self.skip_unmodified or self.extract_cache is None or page.lastmod is None:
+            return None
+
+        extract: typing.Optional[ Extract ] = self.extract_cache.get_since(page.uri, page.lastmod)
+
+        if extract is not None:
+            logging.debug("not modified: %s", page.uri)
+            page.status_code = HTTPStatus.OK
+            page.content_type = "text/html"
+            page.unchanged = True
+
+        return extract
 
 
     async def crawl_internal (
         self,
-        page: Page,
+        page: PageRecord,
         ) -> None:
         """
 Crawl content for an internal page.
         """
-        html: typing.Optional[ str ] = await page.request_content(
-            self.session,
-        )
+        extract: typing.Optional[ Extract ] = self.get_unmodified(page)
 
-        if page.status_code in [ HTTPStatus.OK ]:
-            if html is not None and page.content_type in [ "text/html" ]:
-                self.count += 1
+        if extract is None:
+            html: typing.Optional[ str ] = await page.request_content(
+                self.session,
+                executor = self.fetch_pool,
+                metrics = self.metrics,
+            )
+
+            if page.status_code in [ HTTPStatus.OK ]:
+                if html is not None and page.content_type in [ "text/html" ]:
+                    extract = await self.get_extract(page, html)
 
-                soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
-                page.extract_meta(soup)
+        if extract is not None:
+            self.count += 1
+            page.apply_meta(extract)
 
-                for embed_uri in page.extract_links(soup):
-                    page.outbound.add(embed_uri)
-                    await self.load_queue(embed_uri, page)
+            for embed_uri in page.get_links(extract.links):
+                self.graph.add_outbound(page.node, embed_uri)
+                await self.load_queue(embed_uri, page)
 
 
     async def crawl_external (
         self,
-        page: Page,
+        page: PageRecord,
         ) -> None:
         """
 Crawl content for an external page.
@@ -267,52 +627,298 @@ Crawl content for an external page.
         html = await page.request_content(
             self.session,
             allow_redirects = True,
+            executor = self.fetch_pool,
+            metrics = self.metrics,
         )
 
         if page.content_type in [ "text/html" ]:
             if self.use_scraper and page.status_code in FAIR_USE_STATUS:
                 self.needs_scraper.append(page)
+                self.scrape_uris.add(page.uri)
+                self.scrape_queue.put_nowait(page)
+
+            # a throttled page gets fetched again, rather than counted
+            if self.scheduler.will_retry(page, retry = page.uri not in self.scrape_uris):
+                return
 
             if html is not None and page.status_code not in [ HTTPStatus.NOT_FOUND ]:
                 self.count += 1
 
-                soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
-                page.extract_meta(soup)
+                page.apply_meta(await self.get_extract(page, html))
+
+
+    async def scrape_page (
+        self,
+        pool: ScraperPool,
+        page: PageRecord,
+        ) -> None:
+        """
+Scrape a blocked page with a headless browser, then extract metadata
+from the scraped HTML.
+        """
+        try:
+            html: typing.Optional[ str ] = await pool.scrape(page.uri)
+
+            if html is not None:
+                page.apply_meta(await self.parse_html(html))
+
+        except Exception as ex:  # pylint: disable=W0718
+            message: str = f"scrape error: {page.uri} : {ex}"
+            logging.error(message)
+            page.error = message
+
+        finally:
+            self.write_page(page)
+
+
+    async def consume_scrapes (
+        self,
+        pool: ScraperPool,
+        ) -> None:
+        """
+Coroutine to consume blocked pages from the scraper stage queue, run
+as one worker per driver in the pool, and stop after receiving a
+`None` sentinel.
+        """
+        while True:
+            page: typing.Optional[ PageRecord ] = await self.scrape_queue.get()
+
+            try:
+                if page is None:
+                    # pass the sentinel along, to stop the other workers
+                    self.scrape_queue.put_nowait(None)
+                    break
+
+                if pool.size > 0:
+                    await self.scrape_page(pool, page)
+                else:
+                    self.write_page(page)
+
+            finally:
+                self.scrape_queue.task_done()
+
+
+    async def scrape_pages (
+        self,
+        ) -> None:
+        """
+Coroutine for the second stage of the crawl pipeline, which scrapes
+blocked pages with a pool of `scraper_pool_size` headless browsers,
+concurrently with the HTTP crawl. The browsers only get started once
+the first blocked page arrives.
+        """
+        page: typing.Optional[ PageRecord ] = await self.scrape_queue.get()
+        self.scrape_queue.task_done()
+
+        if page is None:
+            return
+
+        self.scrape_queue.put_nowait(page)
+
+        async with ScraperPool(
+            size = self.scraper_pool_size,
+            max_pages = self.scraper_max_pages,
+            delay = self.scraper_delay,
+            metadata_only = self.scraper_metadata_only,
+        ) as pool:
+            if pool.size < 1:
+                logging.error("no scraper drivers available")
+
+            await asyncio.gather(*[
+                self.consume_scrapes(pool)
+                for _ in range(max(1, pool.size))
+            ])
+
+
+    async def dispatch_tasks (
+        self,
+        ) -> None:
+        """
+Coroutine to hand off pages from the queue to the per-host scheduler,
+which then decides which host gets fetched next. Pages stay in the
+queue while the scheduler backlog is full, so that the bounded queue
+applies backpressure to the producer, and this stops after receiving a
+`None` sentinel.
+        """
+        while True:
+            while self.backlog_full():
+                self.backlog_space.clear()
+                await self.backlog_space.wait()
+
+            page: typing.Optional[ PageRecord ] = await self.queue.get()
+
+            if page is None:
+                self.queue.task_done()
+                break
+
+            self.scheduler.put(page)
 
 
     async def consume_tasks (
         self,
+        worker_id: int = 0,
         ) -> None:
         """
-Coroutine to consume URLs from the queue.
+Coroutine to consume URLs from the scheduler, run as one of the
+`num_workers` concurrent workers.
+
+Each page gets marked as `task_done()` on the queue only after it has
+been crawled, and therefore only after any links discovered in it have
+been put into the queue -- so `queue.join()` returns only once the
+crawl has completed.
         """
-        logging.info("queue start")
+        logging.info("queue start: worker %d", worker_id)
+
+        while True:
+            page: typing.Optional[ PageRecord ] = await self.scheduler.get()
 
-        while not self.queue.empty():
-            page: Page = await self.queue.get()
-            assert page is not None
+            if page is None:
+                break
+
+            self.backlog_space.set()
 
             # crawl!
-            logging.debug("task: %s %s %s", page.kind, page.uri, page.path)
+            logging.debug("task %d: %s %s %s", worker_id, page.kind, page.uri, page.path)
 
             if page.path in self.shorty:
                 ## FUCK: handle shows
                 page.kind = self.shorty[page.path].kind
 
-            match page.kind:
-                case URLKind.INTERNAL:
-                    await self.crawl_internal(page)
+            try:
+                match page.kind:
+                    case URLKind.INTERNAL:
+                        if self.use_robots:
+                            await self.check_robots(page)
 
-                case URLKind.EXTERNAL:
-                    await self.crawl_external(page)
+                        await self.crawl_internal(page)
 
-                case _:
-                    ic("how to crawl?", page)
+                    case URLKind.EXTERNAL:
+                        if self.use_robots:
+                            await self.check_robots(page)
 
-            self.queue.task_done()
+                        await self.crawl_external(page)
 
-        logging.info("queue done: %s / %d", self.count, len(self.known_pages))
-        ic(self.queue.qsize())
+                    case _:
+                        ic("how to crawl?", page)
+
+            except Exception as ex:  # pylint: disable=W0718
+                message: str = f"crawl error: {page.uri} : {ex}"
+                logging.error(message)
+                page.error = message
+
+            finally:
+                # blocked pages get scraped instead of retried, then
+                # written after they have been scraped
+                blocked: bool = page.uri in self.scrape_uris
+                requeued: bool = self.scheduler.release(page, retry = not blocked)
+                self.backlog_space.set()
+
+                if not requeued:
+                    if not blocked:
+                        self.write_page(page)
+
+                    self.queue.task_done()
+
+        logging.info("queue done: worker %d", worker_id)
+
+
+    def mark_dirty (
+        self,
+        page: PageRecord,
+        ) -> None:
+        """
+Mark a page as changed since the last checkpoint, keyed the same way
+as in `known_pages`.
+        """
+        if self.checkpoint is not None:
+            self.dirty[page.path if page.path is not None else page.uri] = page
+
+
+    def save_checkpoint (
+        self,
+        ) -> None:
+        """
+Save the pages which have changed since the last checkpoint, and
+commit the extracts stored since then.
+        """
+        if self.extract_cache is not None:
+            self.extract_cache.commit()
+
+        if self.checkpoint is None:
+            return
+
+        dirty: typing.Dict[ str, PageRecord ] = self.dirty
+        self.dirty = {}
+
+        saved: int = self.checkpoint.save(
+            [
+                ( key, page.uri in self.reported, page.to_page(self.graph), )
+                for key, page in dirty.items()
+            ],
+            count = self.count,
+        )
+
+        logging.info("checkpoint: %d pages", saved)
+
+
+    async def checkpoint_tasks (
+        self,
+        ) -> None:
+        """
+Coroutine to save a checkpoint every `checkpoint_interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            self.save_checkpoint()
+
+
+    async def resume_checkpoint (
+        self,
+        ) -> None:
+        """
+Reload the crawl state from the checkpoint: pages which had finished
+get written to the new report again, and the rest of the frontier
+goes back into the queue.
+        """
+        if self.checkpoint is None:
+            return
+
+        self.count = self.checkpoint.get_count()
+        frontier: typing.List[ PageRecord ] = []
+
+        for key, done, saved in self.checkpoint.load():
+            page: PageRecord = PageRecord.from_page(saved, self.graph)
+            self.known_pages[key] = page
+
+            if done:
+                self.write_page(page)
+            else:
+                frontier.append(page)
+
+        logging.info("resume: %d pages done, %d queued", len(self.reported), len(frontier))
+
+        for page in frontier:
+            await self.queue.put(page)
+
+
+    def open_stores (
+        self,
+        stack: contextlib.ExitStack,
+        ) -> None:
+        """
+Open the SQLite stores used during a crawl, i.e., the checkpoint and
+the extract cache, when enabled -- which get closed on the way out.
+        """
+        if self.checkpoint_interval > 0.0:
+            self.checkpoint = Checkpoint(self.checkpoint_path)
+            stack.callback(self.checkpoint.close)
+
+            if not self.resume:
+                self.checkpoint.clear()
+
+        if self.revalidate:
+            self.extract_cache = ExtractCache(self.extract_path)
+            stack.callback(self.extract_cache.close)
 
 
     async def crawl (
@@ -320,11 +926,130 @@ Coroutine to consume URLs from the queue.
         ) -> None:
         """
 Crawler entry point coroutine.
+
+HTTP requests get offloaded to a bounded thread pool, so that the
+`num_workers` consumers can have their requests in flight at the same
+time, and HTML parsing optionally gets offloaded to a pool of
+`parse_workers` processes -- while all updates to `known_pages` remain
+on the event loop.
+
+The crawl is complete once the producer has finished and every page
+put into the queue has been crawled, i.e., `queue.join()` returns.
+Then a sentinel stops the dispatcher and closing the scheduler stops
+the workers.
+
+When scraping is enabled, blocked pages flow into a second stage which
+runs concurrently with the HTTP crawl, and another sentinel stops that
+stage once it has drained.
+
+When checkpoints are enabled, the crawl state gets saved periodically
+and also on the way out, including after an interruption, so that a
+later crawl with `resume` can continue from there.
+
+When revalidation is enabled, pages found unchanged since a previous
+crawl reuse their stored extract rather than getting parsed again.
+
+The crawl metrics get dumped periodically, and once more at the end.
         """
-        await asyncio.gather(
-            self.produce_tasks(self.config["nyddu"]["site_map"]),
-            self.consume_tasks(),
-        )
+        with contextlib.ExitStack() as stack:
+            self.fetch_pool = stack.enter_context(ThreadPoolExecutor(
+                max_workers = self.num_workers,
+                thread_name_prefix = "nyddu_fetch",
+            ))
+
+            # start the parse workers from a forkserver, not by forking
+            if self.parse_workers > 0:
+                self.parse_pool = stack.enter_context(ProcessPoolExecutor(
+                    max_workers = self.parse_workers,
+                    mp_context = multiprocessing.get_context("forkserver"),
+                ))
+
+            if self.report_path is not None:
+                self.report_writer = stack.enter_context(ReportWriter(self.report_path))
+
+            self.open_stores(stack)
+
+            tasks: typing.List[ asyncio.Task ] = [
+                asyncio.create_task(self.dispatch_tasks()),
+            ] + [
+                asyncio.create_task(self.consume_tasks(worker_id))
+                for worker_id in range(self.num_workers)
+            ]
+
+            scrape_task: typing.Optional[ asyncio.Task ] = None
+
+            if self.use_scraper:
+                scrape_task = asyncio.create_task(self.scrape_pages())
+
+            checkpoint_task: typing.Optional[ asyncio.Task ] = None
+
+            if self.checkpoint is not None:
+                checkpoint_task = asyncio.create_task(self.checkpoint_tasks())
+
+            metrics_task: typing.Optional[ asyncio.Task ] = None
+
+            if self.metrics_interval > 0.0:
+                metrics_task = asyncio.create_task(self.metrics_tasks())
+
+            try:
+                if self.resume:
+                    await self.resume_checkpoint()
+
+                await self.produce_tasks(self.config["nyddu"]["site_map"])
+                await self.queue.join()
+
+                # shutdown
+                await self.queue.put(None)
+                self.scheduler.close()
+
+                await asyncio.gather(*tasks)
+
+                # no more pages can get blocked, so drain the scraper stage
+                if scrape_task is not None:
+                    await self.scrape_queue.put(None)
+                    await scrape_task
+
+            finally:
+                for task in tasks + [
+                    task
+                    for task in [ scrape_task, checkpoint_task, metrics_task ]
+                    if task is not None
+                ]:
+                    if not task.done():
+                        task.cancel()
+
+                # checkpoint before writing the pages which did not finish
+                # crawling, so that those get crawled again on resume
+                self.save_checkpoint()
+
+                for page in self.known_pages.values():
+                    self.write_page(page)
+
+                self.dump_metrics()
+
+                self.fetch_pool = None
+                self.parse_pool = None
+                self.report_writer = None
+                self.checkpoint = None
+                self.extract_cache = None
+
+        logging.info("crawl done: %s / %d", self.count, len(self.known_pages))
+        ic(self.queue.qsize())
+
+
+    def write_page (
+        self,
+        page: PageRecord,
+        ) -> None:
+        """
+Write a page to the streaming report, once it has finished crawling.
+        """
+        if self.report_writer is not None and page.uri not in self.reported:
+            with warnings.catch_warnings(action = "ignore"):
+                self.report_writer.write(page.to_page(self.graph).to_json())
+
+            self.reported.add(page.uri)
+            self.mark_dirty(page)
 
 
     def report (
@@ -335,6 +1060,6 @@ Report results.
         """
         with warnings.catch_warnings(action = "ignore"):
             return [
-                page.to_json()
+                page.to_page(self.graph).to_json()
                 for _, page in sorted(self.known_pages.items())
             ]
@@ -5,29 +5,390 @@
 Utility methods to support KùzuDB access patterns.
 """
 
+from collections.abc import Iterator
+import contextlib
+import hashlib
+import json
+import logging
+import os
 import pathlib
+import queue
+import threading
+import time
+import typing
+import uuid
+import warnings
 
 import kuzu
 from sentence_transformers import SentenceTransformer
+import torch
+
+
+VECTOR_INDEX: str = "page_vec_index"
 
 
 def db_connect (
     *,
     db_path: pathlib.Path = pathlib.Path("db"),
+    timeout: float = 60.0,
     ) -> kuzu.Connection:
     """
-Initialize a KùzuDB connection.
+Initialize a KùzuDB connection for loading. While a webapp holds the
+database open, this asks the webapp to release it by creating the
+reload marker, then waits up to `timeout` seconds for the lock. The
+marker gets removed by `write_generation()` once the load is done.
+    """
+    deadline: float = time.monotonic() + timeout
+
+    while True:
+        try:
+            return kuzu.Connection(kuzu.Database(db_path))
+        except RuntimeError:
+            if time.monotonic() > deadline:
+                raise
+
+            reload_path(db_path).touch()
+            time.sleep(0.2)
+
+
+def prepare_queries (
+    conn: kuzu.Connection,
+    queries: typing.Dict[ str, str ],
+    ) -> typing.Dict[ str, kuzu.PreparedStatement ]:
+    """
+Parse and plan a set of parameterized queries once, so that their
+prepared statements can be reused across requests on this connection.
+    """
+    with warnings.catch_warnings():
+        # KùzuDB recommends `execute()` with the query text, which
+        # re-plans on every call; the prepared plans run faster, so
+        # silence only this one deprecation (see the pin in pyproject)
+        warnings.filterwarnings(
+            "ignore",
+            message = "The use of separate prepare",
+            category = DeprecationWarning,
+        )
+
+        return {
+            name: conn.prepare(query)
+            for name, query in queries.items()
+        }
+
+
+class PooledConnection (typing.NamedTuple):
+    """
+One connection checked out from a pool, along with the statements
+prepared on it.
+    """
+    conn: kuzu.Connection
+    prepared: typing.Dict[ str, kuzu.PreparedStatement ]
+
+
+class DatabaseUnavailable (RuntimeError):
+    """
+The database cannot be queried right now, e.g., while being loaded.
+    """
+
+
+class ConnectionPool:
+    """
+Pool of connections over one KùzuDB database, so that concurrent
+requests each get a connection of their own. Connections must not be
+shared between threads while in use, so each gets checked out for the
+duration of a request, then returned.
+
+A loader needs the database lock, so the pool releases the database
+while the loader's reload marker exists, then reopens it afterwards.
     """
-    return kuzu.Connection(kuzu.Database(db_path))
+    def __init__ (  # pylint: disable=W0102
+        self,
+        db_path: pathlib.Path,
+        *,
+        size: typing.Optional[ int ] = None,
+        queries: typing.Dict[ str, str ] = {},
+        on_open: typing.Optional[ typing.Callable[ [ kuzu.Connection ], None ] ] = None,
+        watch_interval: float = 0.5,
+        ) -> None:
+        """
+Constructor, which defaults to one connection per CPU core, each with
+the given queries prepared, and calls `on_open` with a connection
+whenever the database gets opened, e.g., to load extensions. A daemon
+thread checks for the reload marker every `watch_interval` seconds,
+so that an idle webapp releases the database too.
+        """
+        self.db_path: pathlib.Path = db_path
+        self.size: int = max(1, size or os.cpu_count() or 1)
+        self.queries: typing.Dict[ str, str ] = queries
+        self.on_open: typing.Optional[ typing.Callable[ [ kuzu.Connection ], None ] ] = on_open
+
+        self.db: typing.Optional[ kuzu.Database ] = None
+        self.idle: queue.LifoQueue[ PooledConnection ] = queue.LifoQueue()
+        self.lock: threading.Lock = threading.Lock()
+
+        self.sync()
+
+        if watch_interval > 0.0:
+            threading.Thread(
+                target = self.watch,
+                args = ( watch_interval, ),
+                daemon = True,
+            ).start()
+
+
+    def open (
+        self,
+        ) -> None:
+        """
+Open the database along with its connections, unless a loader holds
+the lock, in which case the pool stays closed.
+        """
+        try:
+            db: kuzu.Database = kuzu.Database(self.db_path, read_only = True)
+        except RuntimeError as ex:
+            logging.warning("database unavailable: %s", ex)
+            return
+
+        conns: typing.List[ kuzu.Connection ] = [
+            kuzu.Connection(db)
+            for _ in range(self.size)
+        ]
+
+        if self.on_open is not None:
+            self.on_open(conns[0])
+
+        for conn in conns:
+            self.idle.put(PooledConnection(conn, prepare_queries(conn, self.queries)))
+
+        self.db = db
+
+
+    def close (
+        self,
+        ) -> None:
+        """
+Close the database, once every connection has been returned.
+        """
+        if self.db is None:
+            return
+
+        for _ in range(self.size):
+            self.idle.get().conn.close()
+
+        self.db.close()
+        self.db = None
+
+
+    def sync (
+        self,
+        ) -> None:
+        """
+Release the database while a loader has asked for it, otherwise make
+sure that it's open.
+        """
+        reloading: bool = reload_path(self.db_path).exists()
+
+        with self.lock:
+            if reloading:
+                self.close()
+            elif self.db is None:
+                self.open()
+
+
+    def watch (
+        self,
+        interval: float,
+        ) -> None:
+        """
+Keep the pool in sync with the reload marker, in a daemon thread.
+        """
+        while True:
+            time.sleep(interval)
+            self.sync()
+
+
+    @contextlib.contextmanager
+    def connection (
+        self,
+        *,
+        timeout: typing.Optional[ float ] = None,
+        ) -> Iterator[ PooledConnection ]:
+        """
+Check out a connection, waiting until one is idle, then return it to
+the pool afterwards. Raises `DatabaseUnavailable` while the database
+is closed for a load.
+        """
+        self.sync()
+
+        if self.db is None:
+            raise DatabaseUnavailable(f"database is being loaded: {self.db_path}")
+
+        pooled: PooledConnection = self.idle.get(timeout = timeout)
+
+        try:
+            yield pooled
+        finally:
+            self.idle.put(pooled)
 
 
 def load_model (
     *,
     embed_model: str = "all-MiniLM-L6-v2",
+    num_threads: typing.Optional[ int ] = None,
     ) -> SentenceTransformer:
     """
 Load a pre-trained embedding generation model, defaulting to
 <https://huggingface.co/sentence-transformers/all-MiniLM-L6-v2>
-for 384-dimensional embedding vectors.
+for 384-dimensional embedding vectors, optionally setting the number
+of CPU threads used for inference.
     """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
     return SentenceTransformer(embed_model)
+
+
+def page_text (
+    page: dict,
+    ) -> str:
+    """
+Compose the text to embed for a page from its title, summary, and
+keywords.
+    """
+    parts: typing.List[ typing.Optional[ str ] ] = [
+        page.get("title"),
+        page.get("summary"),
+        ", ".join(sorted(page.get("keywords") or [])),
+    ]
+
+    return "\n".join(part.strip() for part in parts if part is not None and len(part.strip()) > 0)
+
+
+def embed_texts (
+    model: SentenceTransformer,
+    texts: typing.List[ str ],
+    *,
+    batch_size: int = 64,
+    ) -> typing.List[ typing.List[ float ] ]:
+    """
+Generate normalized embedding vectors for a list of texts, in batches.
+    """
+    if len(texts) < 1:
+        return []
+
+    with torch.inference_mode():
+        vectors = model.encode(
+            texts,
+            batch_size = batch_size,
+            convert_to_numpy = True,
+            normalize_embeddings = True,
+            show_progress_bar = False,
+        )
+
+    return vectors.tolist()
+
+
+def load_vector_extension (
+    conn: kuzu.Connection,
+    ) -> None:
+    """
+Install and load the KùzuDB `vector` extension, for vector indexes.
+    """
+    conn.execute("INSTALL VECTOR")
+    conn.execute("LOAD VECTOR")
+
+
+def has_vector_index (
+    conn: kuzu.Connection,
+    *,
+    table: str = "Page",
+    index: str = VECTOR_INDEX,
+    ) -> bool:
+    """
+Check whether a vector index exists on a table.
+    """
+    result: kuzu.QueryResult = conn.execute("CALL SHOW_INDEXES() RETURN *")  # type: ignore
+
+    while result.has_next():
+        row: dict = dict(zip(result.get_column_names(), result.get_next()))
+
+        if row["table_name"] == table and row["index_name"] == index:
+            return True
+
+    return False
+
+
+def stable_id (
+    uri: str,
+    ) -> int:
+    """
+Derive a stable `INT64` primary key for a page from its canonical URI,
+so that ids remain the same across loads.
+    """
+    digest: bytes = hashlib.blake2b(uri.encode("utf-8"), digest_size = 8).digest()
+    return int.from_bytes(digest, byteorder = "big", signed = True)
+
+
+def row_digest (
+    row: dict,
+    ) -> str:
+    """
+Digest the contents of a row, to detect which rows have changed
+between loads.
+    """
+    return hashlib.blake2b(
+        json.dumps(row, sort_keys = True, default = str).encode("utf-8"),
+        digest_size = 16,
+    ).hexdigest()
+
+
+def generation_path (
+    db_path: pathlib.Path,
+    ) -> pathlib.Path:
+    """
+Path for the load generation marker of a database, which sits next
+to it.
+    """
+    return db_path.with_name(db_path.name + ".generation")
+
+
+def reload_path (
+    db_path: pathlib.Path,
+    ) -> pathlib.Path:
+    """
+Path for the reload marker of a database, which a loader creates to
+ask the webapp to release the database, and removes once it's done.
+    """
+    return db_path.with_name(db_path.name + ".reload")
+
+
+def write_generation (
+    db_path: pathlib.Path,
+    ) -> str:
+    """
+Mark the completion of a load into the database with a new, unique
+generation, replacing the marker atomically, then remove any reload
+marker so that the webapp reopens the database. Close the database
+before calling this.
+    """
+    generation: str = uuid.uuid4().hex
+    path: pathlib.Path = generation_path(db_path)
+    tmp_path: pathlib.Path = path.with_name(path.name + ".tmp")
+
+    tmp_path.write_text(generation, encoding = "utf-8")
+    os.replace(tmp_path, path)
+    reload_path(db_path).unlink(missing_ok = True)
+
+    return generation
+
+
+def read_generation (
+    db_path: pathlib.Path,
+    ) -> typing.Optional[ str ]:
+    """
+Read the load generation of the database, or `None` if no load has
+marked it yet.
+    """
+    try:
+        return generation_path(db_path).read_text(encoding = "utf-8").strip()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Single-pass HTML metadata and link extraction for Nyddu, with
+pluggable parser backends.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+import importlib.util
+import typing
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+
+PARSER_BACKENDS: typing.Set[ str ] = set([
+    "html.parser", # stdlib, via BeautifulSoup
+    "lxml", # optional, requires `lxml`, via BeautifulSoup
+    "selectolax", # optional, requires `selectolax`
+])
+
+## modules required by the optional backends, see the `fast` extra
+PARSER_MODULES: typing.Dict[ str, str ] = {
+    "lxml": "lxml",
+    "selectolax": "selectolax",
+}
+
+LINK_ATTRS: typing.Dict[ str, str ] = {
+    "a": "href",
+    "img": "src",
+    "iframe": "src",
+}
+
+EXTRACT_TAGS: typing.List[ str ] = [ "title", "meta" ] + list(LINK_ATTRS.keys())
+
+
+class Extract (typing.NamedTuple):
+    """
+Compact result of parsing one HTML document: its metadata plus the
+raw values of all its link-bearing attributes, in document order.
+    """
+    links: typing.List[ str ]
+    title: typing.Optional[ str ] = None
+    summary: typing.Optional[ str ] = None
+    thumbnail: typing.Optional[ str ] = None
+    keywords: typing.Optional[ typing.List[ str ] ] = None
+
+
+def check_parser (
+    parser: str,
+    ) -> str:
+    """
+Validate the name of a parser backend, checking that any optional
+module it requires has been installed -- so that a misconfigured
+crawl fails at startup rather than at parse time.
+    """
+    if parser not in PARSER_BACKENDS:
+        raise ValueError(f"unknown HTML parser: {parser}")
+
+    module: typing.Optional[ str ] = PARSER_MODULES.get(parser)
+
+    if module is not None and importlib.util.find_spec(module) is None:
+        raise ValueError(f"HTML parser {parser} requires the `fast` extra: pip install 'nyddu[fast]'")  # pylint: disable=C0301
+
+    return parser
+
+
+def parse_meta (
+    attrs: typing.Dict[ str, typing.Any ],
+    meta: typing.Dict[ str, typing.Any ],
+    ) -> None:
+    """
+Update the extracted metadata from the attributes of one `meta` tag.
+    """
+    content: typing.Optional[ str ] = attrs.get("content")
+
+    if content is None:
+        return
+
+    if "property" in attrs:
+        match attrs["property"]:
+            case "og:image":
+                meta["thumbnail"] = content
+
+    elif "name" in attrs:
+        match attrs["name"]:
+            case "description":
+                meta["summary"] = content
+
+            case "keywords":
+                meta["keywords"] = [ key.strip() for key in content.split(",") ]
+
+
+def extract_soup (
+    soup: BeautifulSoup,
+    ) -> Extract:
+    """
+Extract metadata and links from a parsed document, in one traversal.
+    """
+    meta: typing.Dict[ str, typing.Any ] = {}
+    links: typing.List[ str ] = []
+
+    for tag in soup.find_all(EXTRACT_TAGS):
+        match tag.name:  # type: ignore
+            case "title":
+                if "title" not in meta:
+                    meta["title"] = tag.string  # type: ignore
+
+            case "meta":
+                parse_meta(tag.attrs, meta)  # type: ignore
+
+            case _:
+                link: typing.Optional[ str ] = tag.attrs.get(LINK_ATTRS[tag.name])  # type: ignore
+
+                if link is not None:
+                    links.append(link)
+
+    return Extract(links = links, **meta)
+
+
+def extract_selectolax (
+    html: str,
+    ) -> Extract:
+    """
+Extract metadata and links from HTML using the `selectolax` parser,
+in one traversal.
+    """
+    from selectolax.lexbor import LexborHTMLParser  # type: ignore  # pylint: disable=C0415,E0401,E0611
+
+    meta: typing.Dict[ str, typing.Any ] = {}
+    links: typing.List[ str ] = []
+
+    for node in LexborHTMLParser(html).css(",".join(EXTRACT_TAGS)):
+        match node.tag:
+            case "title":
+                if "title" not in meta:
+                    meta["title"] = node.text() or None
+
+            case "meta":
+                parse_meta(node.attributes, meta)
+
+            case _:
+                link = node.attributes.get(LINK_ATTRS[node.tag])  # type: ignore
+
+                if link is not None:
+                    links.append(link)
+
+    return Extract(links = links, **meta)
+
+
+def extract_html (
+    html: str,
+    *,
+    parser: str = "html.parser",
+    ) -> Extract:
+    """
+Parse HTML with the given backend, building only the tags which get
+extracted, then extract metadata and links in one traversal.
+    """
+    if parser == "selectolax":
+        return extract_selectolax(html)
+
+    soup: BeautifulSoup = BeautifulSoup(
+        html,
+        parser,
+        parse_only = SoupStrainer(EXTRACT_TAGS),
+    )
+
+    return extract_soup(soup)
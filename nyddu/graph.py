@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compact link graph for Nyddu, with interned URLs and integer edges.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+from array import array
+import bisect
+import typing
+
+
+def add_edge (
+    edges: typing.Dict[ int, array ],
+    node: int,
+    target: int,
+    ) -> bool:
+    """
+Add an edge to the sorted adjacency array for a node, returning whether
+it was new. Since ids get assigned in discovery order, most inserts
+land at the end of the array.
+    """
+    targets: typing.Optional[ array ] = edges.get(node)
+
+    if targets is None:
+        edges[node] = array("I", [ target ])
+        return True
+
+    if targets[-1] < target:
+        targets.append(target)
+        return True
+
+    i: int = bisect.bisect_left(targets, target)
+
+    if i < len(targets) and targets[i] == target:
+        return False
+
+    targets.insert(i, target)
+    return True
+
+
+class LinkGraph:
+    """
+Links among pages during a crawl: each URL or path string gets interned
+once and mapped to an integer id, and the edges of each node get stored
+as arrays of ids -- rather than as sets of strings for every page.
+    """
+    __slots__ = ( "ids", "urls", "outbound", "refs", "raw_refs", )
+
+    def __init__ (
+        self,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.ids: typing.Dict[ str, int ] = {}
+        self.urls: typing.List[ str ] = []
+        self.outbound: typing.Dict[ int, array ] = {}
+        self.refs: typing.Dict[ int, array ] = {}
+        self.raw_refs: typing.Dict[ int, array ] = {}
+
+
+    def __len__ (
+        self,
+        ) -> int:
+        """
+Count the interned strings.
+        """
+        return len(self.urls)
+
+
+    def intern (
+        self,
+        url: str,
+        ) -> int:
+        """
+Accessor for the id of a string, interning it when it is new.
+        """
+        node: typing.Optional[ int ] = self.ids.get(url)
+
+        if node is None:
+            node = len(self.urls)
+            self.ids[url] = node
+            self.urls.append(url)
+
+        return node
+
+
+    def get_urls (
+        self,
+        edges: typing.Dict[ int, array ],
+        node: int,
+        ) -> typing.List[ str ]:
+        """
+Resolve the edges of a node back to their strings.
+        """
+        return [ self.urls[target] for target in edges.get(node, ()) ]
+
+
+    def add_outbound (
+        self,
+        node: int,
+        uri: str,
+        ) -> bool:
+        """
+Add an outbound link, returning whether it was new.
+        """
+        return add_edge(self.outbound, node, self.intern(uri))
+
+
+    def add_ref (
+        self,
+        node: int,
+        ref: typing.Optional[ str ],
+        *,
+        raw: bool = True,
+        ) -> bool:
+        """
+Add a back-reference link, returning whether it was new. Links via
+shortened URLs are not `raw`.
+        """
+        if ref is None:
+            return False
+
+        edges: typing.Dict[ int, array ] = self.raw_refs if raw else self.refs
+
+        return add_edge(edges, node, self.intern(ref))
+
+
+    def get_outbound (
+        self,
+        node: int,
+        ) -> typing.List[ str ]:
+        """
+Accessor for the outbound links of a node.
+        """
+        return self.get_urls(self.outbound, node)
+
+
+    def get_refs (
+        self,
+        node: int,
+        ) -> typing.List[ str ]:
+        """
+Accessor for the back-references of a node, via shortened URLs.
+        """
+        return self.get_urls(self.refs, node)
+
+
+    def get_raw_refs (
+        self,
+        node: int,
+        ) -> typing.List[ str ]:
+        """
+Accessor for the back-references of a node.
+        """
+        return self.get_urls(self.raw_refs, node)
@@ -0,0 +1,691 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Metrics for Nyddu, rendered in the Prometheus text exposition format,
+plus instrumentation to split HTTP fetch latency into phases.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+import math
+import os
+import pathlib
+import socket
+import threading
+import time
+import typing
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+import requests
+
+
+CONTENT_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS: typing.List[ float ] = [
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+]
+
+LabelValues = typing.Tuple[ str, ... ]
+
+
+def format_labels (
+    names: typing.Sequence[ str ],
+    values: typing.Sequence[ str ],
+    ) -> str:
+    """
+Format label names and values as a Prometheus label set, escaping
+the values.
+    """
+    if len(names) < 1:
+        return ""
+
+    pairs: typing.List[ str ] = [
+        name + '="' + str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"'  # pylint: disable=C0301
+        for name, value in zip(names, values)
+    ]
+
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value (
+    value: float,
+    ) -> str:
+    """
+Format a sample value.
+    """
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+
+    return repr(float(value))
+
+
+class Metric:
+    """
+Base class for a metric family, whose samples get keyed by their label
+values, in the order of `label_names`.
+    """
+    kind: str = "untyped"
+
+    def __init__ (
+        self,
+        name: str,
+        help_text: str,
+        label_names: typing.Sequence[ str ] = (),
+        ) -> None:
+        """
+Constructor.
+        """
+        self.name: str = name
+        self.help_text: str = help_text
+        self.label_names: LabelValues = tuple(label_names)
+        self.lock: threading.Lock = threading.Lock()
+
+
+    def label_values (
+        self,
+        labels: typing.Dict[ str, typing.Any ],
+        ) -> LabelValues:
+        """
+Order the given labels as a key for the samples.
+        """
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+
+    def samples (
+        self,
+        ) -> typing.Iterator[ typing.Tuple[ str, str, float ] ]:
+        """
+Iterate through the samples, as the suffix of the metric name, the
+formatted label set, and the value.
+        """
+        yield from ()
+
+
+    def render (
+        self,
+        ) -> typing.List[ str ]:
+        """
+Render the metric family in the Prometheus text exposition format.
+        """
+        lines: typing.List[ str ] = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+
+        return lines
+
+
+class Counter (Metric):
+    """
+A monotonically increasing count, either incremented directly or read
+by a function from a count kept elsewhere, each time the metrics get
+rendered.
+    """
+    kind: str = "counter"
+
+    def __init__ (
+        self,
+        name: str,
+        help_text: str,
+        label_names: typing.Sequence[ str ] = (),
+        ) -> None:
+        """
+Constructor.
+        """
+        super().__init__(name, help_text, label_names)
+        self.values: typing.Dict[ LabelValues, float ] = {}
+        self.function: typing.Optional[ typing.Callable[ [], typing.Any ] ] = None
+
+
+    def inc (
+        self,
+        amount: float = 1.0,
+        **labels: typing.Any,
+        ) -> None:
+        """
+Increment the count for the given labels.
+        """
+        key: LabelValues = self.label_values(labels)
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+
+    def set_function (
+        self,
+        function: typing.Callable[ [], typing.Any ],
+        ) -> None:
+        """
+Compute the value when rendered: the function returns either a number,
+or for a labeled metric a dictionary which maps label values to numbers.
+        """
+        self.function = function
+
+
+    def samples (
+        self,
+        ) -> typing.Iterator[ typing.Tuple[ str, str, float ] ]:
+        """
+Iterate through the samples.
+        """
+        values: typing.Dict[ LabelValues, float ]
+
+        if self.function is None:
+            with self.lock:
+                values = dict(self.values)
+        else:
+            result: typing.Any = self.function()
+
+            if isinstance(result, dict):
+                values = { tuple(key) if isinstance(key, tuple) else ( key, ): val for key, val in result.items() }  # pylint: disable=C0301
+            else:
+                values = { (): float(result) }
+
+        for key, value in sorted(values.items()):
+            yield "", format_labels(self.label_names, key), value
+
+
+class Gauge (Counter):
+    """
+A value which can go up and down, either set directly or computed by
+a function each time the metrics get rendered.
+    """
+    kind: str = "gauge"
+
+    def set (
+        self,
+        value: float,
+        **labels: typing.Any,
+        ) -> None:
+        """
+Set the value for the given labels.
+        """
+        key: LabelValues = self.label_values(labels)
+
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram (Metric):
+    """
+A distribution of observed values, counted in cumulative buckets.
+    """
+    kind: str = "histogram"
+
+    def __init__ (
+        self,
+        name: str,
+        help_text: str,
+        label_names: typing.Sequence[ str ] = (),
+        *,
+        buckets: typing.Sequence[ float ] = tuple(LATENCY_BUCKETS),
+        ) -> None:
+        """
+Constructor.
+        """
+        super().__init__(name, help_text, label_names)
+        self.buckets: typing.List[ float ] = sorted(buckets) + [ math.inf ]
+        self.counts: typing.Dict[ LabelValues, typing.List[ int ] ] = {}
+        self.sums: typing.Dict[ LabelValues, float ] = {}
+
+
+    def observe (
+        self,
+        value: float,
+        **labels: typing.Any,
+        ) -> None:
+        """
+Observe one value for the given labels.
+        """
+        key: LabelValues = self.label_values(labels)
+
+        with self.lock:
+            counts: typing.List[ int ] = self.counts.setdefault(key, [ 0 ] * len(self.buckets))
+            self.sums[key] = self.sums.get(key, 0.0) + value
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+
+
+    def samples (
+        self,
+        ) -> typing.Iterator[ typing.Tuple[ str, str, float ] ]:
+        """
+Iterate through the samples: the cumulative buckets, sum, and count.
+        """
+        with self.lock:
+            counts: typing.Dict[ LabelValues, typing.List[ int ] ] = {
+                key: list(val)
+                for key, val in self.counts.items()
+            }
+
+            sums: typing.Dict[ LabelValues, float ] = dict(self.sums)
+
+        label_names: LabelValues = self.label_names + ( "le", )
+
+        for key in sorted(counts):
+            total: int = 0
+
+            for bound, count in zip(self.buckets, counts[key]):
+                total += count
+                yield "_bucket", format_labels(label_names, key + ( format_value(bound), )), total
+
+            yield "_sum", format_labels(self.label_names, key), sums[key]
+            yield "_count", format_labels(self.label_names, key), total
+
+
+MetricT = typing.TypeVar("MetricT", bound = Metric)
+
+
+class MetricsRegistry:
+    """
+A collection of metric families, which renders them all together.
+    """
+    def __init__ (
+        self,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.metrics: typing.Dict[ str, Metric ] = {}
+
+
+    def register (
+        self,
+        metric: MetricT,
+        ) -> MetricT:
+        """
+Add a metric family, returning it.
+        """
+        self.metrics[metric.name] = metric
+        return metric
+
+
+    def counter (
+        self,
+        name: str,
+        help_text: str,
+        label_names: typing.Sequence[ str ] = (),
+        ) -> Counter:
+        """
+Add a counter.
+        """
+        return self.register(Counter(name, help_text, label_names))
+
+
+    def gauge (
+        self,
+        name: str,
+        help_text: str,
+        label_names: typing.Sequence[ str ] = (),
+        ) -> Gauge:
+        """
+Add a gauge.
+        """
+        return self.register(Gauge(name, help_text, label_names))
+
+
+    def histogram (
+        self,
+        name: str,
+        help_text: str,
+        label_names: typing.Sequence[ str ] = (),
+        *,
+        buckets: typing.Sequence[ float ] = tuple(LATENCY_BUCKETS),
+        ) -> Histogram:
+        """
+Add a histogram.
+        """
+        return self.register(Histogram(name, help_text, label_names, buckets = buckets))
+
+
+    def render (
+        self,
+        ) -> str:
+        """
+Render all of the metrics in the Prometheus text exposition format.
+        """
+        lines: typing.List[ str ] = []
+
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+    def dump (
+        self,
+        path: pathlib.Path,
+    ) -> None:
+        """
+Write the rendered metrics to a file, replacing it atomically so that
+readers never see a partial file.
+        """
+        tmp_path: pathlib.Path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(self.render(), encoding = "utf-8")
+        os.replace(tmp_path, path)
+
+
+######################################################################
+## HTTP fetch phases
+
+PHASES: threading.local = threading.local()
+
+
+class FetchTiming (typing.NamedTuple):
+    """
+Time spent in the phases of one HTTP request before its response body
+gets downloaded: DNS resolution, connecting (including TLS), then the
+time to the first byte of the response.
+    """
+    dns: float = 0.0
+    connect: float = 0.0
+    ttfb: float = 0.0
+
+
+def timed_new_conn (
+    conn: HTTPConnection,
+    new_conn: typing.Callable[ [], socket.socket ],
+    ) -> socket.socket:
+    """
+Open the socket for a connection, resolving its host here first, so
+that the time spent resolving gets added to the thread-local `PHASES`
+of this connection alone, rather than wrapping `socket.getaddrinfo()`
+for the whole process. Then `new_conn` gets called for each resolved
+address in turn, so that `urllib3` still falls back through all of
+them when connecting.
+    """
+    # pylint: disable=W0212
+    dns_host: str = conn._dns_host
+    start_time: float = time.perf_counter()
+
+    try:
+        addresses: list = socket.getaddrinfo(
+            dns_host.strip("[]"),
+            conn.port,
+            allowed_gai_family(),
+            socket.SOCK_STREAM,
+        )
+    except socket.gaierror as ex:
+        raise NameResolutionError(conn.host, conn, ex) from ex
+    finally:
+        PHASES.dns = getattr(PHASES, "dns", 0.0) + time.perf_counter() - start_time
+
+    error: typing.Optional[ Exception ] = None
+
+    try:
+        for *_, address in addresses:
+            conn._dns_host = address[0]
+
+            try:
+                return new_conn()
+            except ( ConnectTimeoutError, NewConnectionError, ) as ex:
+                error = ex
+    finally:
+        conn._dns_host = dns_host
+
+    if error is not None:
+        raise error
+
+    raise NewConnectionError(conn, "Failed to establish a new connection: no addresses")
+
+
+def timed_connect (
+    connect: typing.Callable[ [], None ],
+    ) -> None:
+    """
+Connect, timing the setup (including TLS) apart from the resolution.
+    """
+    start_time: float = time.perf_counter()
+    dns: float = getattr(PHASES, "dns", 0.0)
+
+    try:
+        connect()
+    finally:
+        elapsed: float = time.perf_counter() - start_time
+        resolved: float = getattr(PHASES, "dns", 0.0) - dns
+        PHASES.connect = getattr(PHASES, "connect", 0.0) + max(0.0, elapsed - resolved)
+
+
+class TimedHTTPConnection (HTTPConnection):
+    """
+HTTP connection with timed phases.
+    """
+    def _new_conn (
+        self,
+        ) -> socket.socket:
+        """
+Open the socket, timing the resolution.
+        """
+        return timed_new_conn(self, super()._new_conn)
+
+
+    def connect (
+        self,
+        ) -> None:
+        """
+Connect, timing the phases.
+        """
+        timed_connect(super().connect)
+
+
+class TimedHTTPSConnection (HTTPSConnection):
+    """
+HTTPS connection with timed phases.
+    """
+    def _new_conn (
+        self,
+        ) -> socket.socket:
+        """
+Open the socket, timing the resolution.
+        """
+        return timed_new_conn(self, super()._new_conn)  # pylint: disable=E1101
+
+
+    def connect (
+        self,
+        ) -> None:
+        """
+Connect, timing the phases.
+        """
+        # pylint infers the `DummyConnection` fallback which `urllib3`
+        # uses when the `ssl` module is missing
+        timed_connect(super().connect)  # pylint: disable=E1101
+
+
+class TimedHTTPConnectionPool (HTTPConnectionPool):  # pylint: disable=R0903
+    """
+HTTP connection pool with timed phases.
+    """
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool (HTTPSConnectionPool):  # pylint: disable=R0903
+    """
+HTTPS connection pool with timed phases.
+    """
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter (requests.adapters.HTTPAdapter):
+    """
+HTTP adapter which attaches a `FetchTiming` to each response it sends,
+as `response.fetch_timing`. Requests on connections which get reused
+from the pool have no DNS or connect time.
+    """
+    def init_poolmanager (
+        self,
+        *args: typing.Any,
+        **kwargs: typing.Any,
+        ) -> None:
+        """
+Initialize the pool manager, with the timed connection pools.
+        """
+        super().init_poolmanager(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+    def send (  # type: ignore  # pylint: disable=W0221
+        self,
+        request: requests.PreparedRequest,
+        **kwargs: typing.Any,
+        ) -> requests.Response:
+        """
+Send a request, timing the phases up to when its headers have been
+received; the body gets downloaded afterwards.
+        """
+        PHASES.dns = 0.0
+        PHASES.connect = 0.0
+        start_time: float = time.perf_counter()
+        response: requests.Response = super().send(request, **kwargs)
+        elapsed: float = time.perf_counter() - start_time
+
+        response.fetch_timing = FetchTiming(  # type: ignore
+            dns = PHASES.dns,
+            connect = PHASES.connect,
+            ttfb = max(0.0, elapsed - PHASES.dns - PHASES.connect),
+        )
+
+        return response
+
+
+class CrawlMetrics:
+    """
+Metrics for the hot path of a crawl: the fetch latency split into its
+phases, the parse time, the HTTP cache hit ratio, plus the page counts
+and rates per host. Gauges for the queues get added by the crawler.
+    """
+    def __init__ (
+        self,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.registry: MetricsRegistry = MetricsRegistry()
+        self.start_time: float = time.monotonic()
+
+        self.fetch_seconds: Histogram = self.registry.histogram(
+            "nyddu_crawl_fetch_seconds",
+            "HTTP fetch latency, by phase: dns, connect (including TLS), ttfb, download, total.",
+            ( "phase", ),
+        )
+
+        self.parse_seconds: Histogram = self.registry.histogram(
+            "nyddu_crawl_parse_seconds",
+            "Time spent parsing the HTML of a page.",
+        )
+
+        self.http_cache: Counter = self.registry.counter(
+            "nyddu_crawl_http_cache_total",
+            "HTTP requests served by the request cache, by result: hit or miss.",
+            ( "result", ),
+        )
+
+        self.host_pages: Counter = self.registry.counter(
+            "nyddu_crawl_host_pages_total",
+            "Pages fetched, by host.",
+            ( "host", ),
+        )
+
+        self.fetch_errors: Counter = self.registry.counter(
+            "nyddu_crawl_fetch_errors_total",
+            "HTTP fetches which failed with an error or timeout, by host.",
+            ( "host", ),
+        )
+
+        self.registry.gauge(
+            "nyddu_crawl_host_pages_per_second",
+            "Pages fetched per second since the crawl started, by host.",
+            ( "host", ),
+        ).set_function(self.get_host_rates)
+
+        self.registry.gauge(
+            "nyddu_crawl_elapsed_seconds",
+            "Time elapsed since the crawl started.",
+        ).set_function(self.get_elapsed)
+
+
+    def get_elapsed (
+        self,
+        ) -> float:
+        """
+Accessor for the time elapsed since the crawl started.
+        """
+        return time.monotonic() - self.start_time
+
+
+    def get_host_rates (
+        self,
+        ) -> typing.Dict[ LabelValues, float ]:
+        """
+Accessor for the rate of pages fetched per host.
+        """
+        elapsed: float = max(self.get_elapsed(), 1e-9)
+
+        with self.host_pages.lock:
+            return {
+                key: count / elapsed
+                for key, count in self.host_pages.values.items()
+            }
+
+
+    def observe_fetch (
+        self,
+        host: str,
+        response: typing.Optional[ requests.Response ],
+        elapsed: float,
+        ) -> None:
+        """
+Observe one fetch of a page, which took `elapsed` seconds in total, or
+which failed when there is no response. The phases get summed across
+any redirects, and whatever time remains is the download.
+        """
+        if response is None:
+            self.fetch_errors.inc(host = host)
+            return
+
+        self.host_pages.inc(host = host)
+        self.fetch_seconds.observe(elapsed, phase = "total")
+
+        if getattr(response, "from_cache", False):
+            self.http_cache.inc(result = "hit")
+            return
+
+        self.http_cache.inc(result = "miss")
+        remaining: float = elapsed
+
+        for phase in FetchTiming._fields:
+            value: float = sum(
+                getattr(getattr(hop, "fetch_timing", FetchTiming()), phase)
+                for hop in list(response.history) + [ response ]
+            )
+
+            self.fetch_seconds.observe(value, phase = phase)
+            remaining -= value
+
+        self.fetch_seconds.observe(max(0.0, remaining), phase = "download")
+
+
+def crawl_metrics_path (
+    config: dict,
+    ) -> pathlib.Path:
+    """
+Path of the file where the crawler dumps its metrics, based on the
+`[nyddu]` configuration.
+    """
+    return pathlib.Path(config["nyddu"].get(
+        "metrics_path",
+        f"{config['nyddu']['cache_path']}_metrics.prom",
+    ))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Memoized URL normalization for Nyddu link discovery.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+import functools
+import posixpath
+import re
+import typing
+import urllib.parse
+
+import w3lib.url
+
+from .page import Page
+
+
+InternalLink = typing.Tuple[ str, str ]
+
+
+def compile_prefixes (
+    prefixes: typing.List[ str ],
+    ) -> typing.Optional[ re.Pattern ]:
+    """
+Compile a list of path prefixes into one anchored regular expression,
+or `None` when the list is empty.
+    """
+    if len(prefixes) < 1:
+        return None
+
+    return re.compile("|".join(re.escape(prefix) for prefix in prefixes))
+
+
+class URLNormalizer:
+    """
+Normalize the links discovered while crawling, where the same links
+(navigation, footers, etc.) recur on nearly every page: the results
+get memoized in bounded LRU caches, since they depend only on the link
+and the static crawl configuration.
+    """
+    def __init__ (  # pylint: disable=W0102
+        self,
+        site_base: str,
+        *,
+        path_rewrites: typing.Dict[ str, str ] = {},
+        ignored_paths: typing.Set[ str ] = set([]),
+        ignored_prefix: typing.List[ str ] = [],
+        cache_size: int = 65536,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.site_base: str = site_base
+        self.path_rewrites: typing.Dict[ str, str ] = path_rewrites
+        self.ignored_paths: typing.Set[ str ] = ignored_paths
+        self.ignored_match: typing.Optional[ re.Pattern ] = compile_prefixes(ignored_prefix)
+
+        # memoized per instance, since the results depend on the
+        # configuration above
+        self.normalize_internal: typing.Callable[ [ str ], typing.Optional[ InternalLink ] ] = \
+            functools.lru_cache(maxsize = cache_size)(self.resolve_internal)
+
+        self.normalize_external: typing.Callable[ [ str ], str ] = \
+            functools.lru_cache(maxsize = cache_size)(w3lib.url.canonicalize_url)
+
+
+    def is_ignored (
+        self,
+        path: str,
+        ) -> bool:
+        """
+Determine whether a canonical path gets ignored.
+        """
+        if self.ignored_match is not None and self.ignored_match.match(path) is not None:
+            return True
+
+        return path in self.ignored_paths
+
+
+    def resolve_internal (
+        self,
+        uri: str,
+        ) -> typing.Optional[ InternalLink ]:
+        """
+Normalize an internal link to its full URI and canonical path, or
+`None` when the path gets ignored. Use the memoized version of this,
+`normalize_internal()`.
+        """
+        if uri.startswith("/"):
+            uri = f"{self.site_base}{uri}"
+
+        parsed: urllib.parse.ParseResult = urllib.parse.urlparse(uri)
+        normalized_path: str = posixpath.normpath(parsed.path)
+
+        uri = parsed._replace(path = normalized_path).geturl()
+        uri = uri.split("#")[0]
+        uri = uri.split("?")[0]
+
+        # determine a canonical path
+        path: str = Page.get_path(
+            uri,
+            base = self.site_base,
+        )
+
+        if path in self.path_rewrites:
+            path = self.path_rewrites[path]
+
+        if self.is_ignored(path):
+            return None
+
+        return uri, path
@@ -7,7 +7,10 @@ see copyright/license https://github.com/DerwenAI/nyddu/README.md
 """
 
 from collections.abc import Iterator
+from concurrent.futures import Executor
 from urllib.parse import urlparse
+import asyncio
+import email.utils
 import enum
 import logging
 import ssl
@@ -15,16 +18,21 @@ import sys  # pylint: disable=W0611
 import time
 import traceback  # pylint: disable=W0611
 import typing
-import xml
 
 from bs4 import BeautifulSoup
-from defusedxml import ElementTree
 from icecream import ic  # type: ignore  # pylint: disable=W0611
 from pydantic import BaseModel
 import requests
 import requests_cache
 
+from .extract import Extract, extract_soup
+from .graph import LinkGraph
+from .metrics import CrawlMetrics
 from .scraper import FAUX_USER_AGENT
+from .sitemap import fetch_sitemap
+
+
+NO_KEYWORDS: typing.FrozenSet[ str ] = frozenset()
 
 
 class URLKind (enum.StrEnum):
@@ -63,26 +71,33 @@ Represent object as a string.
         return f"{self.kind}  {self.uri} : {self.expanded_uri}"
 
 
-class Page (BaseModel):  # pylint: disable=R0902
+class PageMethods:  # pylint: disable=R0902
     """
-A data class representing one HTML page.
+Behavior shared by the `Page` data class and the compact `PageRecord`
+used while crawling.
     """
-    uri: str
-    kind: URLKind
-    path: typing.Optional[ str ] = None
-    slug: typing.Optional[ str ] = None
-    content_type: typing.Optional[ str ] = None
-    status_code: typing.Optional[ int ] = None
-    redirect: typing.Optional[ str ] = None
-    error: typing.Optional[ str ] = None
-    timing: float = 0.0
-    title: typing.Optional[ str ] = None
-    summary: typing.Optional[ str ] = None
-    thumbnail: typing.Optional[ str ] = None
-    keywords: typing.Set[ str ] = set([])
-    outbound: typing.Set[ str ] = set([])
-    refs: typing.Set[ str ] = set([])
-    raw_refs: typing.Set[ str ] = set([])
+    if not typing.TYPE_CHECKING:
+        # no per-instance `__dict__` for `PageRecord`
+        __slots__ = ()
+
+    else:
+        # the attributes which get declared by each subclass
+        uri: str
+        kind: URLKind
+        path: typing.Optional[ str ]
+        content_type: typing.Optional[ str ]
+        status_code: typing.Optional[ int ]
+        redirect: typing.Optional[ str ]
+        error: typing.Optional[ str ]
+        timing: float
+        retry_after: typing.Optional[ float ]
+        validator: typing.Optional[ str ]
+        unchanged: bool
+        lastmod: typing.Optional[ float ]
+        title: typing.Optional[ str ]
+        summary: typing.Optional[ str ]
+        thumbnail: typing.Optional[ str ]
+        keywords: typing.AbstractSet[ str ]
 
 
     def __repr__ (
@@ -98,32 +113,6 @@ Represent object as a string.
                 return self.uri
 
 
-    def to_json (
-        self,
-        ) -> dict:
-        """
-Represent data for serialization.
-        """
-        return {
-            "uri": self.uri,
-            "kind": self.kind.value,
-            "path": self.path,
-            "slug": self.slug,
-            "type": self.content_type,
-            "status": self.status_code,
-            "redirect": self.redirect,
-            "error": self.error,
-            "timing": round(self.timing, 3),
-            "title": self.title,
-            "summary": self.summary,
-            "thumbnail": self.thumbnail,
-            "keywords": list(self.keywords),
-            "outbound": list(self.outbound),
-            "refs": list(self.refs),
-            "raw": list(self.raw_refs),
-        }
-
-
     @classmethod
     def get_site_links (
         cls,
@@ -131,14 +120,16 @@ Represent data for serialization.
         session: requests_cache.CachedSession,
         ) -> Iterator[ str ]:
         """
-Iterate through the links in a given `sitemap.xml` page.
+Iterate through the links in a given `sitemap.xml` page, following
+any sitemap index files. See `SitemapReader` for reading sitemaps
+concurrently.
         """
         try:
-            xml_doc: str = session.get(uri, timeout = 10).text
-            tree: xml.etree.ElementTree.Element = ElementTree.XML(xml_doc)  # type: ignore
-
-            for node in tree:
-                yield node[0].text  # type: ignore
+            for entry in fetch_sitemap(session, uri):
+                if entry.is_index:
+                    yield from cls.get_site_links(entry.loc, session)
+                else:
+                    yield entry.loc
         except Exception as ex:  # pylint: disable=W0718
             message: str = f"bad site links: {uri} : {ex}"
             logging.error(message)
@@ -166,6 +157,26 @@ Extract the path for an internal URL.
         return uri.replace(base, "").strip().split("#")[0]
 
 
+    def apply_meta (
+        self,
+        extract: Extract,
+        ) -> None:
+        """
+Apply the metadata extracted from an HTML document.
+        """
+        if extract.title is not None:
+            self.title = extract.title
+
+        if extract.summary is not None:
+            self.summary = extract.summary
+
+        if extract.thumbnail is not None:
+            self.thumbnail = extract.thumbnail
+
+        if extract.keywords is not None:
+            self.keywords = set(extract.keywords)
+
+
     def extract_meta (
         self,
         soup: BeautifulSoup,
@@ -173,26 +184,30 @@ Extract the path for an internal URL.
         """
 Extract metadata from an HTML document.
         """
-        if soup.title is not None:
-            self.title = soup.title.string  # type: ignore
+        self.apply_meta(extract_soup(soup))
 
-        for tag in soup.find_all("meta"):
-            if "content" in tag.attrs:  # type: ignore
-                if "property" in tag.attrs:  # type: ignore
-                    match tag.attrs["property"]:  # type: ignore
-                        case "og:image":
-                            self.thumbnail = tag.attrs["content"]  # type: ignore
 
-                elif "name" in tag.attrs:  # type: ignore
-                    match tag.attrs["name"]:  # type: ignore
-                        case "description":
-                            self.summary = tag.attrs["content"]  # type: ignore
+    @classmethod
+    def parse_retry_after (
+        cls,
+        value: typing.Optional[ str ],
+        ) -> typing.Optional[ float ]:
+        """
+Parse a `Retry-After` header, given either as seconds or as an HTTP
+date, into the number of seconds to wait.
+        """
+        if value is None:
+            return None
+
+        value = value.strip()
 
-                        case "keywords":
-                            key_list: typing.Optional[ str ] = tag.attrs["content"]  # type: ignore
+        if value.isdigit():
+            return float(value)
 
-                            if key_list is not None:
-                                self.keywords = { key.strip() for key in key_list.split(",") }
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
 
 
     @classmethod
@@ -216,48 +231,29 @@ Filter valid links.
         return None
 
 
-    def extract_links (
+    def get_links (
         self,
-        soup: BeautifulSoup,
+        links: typing.List[ str ],
         ) -> Iterator[ str ]:
         """
-Extract all the links from an HTML document.
+Iterate through the valid links among those extracted from an HTML
+document.
         """
-        for tag in soup.find_all("a"):
-            if "href" in tag.attrs:  # type: ignore
-                uri: typing.Optional[ str ] = self.validate_link(tag.attrs["href"], self.path)  # type: ignore  # pylint: disable=C0301
-
-                if uri is not None:
-                    yield uri
-
-        for tag in soup.find_all("img"):
-            if "src" in tag.attrs:  # type: ignore
-                uri = self.validate_link(tag.attrs["src"], self.path)  # type: ignore
-
-                if uri is not None:
-                    yield uri
+        for link in links:
+            uri: typing.Optional[ str ] = self.validate_link(link, self.path)  # type: ignore
 
-        for tag in soup.find_all("iframe"):
-            if "src" in tag.attrs:  # type: ignore
-                uri = self.validate_link(tag.attrs["src"], self.path)  # type: ignore
+            if uri is not None:
+                yield uri
 
-                if uri is not None:
-                    yield uri
 
-
-    def add_ref (
+    def extract_links (
         self,
-        ref: typing.Optional[ str ],
-        slug: typing.Optional[ str ] = None,
-        ) -> None:
+        soup: BeautifulSoup,
+        ) -> Iterator[ str ]:
         """
-Add a back-reference link.
+Extract all the links from an HTML document.
         """
-        if ref is not None:
-            if slug is not None:
-                self.refs.add(ref)
-            else:
-                self.raw_refs.add(ref)
+        yield from self.get_links(extract_soup(soup).links)
 
 
     async def request_content (
@@ -266,29 +262,71 @@ Add a back-reference link.
         *,
         allow_redirects: bool = False,
         user_agent: str = FAUX_USER_AGENT,
+        executor: typing.Optional[ Executor ] = None,
+        metrics: typing.Optional[ CrawlMetrics ] = None,
         ) -> typing.Optional[ str ]:
         """
 Request URI to get HTML, status_code, content_type
+
+The blocking `session.get()` call runs in `executor` (or the event
+loop's default executor) so that other coroutines keep running while
+this request is in flight.
+
+When `metrics` are given, the fetch gets observed there.
+
+The timing gets measured in the worker thread around the fetch itself,
+so that it excludes any wait for a free worker in `executor`.
         """
-        start_time: float = time.time()
         html: typing.Optional[ str ] = None
+        response: typing.Optional[ requests.Response ] = None
+        fetch_time: float = 0.0
+
+        # clear the outcome of any earlier attempt, e.g., when a
+        # throttled page gets retried
+        self.status_code = None
+        self.retry_after = None
+        self.error = None
+
+        def fetch (
+            ) -> requests.Response:
+            """
+Fetch the page, timing the request until its body has been read.
+            """
+            nonlocal fetch_time
+            start_time: float = time.perf_counter()
+
+            try:
+                return session.get(
+                    self.uri,
+                    verify = ssl.CERT_NONE,
+                    timeout = 10,
+                    allow_redirects = allow_redirects,
+                    headers = {
+                        "User-Agent": user_agent,
+                    },
+                )
+            finally:
+                fetch_time = time.perf_counter() - start_time
 
         try:
             assert self.uri is not None
 
-            response: requests.Response = session.get(
-                self.uri,
-                verify = ssl.CERT_NONE,
-                timeout = 10,
-                allow_redirects = allow_redirects,
-                headers = {
-                    "User-Agent": user_agent,
-                },
+            response = await asyncio.get_running_loop().run_in_executor(
+                executor,
+                fetch,
             )
 
             self.status_code = response.status_code
+            self.retry_after = self.parse_retry_after(response.headers.get("retry-after"))
             html = response.text
 
+            # the cache revalidates an expired response by sending its
+            # `ETag` and `Last-Modified` back as `If-None-Match` and
+            # `If-Modified-Since`, then a "304 Not Modified" gets served
+            # as the cached response, i.e., the content is unchanged
+            self.validator = response.headers.get("etag") or response.headers.get("last-modified")
+            self.unchanged = getattr(response, "from_cache", False)
+
             if response.headers is not None and response.headers.get("content-type") is not None:
                 content_type: typing.Optional[ str ] = response.headers.get("content-type")  # type: ignore  # pylint: disable=C0301
 
@@ -311,6 +349,204 @@ Request URI to get HTML, status_code, content_type
             logging.error(message)
             self.error = message
 
-        self.timing = time.time() - start_time
+        self.timing = fetch_time
+
+        if metrics is not None:
+            metrics.observe_fetch(urlparse(self.uri).netloc.lower(), response, self.timing)
 
         return html
+
+
+class Page (PageMethods, BaseModel):  # pylint: disable=R0902
+    """
+A data class representing one HTML page.
+    """
+    uri: str
+    kind: URLKind
+    path: typing.Optional[ str ] = None
+    slug: typing.Optional[ str ] = None
+    content_type: typing.Optional[ str ] = None
+    status_code: typing.Optional[ int ] = None
+    redirect: typing.Optional[ str ] = None
+    error: typing.Optional[ str ] = None
+    timing: float = 0.0
+    retry_after: typing.Optional[ float ] = None
+    validator: typing.Optional[ str ] = None
+    unchanged: bool = False
+    lastmod: typing.Optional[ float ] = None
+    title: typing.Optional[ str ] = None
+    summary: typing.Optional[ str ] = None
+    thumbnail: typing.Optional[ str ] = None
+    keywords: typing.Set[ str ] = set([])
+    outbound: typing.Set[ str ] = set([])
+    refs: typing.Set[ str ] = set([])
+    raw_refs: typing.Set[ str ] = set([])
+
+
+    def to_json (
+        self,
+        ) -> dict:
+        """
+Represent data for serialization.
+        """
+        return {
+            "uri": self.uri,
+            "kind": self.kind.value,
+            "path": self.path,
+            "slug": self.slug,
+            "type": self.content_type,
+            "status": self.status_code,
+            "redirect": self.redirect,
+            "error": self.error,
+            "timing": round(self.timing, 3),
+            "title": self.title,
+            "summary": self.summary,
+            "thumbnail": self.thumbnail,
+            "keywords": list(self.keywords),
+            "outbound": list(self.outbound),
+            "refs": list(self.refs),
+            "raw": list(self.raw_refs),
+        }
+
+
+    def add_ref (
+        self,
+        ref: typing.Optional[ str ],
+        slug: typing.Optional[ str ] = None,
+        ) -> bool:
+        """
+Add a back-reference link, returning whether it was new.
+        """
+        if ref is None:
+            return False
+
+        refs: typing.Set[ str ] = self.refs if slug is not None else self.raw_refs
+
+        if ref in refs:
+            return False
+
+        refs.add(ref)
+        return True
+
+
+class PageRecord (PageMethods):  # pylint: disable=R0902
+    """
+Compact representation of one page while crawling, which has no
+per-instance `__dict__` and keeps its links in a shared `LinkGraph`
+under its `node` id -- and converts to a `Page` for serialization.
+    """
+    __slots__ = (
+        "uri", "kind", "path", "slug", "node",
+        "content_type", "status_code", "redirect", "error", "timing",
+        "retry_after", "retries", "validator", "unchanged", "lastmod",
+        "title", "summary", "thumbnail", "keywords",
+    )
+
+    def __init__ (
+        self,
+        graph: LinkGraph,
+        *,
+        uri: str,
+        kind: URLKind,
+        path: typing.Optional[ str ] = None,
+        slug: typing.Optional[ str ] = None,
+        ) -> None:
+        """
+Constructor, which interns the key of the page in the link graph: its
+path for internal pages, otherwise its URI.
+        """
+        self.uri: str = uri
+        self.kind: URLKind = kind
+        self.path: typing.Optional[ str ] = path
+        self.slug: typing.Optional[ str ] = slug
+        self.node: int = graph.intern(path if path is not None else uri)
+
+        self.content_type: typing.Optional[ str ] = None
+        self.status_code: typing.Optional[ int ] = None
+        self.redirect: typing.Optional[ str ] = None
+        self.error: typing.Optional[ str ] = None
+        self.timing: float = 0.0
+        self.retry_after: typing.Optional[ float ] = None
+        self.retries: int = 0
+        self.validator: typing.Optional[ str ] = None
+        self.unchanged: bool = False
+        self.lastmod: typing.Optional[ float ] = None
+        self.title: typing.Optional[ str ] = None
+        self.summary: typing.Optional[ str ] = None
+        self.thumbnail: typing.Optional[ str ] = None
+        self.keywords: typing.AbstractSet[ str ] = NO_KEYWORDS
+
+
+    def to_page (
+        self,
+        graph: LinkGraph,
+        ) -> Page:
+        """
+Convert to a `Page`, resolving its links from the link graph.
+        """
+        return Page(
+            uri = self.uri,
+            kind = self.kind,
+            path = self.path,
+            slug = self.slug,
+            content_type = self.content_type,
+            status_code = self.status_code,
+            redirect = self.redirect,
+            error = self.error,
+            timing = self.timing,
+            retry_after = self.retry_after,
+            validator = self.validator,
+            unchanged = self.unchanged,
+            lastmod = self.lastmod,
+            title = self.title,
+            summary = self.summary,
+            thumbnail = self.thumbnail,
+            keywords = set(self.keywords),
+            outbound = set(graph.get_outbound(self.node)),
+            refs = set(graph.get_refs(self.node)),
+            raw_refs = set(graph.get_raw_refs(self.node)),
+        )
+
+
+    @classmethod
+    def from_page (
+        cls,
+        page: Page,
+        graph: LinkGraph,
+        ) -> "PageRecord":
+        """
+Convert from a `Page`, e.g., one loaded from a checkpoint, adding its
+links into the link graph.
+        """
+        record: PageRecord = cls(
+            graph,
+            uri = page.uri,
+            kind = page.kind,
+            path = page.path,
+            slug = page.slug,
+        )
+
+        record.content_type = page.content_type
+        record.status_code = page.status_code
+        record.redirect = page.redirect
+        record.error = page.error
+        record.timing = page.timing
+        record.retry_after = page.retry_after
+        record.validator = page.validator
+        record.unchanged = page.unchanged
+        record.lastmod = page.lastmod
+        record.title = page.title
+        record.summary = page.summary
+        record.thumbnail = page.thumbnail
+        record.keywords = page.keywords
+
+        for uri in page.outbound:
+            graph.add_outbound(record.node, uri)
+
+        for ref in page.refs:
+            graph.add_ref(record.node, ref, raw = False)
+
+        for ref in page.raw_refs:
+            graph.add_ref(record.node, ref)
+
+        return record
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming report I/O for Nyddu, as JSON Lines which may be compressed.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+from collections.abc import Iterator
+import gzip
+import json
+import pathlib
+import types
+import typing
+
+
+def open_report (
+    path: pathlib.Path,
+    mode: str = "r",
+    ) -> typing.IO[ str ]:
+    """
+Open a report file as text, with compression based on its suffix:
+`.gz` for gzip, `.zst` for zstd (which requires either Python 3.14+
+or the `zstandard` library), otherwise uncompressed.
+    """
+    match path.suffix:
+        case ".gz":
+            return gzip.open(path, f"{mode}t", encoding = "utf-8")  # type: ignore
+
+        case ".zst":
+            try:
+                from compression import zstd  # type: ignore  # pylint: disable=C0415,E0401
+            except ImportError:
+                import zstandard as zstd  # type: ignore  # pylint: disable=C0415,E0401
+
+            return zstd.open(path, f"{mode}t", encoding = "utf-8")  # type: ignore
+
+        case _:
+            return open(path, mode, encoding = "utf-8")  # pylint: disable=R1732
+
+
+class ReportWriter:
+    """
+Write report records incrementally, one JSON object per line.
+    """
+    def __init__ (
+        self,
+        path: pathlib.Path,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.path: pathlib.Path = path
+        self.count: int = 0
+        self.fp: typing.IO[ str ] = open_report(path, "w")
+
+
+    def __enter__ (
+        self,
+        ) -> "ReportWriter":
+        """
+Context manager entry.
+        """
+        return self
+
+
+    def __exit__ (
+        self,
+        exc_type: typing.Optional[ typing.Type[ BaseException ] ],
+        exc_value: typing.Optional[ BaseException ],
+        traceback: typing.Optional[ types.TracebackType ],
+        ) -> None:
+        """
+Context manager exit.
+        """
+        self.close()
+
+
+    def write (
+        self,
+        record: dict,
+        ) -> None:
+        """
+Write one record.
+        """
+        self.fp.write(json.dumps(record, sort_keys = True))
+        self.fp.write("\n")
+        self.count += 1
+
+
+    def close (
+        self,
+        ) -> None:
+        """
+Flush and close the report file.
+        """
+        self.fp.close()
+
+
+def iter_report (
+    path: pathlib.Path,
+    ) -> Iterator[ dict ]:
+    """
+Iterate through the records in a report file, one line at a time.
+A report in the earlier format, i.e., one JSON array, gets loaded
+whole for backwards compatibility.
+    """
+    with open_report(path, "r") as fp:
+        for line in fp:
+            line = line.strip()
+
+            if len(line) < 1:
+                continue
+
+            if line.startswith("["):
+                fp.seek(0)
+                yield from json.load(fp)
+                return
+
+            yield json.loads(line)
@@ -6,22 +6,139 @@ FastAPI router based on `classy_fastapi` for Nyddu endpoints to handle
 reporting and content search/discovery.
 """
 
-import json
+from collections.abc import Iterator
+import contextlib
+import hashlib
+import logging
 import pathlib
+import threading
+import time
+import typing
 
-from fastapi import Request  # pylint: disable=E0401
-from fastapi.responses import HTMLResponse  # pylint: disable=E0401,W0611
+from fastapi import HTTPException, Query, Request  # pylint: disable=E0401
+from fastapi.responses import HTMLResponse, Response  # pylint: disable=E0401,W0611
 from fastapi.templating import Jinja2Templates  # pylint: disable=E0401
+from starlette.datastructures import QueryParams  # pylint: disable=E0401
 
 from icecream import ic  # type: ignore  # pylint: disable=W0611
+from sentence_transformers import SentenceTransformer
 import classy_fastapi
 import kuzu
-import pandas as pd  # type: ignore  # pylint: disable=W0611
 
-from .db import db_connect
+from .cache import QueryCache
+from .db import VECTOR_INDEX, ConnectionPool, DatabaseUnavailable, PooledConnection, \
+    embed_texts, load_model, load_vector_extension, read_generation
+from .metrics import CONTENT_TYPE, Histogram, MetricsRegistry, crawl_metrics_path
 
 
-class NydduEndpoints (classy_fastapi.Routable):  # pylint: disable=R0903
+PAGE_COLUMNS: typing.Dict[ str, str ] = {
+    "uri": "p.uri",
+    "slug": "p.slug",
+    "redirect": "p.redirect",
+    "kind": "p.kind",
+    "type": "p.type",
+    "status": "p.status",
+    "error": "p.error",
+    "timing": "p.timing",
+    "title": "p.title",
+    "summary": "p.summary",
+}
+
+PAGE_FILTERS: typing.List[ str ] = [
+    "status",
+    "type",
+    "kind",
+]
+
+PAGE_SEARCH: typing.List[ str ] = [
+    "uri",
+    "title",
+    "summary",
+]
+
+
+PREPARED_QUERIES: typing.Dict[ str, str ] = {
+    "detail": """
+MATCH (p:Page {id: $id})
+RETURN
+    p.uri as uri,
+    p.slug as slug,
+    p.redirect as redirect,
+    p.type as type,
+    p.status as status,
+    p.title as title,
+    p.summary as summary,
+    p.error as error,
+    p.timing as timing
+    """,
+    "dst_links": """
+MATCH (src:Page)-[rel:Link]->(dst:Page {id: $id})
+RETURN
+    src.id as id,
+    src.uri as uri,
+    rel.sym as sym
+    """,
+    "src_links": """
+MATCH (src:Page {id: $id})-[rel:Link]->(dst:Page)
+RETURN
+    dst.id as id,
+    dst.uri as uri,
+    rel.sym as sym
+    """,
+    "total": """
+MATCH (p:Page)
+RETURN count(*) AS total
+    """,
+    "embedding": """
+MATCH (p:Page {id: $id})
+RETURN p.embedding AS embedding
+    """,
+}
+
+
+def query_int (
+    query: QueryParams,
+    name: str,
+    default: int,
+    ) -> int:
+    """
+Parse an integer query parameter, responding with a 400 when the
+client sent something other than an integer.
+    """
+    try:
+        return int(query.get(name, default))
+    except ValueError as ex:
+        raise HTTPException(
+            status_code = 400,
+            detail = f"query parameter {name} must be an integer",
+        ) from ex
+
+
+def result_rows (
+    result: kuzu.QueryResult,
+    *,
+    fill: typing.Any = None,
+    ) -> typing.List[ dict ]:
+    """
+Convert a query result into a list of rows as dictionaries, streaming
+each row straight from the result set. Any `fill` value other than
+`None` replaces the nulls, e.g., `""` for rendering in templates.
+    """
+    columns: typing.List[ str ] = result.get_column_names()
+    rows: typing.List[ dict ] = []
+
+    while result.has_next():
+        values: list = result.get_next()  # type: ignore
+
+        if fill is not None:
+            values = [ fill if val is None else val for val in values ]
+
+        rows.append(dict(zip(columns, values)))
+
+    return rows
+
+
+class NydduEndpoints (classy_fastapi.Routable):  # pylint: disable=R0902,R0903
     """
 Implements an endpoint class which serves Nyddu analysis.
     """
@@ -41,8 +158,236 @@ Constructor.
             directory = config["webapp"]["templates"],
         )
 
-        ## set up the KùzuDB connection
-        self.conn: kuzu.Connection = db_connect(db_path = pathlib.Path(config["db"]["db_path"]))
+        ## set up a pool of KùzuDB connections, each of which plans the
+        ## fixed queries once, for reuse across requests
+        self.db_path: pathlib.Path = pathlib.Path(config["db"]["db_path"])
+        self.vector_loaded: bool = False
+
+        self.pool: ConnectionPool = ConnectionPool(
+            self.db_path,
+            size = config["db"].get("pool_size"),
+            queries = PREPARED_QUERIES,
+            on_open = self.open_extensions,
+        )
+
+        ## cache query results until the next load into the database
+        self.cache: QueryCache = QueryCache(
+            max_size = config["webapp"].get("cache_size", 1024),
+            ttl = config["webapp"].get("cache_ttl", 300.0),
+        )
+
+        ## the embedding model only gets loaded on the first search
+        self.model: typing.Optional[ SentenceTransformer ] = None
+        self.model_lock: threading.Lock = threading.Lock()
+
+        ## metrics for the webapp, served at `/metrics` along with the
+        ## metrics dumped by the most recent crawl
+        self.metrics: MetricsRegistry = MetricsRegistry()
+        self.crawl_metrics_path: typing.Optional[ pathlib.Path ] = None
+
+        if "nyddu" in config:
+            self.crawl_metrics_path = crawl_metrics_path(config)
+
+        self.request_seconds: Histogram = self.metrics.histogram(
+            "nyddu_webapp_request_seconds",
+            "Latency of the webapp requests, by method, route, and status.",
+            ( "method", "route", "status", ),
+        )
+
+        self.init_metrics()
+
+
+    def open_extensions (
+        self,
+        conn: kuzu.Connection,
+        ) -> None:
+        """
+Load extensions into the database whenever the pool opens it, for all
+of its connections -- vector search is opt-in, since installing the
+extension requires network access.
+        """
+        if self.config["db"].get("vector_index", False):
+            try:
+                load_vector_extension(conn)
+                self.vector_loaded = True
+            except RuntimeError as ex:
+                logging.error("vector search unavailable: %s", ex)
+                self.vector_loaded = False
+
+
+    def require_vector_search (
+        self,
+        ) -> None:
+        """
+Respond with a 404 when vector search has not been enabled, or a 503
+when its extension failed to load, rather than failing the query.
+        """
+        if not self.config["db"].get("vector_index", False):
+            raise HTTPException(
+                status_code = 404,
+                detail = "vector search is disabled: set `vector_index = true` in the `[db]` config, then load",  # pylint: disable=C0301
+            )
+
+        if not self.vector_loaded:
+            raise HTTPException(
+                status_code = 503,
+                detail = "vector search is unavailable: the `vector` extension failed to load",
+            )
+
+
+    @contextlib.contextmanager
+    def connection (
+        self,
+        ) -> Iterator[ PooledConnection ]:
+        """
+Check out a pooled connection, responding with a 503 while the
+database is closed for a load.
+        """
+        try:
+            with self.pool.connection() as pooled:
+                yield pooled
+        except DatabaseUnavailable as ex:
+            raise HTTPException(
+                status_code = 503,
+                detail = str(ex),
+                headers = { "Retry-After": "5" },
+            ) from ex
+
+
+    def init_metrics (
+        self,
+        ) -> None:
+        """
+Add counters and gauges for the query cache and the connection pool,
+which get read whenever the metrics get rendered.
+        """
+        counters: typing.List[ typing.Tuple[ str, str, typing.Callable[ [], int ] ] ] = [
+            ( "cache_hits_total", "Query cache hits.", lambda: self.cache.hits, ),
+            ( "cache_misses_total", "Query cache misses.", lambda: self.cache.misses, ),
+        ]
+
+        for name, help_text, function in counters:
+            self.metrics.counter(f"nyddu_webapp_{name}", help_text).set_function(function)
+
+        gauges: typing.List[ typing.Tuple[ str, str, typing.Callable[ [], int ] ] ] = [
+            ( "cache_entries", "Entries in the query cache.", lambda: len(self.cache.entries), ),
+            ( "pool_size", "Connections in the database pool.", lambda: self.pool.size, ),
+            ( "pool_idle", "Idle connections in the database pool.", self.pool.idle.qsize, ),
+        ]
+
+        for name, help_text, function in gauges:
+            self.metrics.gauge(f"nyddu_webapp_{name}", help_text).set_function(function)
+
+
+    async def record_request (
+        self,
+        request: Request,
+        call_next: typing.Callable[ [ Request ], typing.Awaitable[ Response ] ],
+        ) -> Response:
+        """
+HTTP middleware which observes the latency of each request, labeled by
+its route template rather than its path, to keep the labels bounded.
+Register this on the app with `app.middleware("http")`.
+        """
+        start_time: float = time.perf_counter()
+        status: int = 500
+
+        try:
+            response: Response = await call_next(request)
+            status = response.status_code
+            return response
+
+        finally:
+            route: typing.Any = request.scope.get("route")
+
+            self.request_seconds.observe(
+                time.perf_counter() - start_time,
+                method = request.method,
+                route = getattr(route, "path", "unmatched"),
+                status = status,
+            )
+
+
+    def get_model (
+        self,
+        ) -> SentenceTransformer:
+        """
+Accessor for the embedding model, which gets loaded and warmed up on
+first use, so that the webapp starts quickly when search is unused.
+        """
+        with self.model_lock:
+            if self.model is None:
+                model: SentenceTransformer = load_model(
+                    embed_model = self.config["db"].get("embed_model", "all-MiniLM-L6-v2"),
+                    num_threads = self.config["db"].get("embed_threads"),
+                )
+
+                embed_texts(model, [ "warm up" ])
+                self.model = model
+
+            return self.model
+
+
+    def cached (
+        self,
+        key: typing.Hashable,
+        compute: typing.Callable[ [], typing.Any ],
+        ) -> typing.Any:
+        """
+Lookup a result in the cache, otherwise compute and cache it. The
+cache gets cleared whenever the loader has marked a new generation.
+        """
+        self.cache.sync(read_generation(self.db_path))
+        value: typing.Any = self.cache.get(key)
+
+        if value is None:
+            value = compute()
+            self.cache.put(key, value)
+
+        return value
+
+
+    def cached_html (
+        self,
+        request: Request,
+        key: typing.Hashable,
+        render: typing.Callable[ [], HTMLResponse ],
+        ) -> Response:
+        """
+Serve a rendered HTML page from the cache, with an `ETag` derived
+from the load generation, so that browsers revalidating their copy
+get a `304 Not Modified` without any DB work.
+        """
+        self.cache.sync(read_generation(self.db_path))
+
+        if self.cache.generation is None:
+            return render()
+
+        etag: str = '"' + hashlib.blake2b(
+            f"{self.cache.generation}:{key}".encode("utf-8"),
+            digest_size = 16,
+        ).hexdigest() + '"'
+
+        headers: typing.Dict[ str, str ] = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+        }
+
+        if_none_match: typing.Set[ str ] = set(
+            tag.strip().removeprefix("W/")
+            for tag in request.headers.get("if-none-match", "").split(",")
+        )
+
+        if etag in if_none_match or "*" in if_none_match:
+            return Response(
+                status_code = 304,
+                headers = headers,
+            )
+
+        return HTMLResponse(
+            content = self.cached(key, lambda: render().body),
+            headers = headers,
+        )
 
 
     @classy_fastapi.get(
@@ -51,44 +396,146 @@ Constructor.
     def pages_index (
         self,
         request: Request,
-        ) -> HTMLResponse:
+        ) -> Response:
+        """
+Serve an HTML page to search the crawled pages via DataTables, which
+fetches its rows from `/pages/data` one page at a time.
+        """
+        def render (
+            ) -> HTMLResponse:
+            """
+Query the filter options and render the page.
+            """
+            filters: typing.Dict[ str, list ] = {}
+
+            with self.connection() as (conn, _):
+                for name in PAGE_FILTERS:
+                    values_query: str = f"""
+    MATCH (p:Page)
+    WHERE {PAGE_COLUMNS[name]} IS NOT NULL
+    RETURN DISTINCT {PAGE_COLUMNS[name]} AS value
+    ORDER BY value
+                    """
+
+                    filters[name] = [
+                        row["value"]
+                        for row in result_rows(conn.execute(values_query))  # type: ignore
+                    ]
+
+            return self.templates.TemplateResponse(
+                "pages.html",
+                {
+                    "request": request,
+                    "filters": filters,
+                },
+            )
+
+        return self.cached_html(request, ( "pages", ), render)
+
+
+    @classy_fastapi.get(
+        "/pages/data",
+    )
+    def pages_data (  # pylint: disable=R0914
+        self,
+        request: Request,
+        ) -> dict:
         """
-Serve an HTML page to search the crawled pages via DataTables.
+Serve one page of rows for DataTables in its server-side processing
+mode, pushing the filters, sort order, offset, and limit down into
+Cypher. Sort columns and filters are limited to the page columns.
         """
-        pages_query: str = """
+        query: QueryParams = request.query_params
+        max_length: int = self.config["webapp"].get("max_page_length", 1000)
+
+        draw: int = query_int(query, "draw", 0)
+        start: int = max(0, query_int(query, "start", 0))
+        length: int = query_int(query, "length", 10)
+
+        if length < 0 or length > max_length:
+            length = max_length
+
+        where: typing.List[ str ] = []
+        params: dict = {}
+
+        for name in PAGE_FILTERS:
+            value: str = query.get(name, "")
+
+            if len(value) > 0:
+                where.append(f"{PAGE_COLUMNS[name]} = ${name}")
+                params[name] = value
+
+        text: str = query.get("search[value]", "").strip().lower()
+
+        if len(text) > 0:
+            where.append("(" + " OR ".join([
+                f"lower(coalesce({PAGE_COLUMNS[name]}, '')) CONTAINS $text"
+                for name in PAGE_SEARCH
+            ]) + ")")
+            params["text"] = text
+
+        where_clause: str = ""
+
+        if len(where) > 0:
+            where_clause = "WHERE " + " AND ".join(where)
+
+        sort_column: str = query.get(f"columns[{query_int(query, 'order[0][column]', 0)}][data]", "uri")  # pylint: disable=C0301
+        sort_dir: str = "DESC" if query.get("order[0][dir]") == "desc" else "ASC"
+
+        if sort_column not in PAGE_COLUMNS:
+            sort_column = "uri"
+
+        pages_query: str = f"""
     MATCH (p:Page)
+    {where_clause}
     RETURN
         p.id as id,
-        p.uri as uri,
-        p.slug as slug,
-        p.redirect as redirect,
-        p.type as type,
-        p.status as status,
-        p.title as title,
-        p.summary as summary,
-        p.error as error,
-        p.timing as timing
-        """
-
-        pages_df: pd.DataFrame = self.conn.execute(  # type: ignore
-            pages_query,
-        ).get_as_df()
-
-        response: HTMLResponse = self.templates.TemplateResponse(
-            "pages.html",
-            {
-                "request": request,
-                "pages": json.loads(
-                    pages_df.fillna("").to_json(
-                        orient = "records",
-                        #lines = True,
-                        #indent = 2,
-                    ),
-                ),
-            },
+        {", ".join([ f"{expr} as {name}" for name, expr in PAGE_COLUMNS.items() ])}
+    ORDER BY {PAGE_COLUMNS[sort_column]} {sort_dir}
+    SKIP $skip
+    LIMIT $limit
+        """
+
+        filtered_query: str = f"""
+    MATCH (p:Page)
+    {where_clause}
+    RETURN count(*) AS total
+        """
+
+        def compute (
+            ) -> dict:
+            """
+Count the pages, then query one page of rows.
+            """
+            with self.connection() as (conn, prepared):
+                total: int = result_rows(conn.execute(prepared["total"]))[0]["total"]  # type: ignore
+                filtered: int = total
+
+                if len(where) > 0:
+                    filtered = result_rows(conn.execute(filtered_query, params))[0]["total"]  # type: ignore
+
+                return {
+                    "recordsTotal": total,
+                    "recordsFiltered": filtered,
+                    "data": result_rows(conn.execute(  # type: ignore
+                        pages_query,
+                        { **params, "skip": start, "limit": length },
+                    )),
+                }
+
+        key: tuple = (
+            "pages_data",
+            tuple(sorted(params.items())),
+            sort_column,
+            sort_dir,
+            start,
+            length,
         )
 
-        return response
+        return {
+            "draw": draw,
+            **self.cached(key, compute),
+        }
 
 
     @classy_fastapi.get(
@@ -98,75 +545,171 @@ Serve an HTML page to search the crawled pages via DataTables.
         self,
         request: Request,
         page_id: str,
-        ) -> HTMLResponse:
+        ) -> Response:
         """
 Show details for a given crawled URL.
         """
-        detail_query: str = """
-    MATCH (p:Page {id: $id})
-    RETURN
-        p.uri as uri,
-        p.slug as slug,
-        p.redirect as redirect,
-        p.type as type,
-        p.status as status,
-        p.title as title,
-        p.summary as summary,
-        p.error as error,
-        p.timing as timing
-        """
-
-        detail_df: pd.DataFrame = self.conn.execute(  # type: ignore
-            detail_query,
-            { "id": int(page_id) },
-        ).get_as_df()
-
-        dst_links_query: str = """
-    MATCH (src:Page)-[rel:Link]->(dst:Page {id: $id})
+        def render (
+            ) -> HTMLResponse:
+            """
+Query the page and its links, then render the page.
+            """
+            context: dict = {
+                "request": request,
+            }
+
+            ## run the prepared pipeline: the page, then its inbound and outbound links
+            with self.connection() as (conn, prepared):
+                for name in [ "detail", "dst_links", "src_links" ]:
+                    context[name] = result_rows(conn.execute(  # type: ignore
+                        prepared[name],
+                        { "id": int(page_id) },
+                    ), fill = "")
+
+            return self.templates.TemplateResponse(
+                "detail.html",
+                context,
+            )
+
+        return self.cached_html(request, ( "detail", int(page_id), ), render)
+
+
+    @classy_fastapi.get(
+        "/search",
+    )
+    def search (
+        self,
+        q: str,
+        k: int = Query(10, ge = 1, le = 100),
+        ) -> dict:
+        """
+Semantic search: find the top-k pages nearest to the embedded query
+text, using the vector index.
+        """
+        self.require_vector_search()
+
+        search_query: str = f"""
+    CALL QUERY_VECTOR_INDEX('Page', '{VECTOR_INDEX}', $vector, $k)
     RETURN
-        src.id as id,
-        src.uri as uri,
-        rel.sym as sym
+        node.id AS id,
+        node.uri AS uri,
+        node.title AS title,
+        node.summary AS summary,
+        1.0 - distance AS similarity
+    ORDER BY similarity DESC
         """
 
-        dst_links_df: pd.DataFrame = self.conn.execute(  # type: ignore
-            dst_links_query,
-            { "id": int(page_id) },
-        ).get_as_df()
+        def compute (
+            ) -> typing.List[ dict ]:
+            """
+Embed the query text, then query the vector index.
+            """
+            vector: typing.List[ float ] = embed_texts(self.get_model(), [ q ])[0]
+
+            with self.connection() as (conn, _):
+                return result_rows(conn.execute(  # type: ignore
+                    search_query,
+                    { "vector": vector, "k": k },
+                ))
+
+        return {
+            "query": q,
+            "results": self.cached(( "search", q, k, ), compute),
+        }
 
-        src_links_query: str = """
-    MATCH (src:Page {id: $id})-[rel:Link]->(dst:Page)
+
+    @classy_fastapi.get(
+        "/related/{page_id}",
+    )
+    def related (
+        self,
+        page_id: str,
+        k: int = Query(10, ge = 1, le = 100),
+        link_weight: float = 0.2,
+        ) -> dict:
+        """
+Recommend pages related to a given page, combining vector similarity
+with proximity in the `Link` graph: candidates are the nearest pages
+in the vector index plus the pages directly linked in either
+direction, and linked pages get a boost of `link_weight`.
+        """
+        self.require_vector_search()
+
+        similar_query: str = f"""
+    CALL QUERY_VECTOR_INDEX('Page', '{VECTOR_INDEX}', $vector, $k)
+    WITH node AS q, distance
+    WHERE q.id <> $id
     RETURN
-        dst.id as id,
-        dst.uri as uri,
-        rel.sym as sym
+        q.id AS id,
+        q.uri AS uri,
+        q.title AS title,
+        1.0 - distance AS similarity
         """
 
-        src_links_df: pd.DataFrame = self.conn.execute(  # type: ignore
-            src_links_query,
-            { "id": int(page_id) },
-        ).get_as_df()
+        linked_query: str = """
+    MATCH (p:Page {id: $id})-[:Link]-(q:Page)
+    WHERE q.id <> $id AND p.embedding IS NOT NULL AND q.embedding IS NOT NULL
+    RETURN DISTINCT
+        q.id AS id,
+        q.uri AS uri,
+        q.title AS title,
+        array_cosine_similarity(p.embedding, q.embedding) AS similarity
+    LIMIT $limit
+        """
 
-        response: HTMLResponse = self.templates.TemplateResponse(
-            "detail.html",
-            {
-                "request": request,
-                "detail": json.loads(
-                    detail_df.fillna("").to_json(
-                        orient = "records",
-                    ),
-                ),
-                "dst_links": json.loads(
-                    dst_links_df.fillna("").to_json(
-                        orient = "records",
-                    ),
-                ),
-                "src_links": json.loads(
-                    src_links_df.fillna("").to_json(
-                        orient = "records",
-                    ),
-                ),
-            },
-        )
+        candidates: typing.Dict[ int, dict ] = {}
+
+        with self.connection() as (conn, prepared):
+            for row in result_rows(conn.execute(  # type: ignore
+                prepared["embedding"],
+                { "id": int(page_id) },
+            )):
+                if row["embedding"] is None:
+                    continue
+
+                for similar_row in result_rows(conn.execute(  # type: ignore
+                    similar_query,
+                    { "id": int(page_id), "vector": row["embedding"], "k": k * 4 },
+                )):
+                    similar_row["linked"] = False
+                    candidates[similar_row["id"]] = similar_row
+
+            for row in result_rows(conn.execute(  # type: ignore
+                linked_query,
+                { "id": int(page_id), "limit": k * 100 },
+            )):
+                row["linked"] = True
+                candidates[row["id"]] = row
+
+        for row in candidates.values():
+            row["score"] = row["similarity"] + (link_weight if row["linked"] else 0.0)
 
-        return response
+        return {
+            "id": int(page_id),
+            "results": sorted(
+                candidates.values(),
+                key = lambda row: row["score"],
+                reverse = True,
+            )[:k],
+        }
+
+
+    @classy_fastapi.get(
+        "/metrics",
+    )
+    def metrics_text (
+        self,
+        ) -> Response:
+        """
+Serve the metrics in the Prometheus text exposition format: those of
+the webapp, followed by those dumped by the most recent crawl.
+        """
+        content: str = self.metrics.render()
+
+        if self.crawl_metrics_path is not None and self.crawl_metrics_path.exists():
+            content += self.crawl_metrics_path.read_text(encoding = "utf-8")
+
+        return Response(
+            content = content,
+            media_type = CONTENT_TYPE,
+        )
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Per-host politeness scheduler for Nyddu.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+from collections import deque
+from http import HTTPStatus
+from urllib.parse import urlparse
+import asyncio
+import heapq
+import logging
+import time
+import typing
+
+from .page import PageRecord
+
+
+THROTTLE_STATUS: typing.Set[ int ] = set([
+    HTTPStatus.TOO_MANY_REQUESTS, # 429
+    HTTPStatus.SERVICE_UNAVAILABLE, # 503
+    999, # LinkedIn, again
+])
+
+
+def get_host (
+    uri: str,
+    ) -> str:
+    """
+Extract the host name used to key the per-host scheduling state.
+    """
+    return urlparse(uri).netloc.lower()
+
+
+class HostState:  # pylint: disable=R0902
+    """
+Scheduling state for one host: a token bucket, a cap on requests in
+flight, and a backlog of pages waiting to be fetched.
+    """
+    def __init__ (
+        self,
+        host: str,
+        *,
+        rate: float,
+        burst: float,
+        max_in_flight: int,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.host: str = host
+        self.rate: float = rate
+        self.burst: float = max(1.0, burst)
+        self.max_in_flight: int = max(1, max_in_flight)
+
+        self.tokens: float = self.burst
+        self.updated: float = time.monotonic()
+        self.in_flight: int = 0
+        self.crawl_delay: float = 0.0
+        self.not_before: float = 0.0
+        self.backlog: typing.Deque[ PageRecord ] = deque()
+        self.scheduled: bool = False
+
+
+    def wait_time (
+        self,
+        now: float,
+        ) -> typing.Optional[ float ]:
+        """
+Seconds until this host may start another request, or `None` when it
+must wait for one of its requests in flight to be released.
+        """
+        if self.in_flight >= self.max_in_flight:
+            return None
+
+        wait: float = max(0.0, self.not_before - now)
+
+        if self.rate > 0.0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens < 1.0:
+                wait = max(wait, (1.0 - self.tokens) / self.rate)
+
+        return wait
+
+
+    def acquire (
+        self,
+        now: float,
+        ) -> PageRecord:
+        """
+Start a request for the next page in the backlog.
+        """
+        self.tokens -= 1.0
+        self.in_flight += 1
+        self.not_before = max(self.not_before, now + self.crawl_delay)
+
+        return self.backlog.popleft()
+
+
+class HostScheduler:  # pylint: disable=R0902
+    """
+Schedules pages for fetching so that each host gets rate limited via a
+token bucket, capped on concurrent requests, and paused whenever it
+asks via `Retry-After` or `Crawl-delay` -- while hosts get interleaved
+round-robin, so that one slow host does not starve the others.
+
+Each host with pages in its backlog is either in the `ready` rotation,
+in the `waiting` heap keyed by when it may start another request, or
+at its cap on requests in flight until one gets released -- so taking
+a page does not need to scan through every host.
+    """
+    def __init__ (  # pylint: disable=R0913,W0102
+        self,
+        *,
+        rate: float = 2.0,
+        burst: float = 5.0,
+        max_in_flight: int = 2,
+        backoff: float = 10.0,
+        max_retries: int = 3,
+        host_limits: typing.Dict[ str, dict ] = {},
+        ) -> None:
+        """
+Constructor, where a page which gets throttled is retried up to
+`max_retries` times.
+        """
+        self.rate: float = rate
+        self.burst: float = burst
+        self.max_in_flight: int = max_in_flight
+        self.backoff: float = backoff
+        self.max_retries: int = max_retries
+        self.host_limits: typing.Dict[ str, dict ] = host_limits
+
+        self.hosts: typing.Dict[ str, HostState ] = {}
+        self.ready: typing.Deque[ HostState ] = deque()
+        self.waiting: typing.List[ typing.Tuple[ float, str ] ] = []
+        self.wakeup: asyncio.Event = asyncio.Event()
+        self.closed: bool = False
+
+        # kept up to date incrementally, since the crawler checks these
+        # on every enqueue
+        self.pending_count: int = 0
+        self.in_flight_count: int = 0
+
+
+    def get_state (
+        self,
+        host: str,
+        ) -> HostState:
+        """
+Accessor for the scheduling state of a host, applying any per-host
+limits from the configuration.
+        """
+        if host not in self.hosts:
+            limits: dict = self.host_limits.get(host, {})
+
+            self.hosts[host] = HostState(
+                host,
+                rate = limits.get("rate", self.rate),
+                burst = limits.get("burst", self.burst),
+                max_in_flight = limits.get("max_in_flight", self.max_in_flight),
+            )
+
+        return self.hosts[host]
+
+
+    def pending (
+        self,
+        ) -> int:
+        """
+Count the pages waiting to be fetched.
+        """
+        return self.pending_count
+
+
+    def in_flight (
+        self,
+        ) -> int:
+        """
+Count the requests in flight, across all hosts.
+        """
+        return self.in_flight_count
+
+
+    def put (
+        self,
+        page: PageRecord,
+        ) -> None:
+        """
+Add a page to the backlog for its host.
+        """
+        host: str = get_host(page.uri)
+        state: HostState = self.get_state(host)
+        state.backlog.append(page)
+        self.pending_count += 1
+
+        self.schedule(state)
+        self.wakeup.set()
+
+
+    def schedule (
+        self,
+        state: HostState,
+        ) -> None:
+        """
+Add a host to the `ready` rotation, unless it's already scheduled.
+        """
+        if not state.scheduled and len(state.backlog) > 0:
+            state.scheduled = True
+            self.ready.append(state)
+
+
+    def take (
+        self,
+        ) -> typing.Tuple[ typing.Optional[ PageRecord ], typing.Optional[ float ] ]:
+        """
+Take the next page from the first ready host in round-robin order,
+otherwise return how long to wait before some host becomes ready.
+        """
+        now: float = time.monotonic()
+
+        while len(self.waiting) > 0 and self.waiting[0][0] <= now:
+            _, host = heapq.heappop(self.waiting)
+            self.ready.append(self.hosts[host])
+
+        while len(self.ready) > 0:
+            state: HostState = self.ready.popleft()
+            wait: typing.Optional[ float ] = state.wait_time(now)
+
+            if wait is None:
+                # at its cap, until `release()` schedules it again
+                state.scheduled = False
+            elif wait > 0.0:
+                heapq.heappush(self.waiting, ( now + wait, state.host, ))
+            else:
+                page: PageRecord = state.acquire(now)
+                self.pending_count -= 1
+                self.in_flight_count += 1
+
+                if len(state.backlog) > 0:
+                    self.ready.append(state)
+                else:
+                    state.scheduled = False
+
+                return page, None
+
+        if len(self.waiting) > 0:
+            return None, max(0.0, self.waiting[0][0] - now)
+
+        return None, None
+
+
+    async def get (
+        self,
+        ) -> typing.Optional[ PageRecord ]:
+        """
+Wait for the next page which may be fetched, or return `None` once
+the scheduler has been closed.
+        """
+        while not self.closed:
+            page, wait = self.take()
+
+            if page is not None:
+                return page
+
+            self.wakeup.clear()
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout = wait)
+            except TimeoutError:
+                pass
+
+        return None
+
+
+    def close (
+        self,
+        ) -> None:
+        """
+Close the scheduler, so that any workers waiting for pages stop.
+        """
+        self.closed = True
+        self.wakeup.set()
+
+
+    def set_crawl_delay (
+        self,
+        host: str,
+        delay: float,
+        ) -> None:
+        """
+Enforce a minimum delay between requests to a host, e.g., from the
+`Crawl-delay` in its `robots.txt` file. This applies to the next
+request too, since fetching `robots.txt` was a request to the host.
+        """
+        state: HostState = self.get_state(host)
+        state.crawl_delay = delay
+        state.not_before = max(state.not_before, time.monotonic() + delay)
+
+
+    def will_retry (
+        self,
+        page: PageRecord,
+        *,
+        retry: bool = True,
+        ) -> bool:
+        """
+Check whether a page which has been fetched will get requeued by
+`release()`, i.e., it got throttled and has retries left.
+        """
+        return (
+            retry
+            and page.status_code in THROTTLE_STATUS
+            and page.retries < self.max_retries
+        )
+
+
+    def release (
+        self,
+        page: PageRecord,
+        *,
+        retry: bool = True,
+        ) -> bool:
+        """
+Mark a request as finished, pausing its host when the response asked
+the crawler to slow down. A page which got throttled goes back into
+the backlog of its host, unless `retry` is false or it has run out of
+retries.
+
+Returns whether the page has been requeued, i.e., it is not finished.
+        """
+        state: HostState = self.get_state(get_host(page.uri))
+
+        if state.in_flight > 0:
+            state.in_flight -= 1
+            self.in_flight_count -= 1
+            self.schedule(state)
+
+        pause: typing.Optional[ float ] = page.retry_after
+
+        if pause is None and page.status_code in THROTTLE_STATUS:
+            pause = self.backoff
+
+        if pause is not None and pause > 0.0:
+            logging.debug("pause %s for %.1f sec", state.host, pause)
+            state.not_before = max(state.not_before, time.monotonic() + pause)
+
+        requeue: bool = self.will_retry(page, retry = retry)
+
+        if requeue:
+            logging.debug("retry %s after %d attempts", page.uri, page.retries + 1)
+            page.retries += 1
+            state.backlog.append(page)
+            self.pending_count += 1
+            self.schedule(state)
+
+        self.wakeup.set()
+        return requeue
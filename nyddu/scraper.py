@@ -6,8 +6,9 @@ Adapted from an HTML scraper based on Selenium by Clair Sullivan:
 <https://github.com/cj2001/senzing_website_scraper/>
 """
 
+import asyncio
 import logging
-import time
+import types
 import typing
 import urllib.parse
 
@@ -59,6 +60,45 @@ EXCLUDED_EXTENSIONS: typing.Set[ str ] = set([
     ".zip",
 ])
 
+BLOCKED_RESOURCES: typing.List[ str ] = [
+    # images
+    "*.avif",
+    "*.bmp",
+    "*.gif",
+    "*.ico",
+    "*.jpeg",
+    "*.jpg",
+    "*.png",
+    "*.svg",
+    "*.webp",
+    # fonts
+    "*.eot",
+    "*.otf",
+    "*.ttf",
+    "*.woff",
+    "*.woff2",
+    # media
+    "*.m4a",
+    "*.mp3",
+    "*.mp4",
+    "*.ogg",
+    "*.wav",
+    "*.webm",
+    # third-party scripts: analytics, ads, trackers, widgets
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*google-analytics.com*",
+    "*googlesyndication.com*",
+    "*googletagmanager.com*",
+    "*hotjar.com*",
+    "*platform.twitter.com*",
+    "*youtube.com/embed*",
+]
+
+HEAD_SCRIPT: str = "return document.head ? document.head.outerHTML : null;"
+
+READY_SCRIPT: str = "return document.readyState;"
+
 RESTART_KEYWORDS: typing.Set[ str ] = set([
     "chrome not reachable",
     "connection",
@@ -78,12 +118,23 @@ of the `requests` library.
         *,
         delay: int = 3,
         user_agent: str = FAUX_USER_AGENT,
+        metadata_only: bool = False,
         ) -> None:
         """
 Constructor.
+
+In the `metadata_only` mode, the browser does not download images,
+fonts, media, or known third-party scripts, and scraping returns only
+the `<head>` of a page as soon as its DOM is ready.
         """
         self.driver: typing.Optional[ webdriver.Chrome ] = None
         self.delay: int = delay
+        self.metadata_only: bool = metadata_only
+
+        # number of pages scraped by the current driver, and whether
+        # the driver needs to be restarted before its next page
+        self.pages: int = 0
+        self.needs_restart: bool = False
 
         # setup driver options
         self.chrome_options: Options = Options()
@@ -104,6 +155,12 @@ Constructor.
         self.chrome_options.add_argument("--disable-extensions")
         self.chrome_options.add_argument("--disable-plugins")
 
+        if self.metadata_only:
+            # return from navigation once the DOM is ready, not after
+            # all of the subresources have loaded
+            self.chrome_options.page_load_strategy = "eager"
+            self.chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+
 
     def init_driver (
         self
@@ -123,10 +180,26 @@ Test the installed driver before scraping.
             self.driver.execute_script(
                 "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
             )
+
+            # block requests for heavy resources via the DevTools protocol
+            if self.metadata_only:
+                self.driver.execute_cdp_cmd("Network.enable", {})
+                self.driver.execute_cdp_cmd("Network.setBlockedURLs", { "urls": BLOCKED_RESOURCES })
         except Exception as ex:  # pylint: disable=W0718
             logging.error("failed to initialize Chrome driver: %s", str(ex))
+
+            # don't leave a half-initialized Chrome running
+            try:
+                self.close_driver()
+            except Exception as close_ex:  # pylint: disable=W0718
+                logging.error("failed to close Chrome driver: %s", str(close_ex))
+                self.driver = None
+
             return False
 
+        self.pages = 0
+        self.needs_restart = False
+
         return True
 
 
@@ -141,6 +214,37 @@ Close the Chrome driver.
             self.driver = None
 
 
+    async def restart_driver (
+        self
+        ) -> bool:
+        """
+Replace the Chrome driver with a fresh one, without blocking the
+event loop.
+        """
+        logging.debug("🔧 restarting driver after %d pages", self.pages)
+
+        try:
+            await asyncio.to_thread(self.close_driver)
+        except Exception as ex:  # pylint: disable=W0718
+            logging.error("failed to close Chrome driver: %s", str(ex))
+            self.driver = None
+
+        if not await asyncio.to_thread(self.init_driver):
+            self.needs_restart = True
+            return False
+
+        return True
+
+
+    def get_page_source (
+        self
+        ) -> typing.Optional[ str ]:
+        """
+Accessor for the page source from the driver.
+        """
+        return self.driver.page_source  # type: ignore
+
+
     def valid_for_extraction (
         self,
         url: str,
@@ -164,6 +268,77 @@ Check if URL is valid for extraction:
             return False
 
 
+    def wait_dom_ready (
+        self,
+        timeout: float,
+        ) -> None:
+        """
+Wait until the DOM of the current page has been parsed, i.e., its
+`document.readyState` is either `interactive` or `complete`.
+        """
+        def dom_ready (
+            driver: typing.Any,
+            ) -> bool:
+            """
+Predicate for whether the DOM is ready.
+            """
+            return driver.execute_script(READY_SCRIPT) in [ "interactive", "complete" ]
+
+        WebDriverWait(self.driver, timeout, poll_frequency = 0.1).until(dom_ready)  # type: ignore
+
+
+    async def scrape_metadata (
+        self,
+        url: str,
+        *,
+        max_retries: int = 3,
+        timeout: float = 10.0,
+        ) -> typing.Optional[ str ]:
+        """
+Scrape only the `<head>` of a page, returning it as soon as the DOM is
+ready, without the fixed waits, scrolling, or full page source.
+        """
+        for attempt in range(max_retries):
+            try:
+                logging.debug("scraping metadata: %s (attempt %d/%d)", url, attempt + 1, max_retries)  # pylint: disable=C0301
+
+                await asyncio.to_thread(self.driver.get, url)  # type: ignore
+                await asyncio.to_thread(self.wait_dom_ready, timeout)
+
+                head: typing.Optional[ str ] = await asyncio.to_thread(
+                    self.driver.execute_script,  # type: ignore
+                    HEAD_SCRIPT,
+                )
+
+                if head is None:
+                    logging.error("❌ no head element in %s", url)
+                    return None
+
+                logging.debug("✅ successfully scraped metadata %s", url)
+                self.pages += 1
+
+                return f"<html>{head}</html>"
+
+            except TimeoutException as ex:
+                logging.error("⏰ timeout on %s (attempt %d): %s", url, attempt + 1, str(ex)[:100])
+
+            except WebDriverException as ex:
+                error_msg: str = str(ex)
+                logging.error("🚫 WebDriver error on %s (attempt %d): %s", url, attempt + 1, error_msg[:100])  # pylint: disable=C0301
+
+                if any(keyword in error_msg.lower() for keyword in RESTART_KEYWORDS):
+                    self.needs_restart = True
+
+            if attempt < max_retries - 1:
+                logging.debug("🔄 will retry %s", url)
+                await asyncio.sleep(1)
+
+                if self.needs_restart and not await self.restart_driver():
+                    return None
+
+        return None
+
+
     async def scrape_page (  # pylint: disable=R0911,R0912,R0915
         self,
         url: str,
@@ -172,10 +347,16 @@ Check if URL is valid for extraction:
         ) -> typing.Optional[ str ]:
         """
 Scrape a single page, with timeout handling.
+
+The blocking calls to the driver run in a worker thread, and the waits
+use `asyncio.sleep()`, so that other coroutines keep running meanwhile.
         """
         if not self.valid_for_extraction(url):
             return None
 
+        if self.metadata_only:
+            return await self.scrape_metadata(url, max_retries = max_retries)
+
         for attempt in range(max_retries):
             try:
                 logging.debug("scraping: %s (attempt %d/%d", url, attempt + 1, max_retries)
@@ -189,40 +370,44 @@ Scrape a single page, with timeout handling.
 
                 # try a simple get first to test connection
                 try:
-                    self.driver.get("about:blank")  # type: ignore
-                    time.sleep(0.5)
+                    await asyncio.to_thread(self.driver.get, "about:blank")  # type: ignore
+                    await asyncio.sleep(0.5)
                 except Exception:  # pylint: disable=W0718
                     logging.error("🔧 driver seems stuck")
+                    self.needs_restart = True
                     return None
 
                 # navigate to the actual page
-                self.driver.get(url)  # type: ignore
+                await asyncio.to_thread(self.driver.get, url)  # type: ignore
 
                 # wait for body element with timeout
                 try:
-                    WebDriverWait(self.driver, 20).until(  # type: ignore
-                        EC.presence_of_element_located((By.TAG_NAME, "body"))  # type: ignore
+                    await asyncio.to_thread(
+                        WebDriverWait(self.driver, 20).until,  # type: ignore
+                        EC.presence_of_element_located((By.TAG_NAME, "body")),  # type: ignore
                     )
                 except TimeoutException:
                     logging.error("⏰ body element not found, continuing anyway")
 
                 # additional wait for dynamic content
                 if attempt == 0:
-                    time.sleep(self.delay)
+                    await asyncio.sleep(self.delay)
                 else:
-                    time.sleep(min(self.delay, 3))
+                    await asyncio.sleep(min(self.delay, 3))
 
                 # try to scroll, but don't fail if it doesn't work
                 try:
                     scroll_script: str = "window.scrollTo(0, Math.min(document.body.scrollHeight, 1000));"  # pylint: disable=C0301
-                    self.driver.execute_script(scroll_script)  # type: ignore
-                    time.sleep(1)
+                    await asyncio.to_thread(self.driver.execute_script, scroll_script)  # type: ignore
+                    await asyncio.sleep(1)
                 except Exception as scroll_error:  # pylint: disable=W0718
                     logging.error("⚠️  scroll failed: %s", scroll_error)
 
                 # get the page source, which is where renderer timeouts often happen
                 try:
-                    page_source: typing.Optional[ str ] = self.driver.page_source  # type: ignore
+                    page_source: typing.Optional[ str ] = await asyncio.to_thread(
+                        self.get_page_source,
+                    )
 
                     if page_source is None or len(page_source) < 10:
                         raise RuntimeError("page source too short or empty")
@@ -236,6 +421,8 @@ Scrape a single page, with timeout handling.
                     return None
 
                 logging.debug("✅ successfully scraped %s", url)
+                self.pages += 1
+
                 return page_source
 
             except TimeoutException as ex:
@@ -247,7 +434,7 @@ Scrape a single page, with timeout handling.
 
                 if attempt < max_retries - 1:
                     logging.debug("🔄 will retry %s", url)
-                    time.sleep(3)  # Longer pause for timeouts
+                    await asyncio.sleep(3)  # Longer pause for timeouts
                 else:
                     logging.error("❌ failed to scrape %s after %d attempts", url, max_retries)
                     return None
@@ -259,10 +446,14 @@ Scrape a single page, with timeout handling.
                 # check for specific error types that need driver restart
                 if any(keyword in error_msg.lower() for keyword in RESTART_KEYWORDS):
                     logging.debug("🔧 detected driver issue, restart before next attempt")
+                    self.needs_restart = True
 
                 if attempt < max_retries - 1:
                     logging.debug("🔄 will retry %s", url)
-                    time.sleep(5) # wait even longer for WebDriver errors
+                    await asyncio.sleep(5) # wait even longer for WebDriver errors
+
+                    if self.needs_restart and not await self.restart_driver():
+                        return None
                 else:
                     return None
 
@@ -272,8 +463,114 @@ Scrape a single page, with timeout handling.
 
                 if attempt < max_retries - 1:
                     logging.debug("🔄 will retry %s", url)
-                    time.sleep(2)
+                    await asyncio.sleep(2)
                 else:
                     return None
 
         return None
+
+
+class ScraperPool:
+    """
+Pool of `Scraper` instances, each with its own headless browser, so
+that pages get scraped concurrently. Each driver gets recycled after
+scraping `max_pages` pages, or after errors which indicate that it
+needs to be restarted.
+    """
+    def __init__ (
+        self,
+        *,
+        size: int = 2,
+        max_pages: int = 50,
+        delay: int = 3,
+        user_agent: str = FAUX_USER_AGENT,
+        metadata_only: bool = False,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.max_pages: int = max_pages
+
+        self.scrapers: typing.List[ Scraper ] = [
+            Scraper(delay = delay, user_agent = user_agent, metadata_only = metadata_only)
+            for _ in range(max(1, size))
+        ]
+
+        self.idle: asyncio.Queue = asyncio.Queue()
+        self.size: int = 0
+
+
+    async def start (
+        self,
+        ) -> int:
+        """
+Start the drivers concurrently, returning how many are available.
+        """
+        ready: typing.List[ bool ] = await asyncio.gather(*[
+            asyncio.to_thread(scraper.init_driver)
+            for scraper in self.scrapers
+        ])
+
+        for scraper, ok in zip(self.scrapers, ready):
+            if ok:
+                self.idle.put_nowait(scraper)
+                self.size += 1
+
+        return self.size
+
+
+    async def close (
+        self,
+        ) -> None:
+        """
+Close all of the drivers.
+        """
+        await asyncio.gather(*[
+            asyncio.to_thread(scraper.close_driver)
+            for scraper in self.scrapers
+        ])
+
+        self.size = 0
+
+
+    async def __aenter__ (
+        self,
+        ) -> "ScraperPool":
+        """
+Context manager entry, which starts the drivers.
+        """
+        await self.start()
+        return self
+
+
+    async def __aexit__ (
+        self,
+        exc_type: typing.Optional[ typing.Type[ BaseException ] ],
+        exc_value: typing.Optional[ BaseException ],
+        traceback: typing.Optional[ types.TracebackType ],
+        ) -> None:
+        """
+Context manager exit, which closes the drivers.
+        """
+        await self.close()
+
+
+    async def scrape (
+        self,
+        url: str,
+        ) -> typing.Optional[ str ]:
+        """
+Scrape a page with the next idle scraper, first recycling its driver
+when needed.
+        """
+        scraper: Scraper = await self.idle.get()
+
+        try:
+            if scraper.needs_restart or scraper.pages >= self.max_pages:
+                if not await scraper.restart_driver():
+                    return None
+
+            return await scraper.scrape_page(url)
+
+        finally:
+            self.idle.put_nowait(scraper)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming sitemap reader for Nyddu, which handles sitemap index files
+and gzip compressed sitemaps.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import Executor
+import asyncio
+import concurrent.futures
+import datetime
+import gzip
+import io
+import logging
+import threading
+import typing
+
+from defusedxml import ElementTree
+import requests
+import requests_cache
+
+
+GZIP_MAGIC: bytes = b"\x1f\x8b"
+
+
+class SitemapEntry (typing.NamedTuple):
+    """
+One `<url>` entry from a sitemap, or one `<sitemap>` entry from a
+sitemap index, with its `<lastmod>` as a POSIX timestamp.
+    """
+    loc: str
+    lastmod: typing.Optional[ float ] = None
+    is_index: bool = False
+
+
+def parse_lastmod (
+    value: typing.Optional[ str ],
+    ) -> typing.Optional[ float ]:
+    """
+Parse a `<lastmod>` value in W3C datetime format, i.e., a date with an
+optional time, into a POSIX timestamp -- assuming UTC when the value
+has no time zone.
+    """
+    if value is None:
+        return None
+
+    try:
+        lastmod: datetime.datetime = datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+    if lastmod.tzinfo is None:
+        lastmod = lastmod.replace(tzinfo = datetime.timezone.utc)
+
+    return lastmod.timestamp()
+
+
+def iter_sitemap (
+    fp: typing.IO[ bytes ],
+    ) -> Iterator[ SitemapEntry ]:
+    """
+Parse a sitemap or sitemap index incrementally, regardless of XML
+namespace, clearing each entry once it has been parsed so that memory
+stays bounded for large sitemaps. Only the `<loc>` and `<lastmod>`
+directly within an entry get used, not those of extensions such as
+image sitemaps.
+    """
+    root: typing.Any = None
+    depth: int = 0
+    loc: typing.Optional[ str ] = None
+    lastmod: typing.Optional[ float ] = None
+
+    for event, elem in ElementTree.iterparse(fp, events = ( "start", "end", )):
+        if event == "start":
+            if root is None:
+                root = elem
+
+            depth += 1
+            continue
+
+        match ( depth, elem.tag.rsplit("}", 1)[-1], ):
+            case ( 3, "loc", ):
+                loc = (elem.text or "").strip() or None
+
+            case ( 3, "lastmod", ):
+                lastmod = parse_lastmod(elem.text)
+
+            case ( 2, "url" | "sitemap" as name, ):
+                if loc is not None:
+                    yield SitemapEntry(loc, lastmod, name == "sitemap")
+
+                loc = None
+                lastmod = None
+                root.clear()
+
+        depth -= 1
+
+
+def fetch_sitemap (
+    session: requests_cache.CachedSession,
+    uri: str,
+    ) -> Iterator[ SitemapEntry ]:
+    """
+Fetch a sitemap, which may be gzip compressed, then iterate through
+its entries while the body is still streaming in. The request bypasses
+the cache, which would otherwise read the whole body into memory, but
+still goes through the session's adapters and headers.
+    """
+    stream: requests.Session = requests.Session()
+    stream.headers = session.headers
+    stream.adapters = session.adapters
+
+    response: requests.Response = stream.get(uri, timeout = 10, stream = True)
+
+    try:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        response.raw.auto_close = False
+
+        fp: typing.IO[ bytes ] = io.BufferedReader(response.raw)
+
+        if fp.peek(len(GZIP_MAGIC)).startswith(GZIP_MAGIC):  # type: ignore
+            fp = gzip.GzipFile(fileobj = fp)  # type: ignore
+
+        yield from iter_sitemap(fp)
+
+    finally:
+        response.close()
+
+
+class SitemapReader:  # pylint: disable=R0902
+    """
+Read the URLs from a sitemap, following any sitemap index files and
+fetching up to `concurrency` child sitemaps at a time. Each sitemap
+gets parsed in a thread which hands over its entries in batches, so
+that URLs arrive while the sitemaps are still being read, and a
+bounded queue applies backpressure to the parsing.
+    """
+    def __init__ (
+        self,
+        session: requests_cache.CachedSession,
+        *,
+        executor: typing.Optional[ Executor ] = None,
+        concurrency: int = 4,
+        batch_size: int = 1000,
+        ) -> None:
+        """
+Constructor.
+        """
+        self.session: requests_cache.CachedSession = session
+        self.executor: typing.Optional[ Executor ] = executor
+        self.batch_size: int = batch_size
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize = max(1, concurrency) * 2)
+        self.limit: asyncio.Semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.stopped: threading.Event = threading.Event()
+        self.loop: typing.Optional[ asyncio.AbstractEventLoop ] = None
+        self.tasks: typing.Set[ asyncio.Task ] = set()
+        self.seen: typing.Set[ str ] = set()
+        self.pending: int = 0
+
+
+    def hand_over (
+        self,
+        item: typing.Optional[ typing.List[ SitemapEntry ] ],
+        ) -> bool:
+        """
+Put a batch of entries (or `None` once a sitemap is done) into the
+queue from a parsing thread, waiting for space unless the reader has
+been stopped. Returns whether the batch was handed over.
+        """
+        future: concurrent.futures.Future = asyncio.run_coroutine_threadsafe(
+            self.queue.put(item),
+            self.loop,  # type: ignore
+        )
+
+        while not self.stopped.is_set():
+            try:
+                future.result(timeout = 0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                pass
+
+        future.cancel()
+        return False
+
+
+    def read (
+        self,
+        uri: str,
+        ) -> None:
+        """
+Parse one sitemap, in a thread.
+        """
+        batch: typing.List[ SitemapEntry ] = []
+
+        try:
+            for entry in fetch_sitemap(self.session, uri):
+                batch.append(entry)
+
+                if len(batch) >= self.batch_size:
+                    if not self.hand_over(batch):
+                        return
+
+                    batch = []
+        except Exception as ex:  # pylint: disable=W0718
+            message: str = f"bad site links: {uri} : {ex}"
+            logging.error(message)
+
+        if self.hand_over(batch):
+            self.hand_over(None)
+
+
+    async def fetch (
+        self,
+        uri: str,
+        ) -> None:
+        """
+Coroutine to parse one sitemap, limited to `concurrency` at a time.
+        """
+        async with self.limit:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.read, uri)
+
+
+    def start (
+        self,
+        uri: str,
+        ) -> None:
+        """
+Start reading a sitemap, unless it has been read already.
+        """
+        if uri in self.seen:
+            return
+
+        self.seen.add(uri)
+        self.pending += 1
+        self.tasks.add(asyncio.create_task(self.fetch(uri)))
+
+
+    async def entries (
+        self,
+        uri: str,
+        ) -> AsyncIterator[ SitemapEntry ]:
+        """
+Iterate through the `<url>` entries in a sitemap, including those in
+the child sitemaps of a sitemap index.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.start(uri)
+
+        try:
+            while self.pending > 0:
+                batch: typing.Optional[ typing.List[ SitemapEntry ] ] = await self.queue.get()
+
+                if batch is None:
+                    self.pending -= 1
+                    continue
+
+                for entry in batch:
+                    if entry.is_index:
+                        self.start(entry.loc)
+                    else:
+                        yield entry
+
+        finally:
+            self.stopped.set()
+
+            for task in self.tasks:
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the KùzuDB connection pool, handing the database over
+to a loader in another process.
+see copyright/license https://github.com/DerwenAI/nyddu/README.md
+"""
+
+import pathlib
+import subprocess
+import sys
+import time
+
+import kuzu
+import pytest
+
+from nyddu import ConnectionPool, DatabaseUnavailable, read_generation, reload_path
+
+
+WRITER: str = """
+import pathlib, sys
+from nyddu import db_connect, write_generation
+
+db_path = pathlib.Path(sys.argv[1])
+conn = db_connect(db_path = db_path, timeout = 30.0)
+conn.execute("CREATE (:Item {id: 2})")
+conn.close()
+conn.database.close()
+write_generation(db_path)
+"""
+
+
+def count_items (
+    pool: ConnectionPool,
+    ) -> int:
+    """
+Count the rows in the test table, via the pool.
+    """
+    with pool.connection() as (conn, prepared):
+        return conn.execute(prepared["count"]).get_next()[0]  # type: ignore
+
+
+def test_pool_hands_over_to_writer (
+    tmp_path: pathlib.Path,
+    ) -> None:
+    """
+A second process loads into the database while the pool is live: the
+pool releases the database, then reopens it to see the new rows.
+    """
+    db_path: pathlib.Path = tmp_path / "db"
+    conn: kuzu.Connection = kuzu.Connection(kuzu.Database(db_path))
+    conn.execute("CREATE NODE TABLE Item(id INT64 PRIMARY KEY)")
+    conn.execute("CREATE (:Item {id: 1})")
+    conn.close()
+    conn.database.close()
+
+    pool: ConnectionPool = ConnectionPool(
+        db_path,
+        size = 2,
+        queries = { "count": "MATCH (i:Item) RETURN count(*)" },
+        watch_interval = 0.1,
+    )
+
+    assert count_items(pool) == 1
+
+    with subprocess.Popen(
+        [ sys.executable, "-c", WRITER, str(db_path) ],
+        cwd = pathlib.Path(__file__).parent.parent,
+    ) as writer:
+        while writer.poll() is None:
+            try:
+                count_items(pool)
+            except DatabaseUnavailable:
+                pass
+
+            time.sleep(0.05)
+
+    assert writer.returncode == 0
+    assert not reload_path(db_path).exists()
+    assert read_generation(db_path) is not None
+    assert count_items(pool) == 2
+
+
+def test_pool_is_read_only (
+    tmp_path: pathlib.Path,
+    ) -> None:
+    """
+The pool opens the database read-only, so it cannot write.
+    """
+    db_path: pathlib.Path = tmp_path / "db"
+    conn: kuzu.Connection = kuzu.Connection(kuzu.Database(db_path))
+    conn.execute("CREATE NODE TABLE Item(id INT64 PRIMARY KEY)")
+    conn.close()
+    conn.database.close()
+
+    pool: ConnectionPool = ConnectionPool(db_path, size = 1, watch_interval = 0.0)
+
+    with pool.connection() as (pooled_conn, _):
+        with pytest.raises(RuntimeError):
+            pooled_conn.execute("CREATE (:Item {id: 1})")